@@ -0,0 +1,484 @@
+# analytics.py
+"""
+Incremental analytics over the sender's performance log.
+
+Analytics reads the rotated log set (perflog.log_files) from where it
+stopped last time and folds the new rows into running aggregates, so the
+cost of an update is proportional to the rows appended since the previous
+one, not to the size of the log. Both the read offsets and the aggregates
+are kept in a state file next to the log
+(logs/performance_log.analytics.json).
+
+Offsets are keyed by the file's inode, so rotation (a rename) does not
+reread anything: the renamed segment continues from the same offset and
+the new active file starts at 0. Per format:
+
+    csv       byte offset of the last complete line
+    csv.gz    offset into the decompressed stream (gzip has to decompress
+              up to it again, bounded by the rotation size)
+    parquet   row groups read (the active segment is skipped until closed)
+
+Rows are parsed CHUNK_BYTES (or one row group) at a time, and every
+aggregate has a fixed size or grows with the number of routes or
+`window`-row blocks, so memory stays bounded however long the log is:
+
+    totals        episodes, successes, reward sum
+    rolling       success and reward means over the last `window` rows, and
+                  the same means per consecutive block of `window` rows
+                  (with the block's last timestamp) for the trend figures
+    routes        per route: count, successes, reward sum, latency sum
+    latency       metrics.Histogram of every latency, and of successful and
+                  failed episodes separately (quantiles within ~3%)
+    sample        a reservoir of `sample` (latency, reward) pairs
+
+render() draws every figure in Results/ from the aggregates and the
+Q-table in one pass. `python analytics.py` prints a summary (--follow N
+to keep tailing the log); plot_graphs.py renders the figures.
+"""
+import argparse, io, json, os, time, zlib
+
+import numpy as np
+
+from metrics import Histogram
+from perflog import COLUMNS, LOGFILE, _split, log_files
+
+CHUNK_BYTES = 8 * 1024 * 1024
+WINDOW = 100        # rows per rolling window / trend block
+SAMPLE = 5000       # (latency, reward) pairs kept for the scatter plot
+RESULTS_DIR = "Results"
+QFILE = "route_qtable.json"
+
+
+def _hist_state(h):
+    return {"counts": {str(i): c for i, c in enumerate(h.counts) if c}, "count": h.count,
+            "total": h.total, "min": h.min, "max": h.max}
+
+
+def _hist_load(state):
+    h = Histogram()
+    for i, c in state["counts"].items():
+        h.counts[int(i)] = c
+    h.count, h.total, h.min, h.max = state["count"], state["total"], state["min"], state["max"]
+    return h
+
+
+def _gunzip(f, size):
+    """
+    Decompressed blocks of a multi-member gzip file. Unlike GzipFile this
+    yields what a still-open member has flushed so far instead of raising
+    EOFError on the missing trailer.
+    """
+    d = zlib.decompressobj(wbits=31)
+    while raw := f.read(size):
+        while raw:
+            if out := d.decompress(raw):
+                yield out
+            raw = b""
+            if d.eof:   # next member
+                raw, d = d.unused_data, zlib.decompressobj(wbits=31)
+
+
+class Analytics:
+    def __init__(self, path=LOGFILE, state_file=None, window=WINDOW, sample=SAMPLE, chunk_bytes=CHUNK_BYTES):
+        self.path = path
+        self.state_file = state_file or _split(path)[0] + ".analytics.json"
+        self.window = window
+        self.sample_size = sample
+        self.chunk_bytes = chunk_bytes
+        self.rng = np.random.default_rng()
+        self.reset()
+        self.load()
+
+    def reset(self):
+        """Forget all offsets and aggregates (the next update() rereads the whole log)."""
+        self.files = {}                 # "dev:ino" -> {"path", "offset", "size"}
+        self.episodes = 0
+        self.successes = 0
+        self.reward_sum = 0.0
+        self.recent = []                # last `window` (success, reward) pairs
+        self.block = [0, 0, 0.0]        # rows, successes, reward sum of the unfinished block
+        self.blocks = {"time": [], "success": [], "reward": []}
+        self.routes = {}                # route -> [count, successes, reward sum, latency sum]
+        self.latency = {k: Histogram() for k in ("all", "success", "failure")}
+        self.sample = []                # [[latency, reward], ...]
+
+    # --- state ---
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as f:
+            s = json.load(f)
+        if s.get("window") != self.window:
+            return   # blocks were cut at another width: start over
+        self.files = s["files"]
+        self.episodes, self.successes, self.reward_sum = s["episodes"], s["successes"], s["reward_sum"]
+        self.recent, self.block, self.blocks = s["recent"], s["block"], s["blocks"]
+        self.routes = s["routes"]
+        self.latency = {k: _hist_load(v) for k, v in s["latency"].items()}
+        self.sample = s["sample"]
+
+    def save(self):
+        s = {"window": self.window, "files": self.files, "episodes": self.episodes,
+             "successes": self.successes, "reward_sum": self.reward_sum, "recent": self.recent,
+             "block": self.block, "blocks": self.blocks, "routes": self.routes,
+             "latency": {k: _hist_state(h) for k, h in self.latency.items()}, "sample": self.sample}
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(s, f)
+        os.replace(tmp, self.state_file)
+
+    # --- reading ---
+    def update(self):
+        """Fold every row appended since the last update into the aggregates; returns the row count."""
+        seen, rows = set(), 0
+        for p in log_files(self.path):
+            st = os.stat(p)
+            key = f"{st.st_dev}:{st.st_ino}"
+            seen.add(key)
+            rec = self.files.setdefault(key, {"path": p, "offset": 0, "size": 0})
+            if rec["offset"] and rec["size"] == st.st_size:
+                continue   # nothing appended since last time
+            if p.endswith(".csv") and st.st_size < rec["offset"]:
+                rec["offset"] = 0   # truncated or replaced in place
+            if p.endswith(".parquet"):
+                chunks = self._parquet_chunks(p, rec)
+            else:
+                chunks = self._csv_chunks(p, rec)
+            for df in chunks:
+                self.add(df)
+                rows += len(df)
+            rec["path"], rec["size"] = p, st.st_size
+        for key in set(self.files) - seen:   # deleted segments
+            del self.files[key]
+        return rows
+
+    def _blocks(self, path, offset):
+        """Raw bytes of a csv or csv.gz file from `offset` (decompressed) on, a chunk at a time."""
+        with open(path, "rb") as f:
+            if not path.endswith(".gz"):
+                f.seek(offset)
+                while data := f.read(self.chunk_bytes):
+                    yield data
+                return
+            skip = offset
+            for data in _gunzip(f, self.chunk_bytes):
+                if skip >= len(data):
+                    skip -= len(data)
+                    continue
+                yield data[skip:]
+                skip = 0
+
+    def _csv_chunks(self, path, rec):
+        import pandas as pd
+        carry, header = b"", rec["offset"] == 0
+        for data in self._blocks(path, rec["offset"]):
+            data = carry + data
+            if header:
+                nl = data.find(b"\n")
+                if nl < 0:
+                    carry = data
+                    continue
+                rec["offset"] += nl + 1
+                data, header = data[nl + 1:], False
+            cut = data.rfind(b"\n") + 1   # a half-written last line waits for the next update
+            carry = data[cut:]
+            if cut:
+                rec["offset"] += cut
+                yield pd.read_csv(io.BytesIO(data[:cut]), names=COLUMNS, header=None, dtype={"route": str})
+
+    def _parquet_chunks(self, path, rec):
+        import pyarrow.parquet as pq
+        try:
+            pf = pq.ParquetFile(path)
+        except Exception:
+            return   # active segment still being written
+        for rg in range(rec["offset"], pf.num_row_groups):
+            yield pf.read_row_group(rg).to_pandas()
+            rec["offset"] = rg + 1
+
+    # --- aggregation ---
+    def add(self, df):
+        """Fold one DataFrame of log rows (columns as in perflog.COLUMNS)."""
+        n = len(df)
+        if not n:
+            return
+        success = df["success"].to_numpy(dtype=np.int64)
+        reward = df["reward"].to_numpy(dtype=np.float64)
+        latency = df["latency"].to_numpy(dtype=np.float64)
+        ok = success.astype(bool)
+
+        self.episodes += n
+        self.successes += int(success.sum())
+        self.reward_sum += float(reward.sum())
+        self.recent = (self.recent + np.column_stack([success, reward]).tolist())[-self.window:]
+
+        # trend blocks of `window` rows, continuing the unfinished one
+        pos = self.block[0] + np.arange(n)
+        ids = pos // self.window
+        succ = np.bincount(ids, weights=success)
+        rew = np.bincount(ids, weights=reward)
+        succ[0] += self.block[1]   # the unfinished block's earlier rows
+        rew[0] += self.block[2]
+        ends = np.r_[np.flatnonzero(np.diff(ids)), n - 1]
+        stamps = df["timestamp"].to_numpy()[ends]
+        full = pos[ends] % self.window == self.window - 1
+        for b in np.flatnonzero(full):
+            self.blocks["time"].append(str(stamps[b]))
+            self.blocks["success"].append(succ[b] / self.window)
+            self.blocks["reward"].append(rew[b] / self.window)
+        self.block = [0, 0, 0.0] if full[-1] else [int(pos[-1] % self.window) + 1, int(succ[-1]), float(rew[-1])]
+
+        per_route = df.assign(success=success).groupby("route").agg(
+            count=("success", "size"), successes=("success", "sum"), reward=("reward", "sum"),
+            latency=("latency", "sum"))
+        for route, c, s, r, l in per_route.itertuples():
+            agg = self.routes.setdefault(route, [0, 0, 0.0, 0.0])
+            agg[0] += int(c)
+            agg[1] += int(s)
+            agg[2] += float(r)
+            agg[3] += float(l)
+
+        self.latency["all"].record_many(latency)
+        self.latency["success"].record_many(latency[ok])
+        self.latency["failure"].record_many(latency[~ok])
+        self._reservoir(np.column_stack([latency, reward]))
+
+    def _reservoir(self, pairs):
+        """Uniform sample of every (latency, reward) pair seen (Algorithm R, one chunk at a time)."""
+        seen = self.episodes - len(pairs)
+        room = max(0, self.sample_size - len(self.sample))
+        self.sample.extend(pairs[:room].tolist())
+        rest = pairs[room:]
+        if not len(rest):
+            return
+        t = seen + room + np.arange(1, len(rest) + 1)         # 1-based position in the whole log
+        slot = (self.rng.random(len(rest)) * t).astype(np.int64)
+        keep = np.flatnonzero(slot < self.sample_size)
+        for i in keep:
+            self.sample[slot[i]] = rest[i].tolist()
+
+    # --- queries ---
+    def rolling_success(self):
+        return float(np.mean([s for s, _ in self.recent])) if self.recent else None
+
+    def top_routes(self, n=10, by="count"):
+        """[(route, count, success rate, mean reward, mean latency), ...] sorted by count or success rate."""
+        rows = [(r, c, s / c, rw / c, l / c) for r, (c, s, rw, l) in self.routes.items()]
+        rows.sort(key=(lambda x: x[1]) if by == "count" else (lambda x: (x[2], x[1])), reverse=True)
+        return rows[:n]
+
+    def summary(self):
+        lat = self.latency["all"]
+        ms = lambda q: round(lat.percentile(q) / 1000.0, 1)
+        return {"episodes": self.episodes,
+                "success_rate": round(self.successes / self.episodes, 4) if self.episodes else None,
+                "rolling_success": self.rolling_success(),
+                "mean_reward": round(self.reward_sum / self.episodes, 3) if self.episodes else None,
+                "latency_p50_ms": ms(50), "latency_p95_ms": ms(95), "latency_p99_ms": ms(99),
+                "routes": len(self.routes)}
+
+
+# --- figures ---
+def q_heatmaps(qfile=QFILE):
+    """
+    Average Q-value per pair of nodes in consecutive layers, as a list of
+    DataFrames (rows: layer i, columns: layer i+1). Reads the binary
+    QTable when present, otherwise the exported JSON.
+    """
+    import pandas as pd
+    base = os.path.splitext(qfile)[0]
+    if os.path.exists(base + ".npy") and os.path.exists(base + ".index.json"):
+        with open(base + ".index.json") as f:
+            nodes = json.load(f)["nodes"]
+        values = np.load(base + ".npy", mmap_mode="r")
+        known = ~np.isnan(values)
+        total = np.where(known, values, 0.0)
+        out = []
+        for i in range(values.ndim - 1):
+            other = tuple(a for a in range(values.ndim) if a not in (i, i + 1))
+            s, n = total.sum(axis=other), known.sum(axis=other)
+            out.append(pd.DataFrame(np.divide(s, n, out=np.zeros(s.shape), where=n > 0),
+                                    index=nodes[i], columns=nodes[i + 1]))
+        return out
+    if not os.path.exists(qfile):
+        return []
+    with open(qfile) as f:
+        raw = json.load(f)
+    if not raw:
+        return []
+    parts = pd.DataFrame(pd.Series(list(raw)).str.findall(r"'([^']*)'").tolist())   # "('L1_A', 'L2_B', ...)"
+    parts["q"] = list(raw.values())
+    depth = parts.shape[1] - 1
+    return [parts.groupby([i, i + 1])["q"].mean().unstack(fill_value=0.0).rename_axis(index=None, columns=None)
+            for i in range(depth - 1)]
+
+
+def _layer(frame_axis):
+    return str(frame_axis[0]).split("_")[0]
+
+
+def render(stats, outdir=RESULTS_DIR, qfile=QFILE, show=False):
+    """Draw every figure into `outdir`; returns the file names written."""
+    import matplotlib
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    os.makedirs(outdir, exist_ok=True)
+    written = []
+
+    def save(name):
+        plt.tight_layout()
+        plt.savefig(os.path.join(outdir, name))
+        written.append(name)
+        if not show:
+            plt.close()
+
+    # Q-value heatmaps, one per pair of consecutive layers
+    for i, frame in enumerate(q_heatmaps(qfile)):
+        a, b = _layer(frame.index), _layer(frame.columns)
+        plt.figure(figsize=(10, 5))
+        sns.heatmap(frame, annot=True, cmap="coolwarm", fmt=".2f")
+        plt.title(f"Trust Heatmap: {a} → {b} (Average Q-values)")
+        plt.xlabel(f"{b} Nodes")
+        plt.ylabel(f"{a} Nodes")
+        save(f"{i + 1}_trust_heatmap_{a}_{b}.png")
+        if i == 0:
+            plt.figure(figsize=(8, 6))
+            sns.heatmap(frame, annot=True, cmap="coolwarm", fmt=".2f")
+            plt.title(f"Average Q-values ({a} vs {b})")
+            plt.xlabel(b)
+            plt.ylabel(a)
+            save("7_qtable_heatmap.png")
+
+    if not stats.episodes:
+        return written
+
+    if stats.blocks["time"]:
+        when = pd.to_datetime(pd.Series(stats.blocks["time"]))
+        plt.figure(figsize=(10, 5))
+        plt.plot(when, stats.blocks["success"], color="blue", linewidth=2, label="Success Rate (rolling mean)")
+        plt.xlabel("Time")
+        plt.ylabel("Success Rate")
+        plt.title("Packet Delivery Success Rate Over Time")
+        plt.legend()
+        plt.grid(True)
+        save("1_success_rate.png")
+
+        plt.figure(figsize=(10, 5))
+        plt.plot(when, stats.blocks["reward"], color="orange", label="Average Reward (rolling mean)")
+        plt.xlabel("Time")
+        plt.ylabel("Reward")
+        plt.title("Learning Progress: Average Reward Over Time")
+        plt.legend()
+        plt.grid(True)
+        save("3_average_reward.png")
+
+        episode = (np.arange(len(stats.blocks["success"])) + 1) * stats.window
+        plt.figure(figsize=(8, 5))
+        plt.plot(episode, stats.blocks["success"], color="green", linewidth=2)
+        plt.xlabel("Episode")
+        plt.ylabel("Rolling Success Rate")
+        plt.title("Success Rate Trend Over Time")
+        plt.grid(True)
+        save("3_success_rate_trend.png")
+
+    def hist(h, **kw):
+        counts = np.array(h.counts)
+        idx = np.flatnonzero(counts)
+        seconds = np.array([h.bucket_value(i) for i in idx]) / 1e6
+        plt.hist(seconds, bins=50, weights=counts[idx], **kw)
+
+    plt.figure(figsize=(8, 5))
+    hist(stats.latency["all"], color="skyblue", alpha=0.7)
+    plt.xlabel("Latency (seconds)")
+    plt.ylabel("Frequency")
+    plt.title("Distribution of Latency Across Packets")
+    plt.grid(True)
+    save("2_latency_distribution.png")
+
+    plt.figure(figsize=(8, 5))
+    hist(stats.latency["success"], color="green", alpha=0.6, label="Success")
+    hist(stats.latency["failure"], color="red", alpha=0.6, label="Failure")
+    plt.xlabel("Latency (seconds)")
+    plt.ylabel("Count")
+    plt.title("Latency Distribution for Success vs Failure")
+    plt.legend()
+    plt.grid(True)
+    save("2b_latency_success_failure.png")
+
+    top = stats.top_routes(10)
+    plt.figure(figsize=(10, 5))
+    pd.Series([c for _, c, *_ in top], index=[r for r, *_ in top]).plot(kind="bar", color="purple")
+    plt.xlabel("Route")
+    plt.ylabel("Usage Count")
+    plt.title("Top 10 Most Frequently Selected Routes")
+    plt.xticks(rotation=45, ha="right")
+    plt.grid(True)
+    save("4_route_frequency.png")
+
+    top5 = top[:5]
+    plt.figure(figsize=(9, 5))
+    sns.barplot(x=[c for _, c, *_ in top5], y=[r for r, *_ in top5], hue=[r for r, *_ in top5],
+                palette="viridis", legend=False)
+    plt.xlabel("Selection Count")
+    plt.ylabel("Route (L1 → L2 → L3)")
+    plt.title("Top 5 Most Frequently Selected Routes")
+    save("4_top5_routes.png")
+
+    best = stats.top_routes(10, by="success")
+    plt.figure(figsize=(10, 5))
+    pd.Series([s for _, _, s, *_ in best], index=[r for r, *_ in best]).plot(kind="bar", color="green")
+    plt.xlabel("Route")
+    plt.ylabel("Average Success Rate")
+    plt.title("Top Routes by Success Rate")
+    plt.xticks(rotation=45, ha="right")
+    plt.grid(True)
+    save("5_success_per_route.png")
+
+    pairs = np.array(stats.sample)
+    plt.figure(figsize=(8, 6))
+    plt.scatter(pairs[:, 0], pairs[:, 1], alpha=0.6, color="teal")
+    plt.xlabel("Latency (s)")
+    plt.ylabel("Reward")
+    plt.title("Reward vs Latency (Efficiency Relationship)")
+    plt.grid(True)
+    save("6_reward_vs_latency.png")
+
+    if show:
+        plt.show()
+    return written
+
+
+def _print_summary(s):
+    print(f"{s['episodes']} episodes  success {s['success_rate']}  rolling {s['rolling_success']}  "
+          f"reward {s['mean_reward']}  latency p50/p95/p99 {s['latency_p50_ms']}/{s['latency_p95_ms']}/"
+          f"{s['latency_p99_ms']} ms  {s['routes']} routes")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Summarize the performance log incrementally.")
+    ap.add_argument("--log", default=LOGFILE, help="any file of the rotated set")
+    ap.add_argument("--state", default=None, help="state file (default <log stem>.analytics.json)")
+    ap.add_argument("--window", type=int, default=WINDOW)
+    ap.add_argument("--rebuild", action="store_true", help="discard the saved state and reread the whole log")
+    ap.add_argument("--follow", type=float, default=0, help="keep tailing the log, updating every N seconds")
+    ap.add_argument("--top", type=int, default=5, help="routes to list")
+    args = ap.parse_args()
+
+    stats = Analytics(args.log, args.state, window=args.window)
+    if args.rebuild:
+        stats.reset()
+    while True:
+        t0 = time.perf_counter()
+        rows = stats.update()
+        stats.save()
+        print(f"+{rows} rows in {time.perf_counter() - t0:.2f}s")
+        _print_summary(stats.summary())
+        if not args.follow:
+            break
+        time.sleep(args.follow)
+    for route, count, rate, reward, _ in stats.top_routes(args.top):
+        print(f"  {count:>8}  {rate:6.3f}  {reward:7.2f}  {route}")
@@ -0,0 +1,156 @@
+# benchmarks/_common.py
+"""
+Shared helpers for the benchmark scripts: throwaway mesh configs on free
+loopback ports, node subprocesses, an in-process sink that timestamps
+arrivals, and latency summaries.
+
+Every benchmark runs inside its own temporary directory so the checked-in
+keys.json, trust files, Q-table and logs are never touched.
+"""
+import os, sys, json, time, base64, socket, asyncio, threading, tempfile, subprocess, contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from Crypto.Random import get_random_bytes
+from framing import read_frame
+
+NODE_PY = os.path.join(ROOT, "node.py")
+
+
+def b64d(s):
+    return base64.b64decode(s)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_config(names, behavior=None):
+    """Build a keys.json-style dict for `names` on free loopback ports."""
+    cfg = {"keys": {}, "addrs": {}}
+    for name in names:
+        cfg["keys"][name] = base64.b64encode(get_random_bytes(16)).decode()
+        cfg["addrs"][name] = ["127.0.0.1", free_port()]
+    if behavior:
+        cfg["behavior"] = behavior
+    return cfg
+
+
+@contextlib.contextmanager
+def workdir(cfg=None):
+    """chdir into a fresh temp dir (optionally writing keys.json there)."""
+    old = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="onion-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            if cfg is not None:
+                with open("keys.json", "w") as f:
+                    json.dump(cfg, f)
+            yield tmp
+        finally:
+            os.chdir(old)
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.02)
+    return False
+
+
+def spawn_node(name, cfg, *extra_args):
+    """Start `python node.py <extra_args> <name>` in the cwd and wait until it listens."""
+    out = open(os.environ["BENCH_NODE_LOG"], "a") if os.environ.get("BENCH_NODE_LOG") else subprocess.DEVNULL
+    p = subprocess.Popen([sys.executable, NODE_PY, *extra_args, name], stdout=out, stderr=subprocess.STDOUT)
+    host, port = cfg["addrs"][name]
+    if not wait_for_port(host, port):
+        p.kill()
+        raise RuntimeError(f"{name} did not start listening on {host}:{port}")
+    return p
+
+
+def stop(procs):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+class Sink:
+    """asyncio TCP server that timestamps every frame it receives."""
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.arrivals = {}   # payload -> perf_counter() at arrival
+        self.server = None
+
+    async def _on_conn(self, reader, writer):
+        try:
+            while (data := await read_frame(reader)) is not None:
+                self.arrivals[bytes(data)] = time.perf_counter()
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_conn, self.host, self.port, backlog=1024)
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+def summarize(latencies_s):
+    ms = [x * 1000 for x in latencies_s]
+    return {
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+    }
+
+
+class SinkThread:
+    """Run one Sink per address on a background event loop (for blocking benchmarks)."""
+    def __init__(self, addrs):
+        self.addrs = [tuple(a) for a in addrs]
+        self.sinks = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        async def start_all():
+            for host, port in self.addrs:
+                sink = Sink(host, port)
+                await sink.start()
+                self.sinks.append(sink)
+        asyncio.run_coroutine_threadsafe(start_all(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        async def close_all():
+            for sink in self.sinks:
+                await sink.close()
+        asyncio.run_coroutine_threadsafe(close_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
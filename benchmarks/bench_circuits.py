@@ -0,0 +1,152 @@
+# benchmarks/bench_circuits.py
+"""
+One onion per message vs one circuit per route (circuit.py), over a real
+3-hop path.
+
+Each mode gets a fresh mesh: three node.py relays (no drops, no simulated
+delay) and destination.py as subprocesses, on free loopback ports in a temp
+dir. The sender side runs in-process, with a ConnectionPool and an
+AckListener as in sender.py, so every message is confirmed by the
+destination's ACK.
+
+    throughput  --messages messages along one route, with at most --window
+                frames (onions or cells) whose message awaits its ACK.
+                Includes building each onion or encrypting the cells.
+                Reported as ACKed messages/s with RTT percentiles. The
+                relays add 1 ms of simulated processing per queued packet
+                (NodeBehavior.processing_delay), so a window much larger
+                than their 32 workers measures that model instead
+    sequential  --probes messages one at a time. RTT p50 divided by the
+                four links (sender, 3 relays, destination) gives a per-hop
+                figure
+    relays      p50 of the relays' own "decrypt" (peel, or the circuit
+                lookup and CTR) and "forward" histograms, read from their
+                metrics/<node>.json
+
+--size is the message text in bytes; circuit messages longer than a cell's
+chunk (circuit.CHUNK) go as several cells.
+
+Usage:
+    python benchmarks/bench_circuits.py [--messages 20000] [--window 32] [--size 64] [--engine thread]
+"""
+import argparse, json, os, subprocess, sys, threading, time
+
+from _common import ROOT, make_config, workdir, spawn_node, stop, wait_for_port, summarize
+from circuit import CircuitPool, CHUNK
+from connpool import ConnectionPool
+from onion import OnionBuilder
+from sender import AckListener
+
+RELAYS = ("BenchR1", "BenchR2", "BenchR3")
+DEST_PY = os.path.join(ROOT, "destination.py")
+METRICS_INTERVAL = 0.2
+
+
+class Mode:
+    """Sends one message along RELAYS, by onion or over a circuit."""
+    def __init__(self, name, cfg, pool, acks):
+        self.cfg, self.pool, self.acks = cfg, pool, acks
+        self.circuits = CircuitPool(cfg, pool, acks) if name == "circuit" else None
+        self.builder = OnionBuilder(cfg)
+        self.addr = cfg["addrs"][RELAYS[0]]
+
+    def message(self, msg_id, text):
+        return json.dumps({"id": msg_id, "message": text, "reply_to": list(self.acks.addr)}).encode()
+
+    def frames(self, message):
+        return 1 if self.circuits is None else -(-len(message) // CHUNK)
+
+    def send(self, msg_id, message):
+        ack = self.acks.expect(msg_id)
+        if self.circuits is not None:
+            self.circuits.send(RELAYS, message)
+        else:
+            self.pool.send(self.addr, self.builder.build(RELAYS, message))
+        return ack
+
+
+def release(slots, n):
+    for _ in range(n):
+        slots.release()
+
+
+def throughput(mode, messages, window, text):
+    slots = threading.BoundedSemaphore(window)
+    pending = []
+    t0 = time.perf_counter()
+    for i in range(messages):
+        message = mode.message(f"t{i}", text)
+        n = min(mode.frames(message), window)
+        for _ in range(n):
+            slots.acquire()
+        ack = mode.send(f"t{i}", message)
+        ack.add_done_callback(lambda f, n=n: release(slots, n))
+        pending.append(ack)
+    rtts = [f.result() for f in pending]
+    elapsed = time.perf_counter() - t0
+    acked = [r for r in rtts if r is not None]
+    return {"acked": len(acked), "msgs_per_s": round(len(acked) / elapsed), **summarize(acked)}
+
+
+def sequential(mode, probes, text):
+    rtts = [mode.send(f"s{i}", mode.message(f"s{i}", text)).result() for i in range(probes)]
+    acked = [r for r in rtts if r is not None]
+    p50 = summarize(acked)["p50_ms"]
+    return {"rtt_p50_ms": p50, "per_hop_ms": round(p50 / (len(RELAYS) + 1), 3)}
+
+
+def relay_histograms():
+    out = {}
+    for hist in ("decrypt", "forward"):
+        vals = []
+        for name in RELAYS:
+            with open(os.path.join("metrics", f"{name}.json")) as f:
+                vals.append(json.load(f)["histograms"][hist]["p50_ms"])
+        out[f"{hist}_p50_ms"] = round(sum(vals) / len(vals), 3)
+    return out
+
+
+def run(name, args):
+    behavior = {r: {"drop_prob": 0.0, "delay_mean": 0.0, "delay_std": 0.0, "capacity": 10 ** 6} for r in RELAYS}
+    cfg = make_config([*RELAYS, "Destination"], behavior)
+    text = "x" * args.size
+    with workdir(cfg):
+        procs = [spawn_node(r, cfg, "--engine", args.engine, "--metrics-interval", str(METRICS_INTERVAL))
+                 for r in RELAYS]
+        env = {**os.environ, "PYTHONPATH": ROOT, "NODE_LOG_LEVEL": "warning"}
+        procs.append(subprocess.Popen([sys.executable, DEST_PY], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT))
+        pool, acks = ConnectionPool(), AckListener(timeout=args.timeout)
+        try:
+            if not wait_for_port(*cfg["addrs"]["Destination"]):
+                raise RuntimeError("destination did not start")
+            mode = Mode(name, cfg, pool, acks)
+            mode.send("warmup", mode.message("warmup", text)).result()   # connections up (and, for circuits, the CREATE done)
+            result = {**throughput(mode, args.messages, args.window, text), **sequential(mode, args.probes, text)}
+            time.sleep(3 * METRICS_INTERVAL)
+            result.update(relay_histograms())
+            if mode.circuits is not None:
+                mode.circuits.close()
+            return result
+        finally:
+            acks.close()
+            pool.close()
+            stop(procs)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--window", type=int, default=32, help="frames whose message awaits its ACK")
+    ap.add_argument("--probes", type=int, default=500, help="sequential messages for the per-hop figure")
+    ap.add_argument("--size", type=int, default=64, help=f"message text bytes (a cell carries {CHUNK})")
+    ap.add_argument("--engine", choices=["thread", "asyncio"], default="thread", help="relay engine")
+    ap.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for each ACK")
+    args = ap.parse_args()
+
+    print(f"{'mode':<8} {'acked':>6} {'msg/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'seq RTT':>8} "
+          f"{'per hop':>8} {'decrypt':>8} {'forward':>8}")
+    for name in ("onion", "circuit"):
+        r = run(name, args)
+        print(f"{name:<8} {r['acked']:>6} {r['msgs_per_s']:>7} {r['p50_ms']:>7} {r['p99_ms']:>7} "
+              f"{r['rtt_p50_ms']:>8} {r['per_hop_ms']:>8} {r['decrypt_p50_ms']:>8} {r['forward_p50_ms']:>8}")
@@ -0,0 +1,62 @@
+# benchmarks/bench_connpool.py
+"""
+One TCP connection per packet vs a pooled long-lived connection.
+
+Sends `--packets` small frames from one thread to an in-process sink, first
+opening a fresh socket for every frame (the old behaviour) and then through
+connpool.ConnectionPool. Reports frames/sec on the sending side.
+
+Usage:
+    python benchmarks/bench_connpool.py [--packets 5000]
+"""
+import argparse, asyncio, socket, threading, time
+
+from _common import free_port, Sink
+from framing import send_frame
+from connpool import ConnectionPool
+
+
+def one_shot(addr, frames):
+    for f in frames:
+        with socket.create_connection(addr, timeout=2.0) as s:
+            send_frame(s, f)
+
+
+def pooled(addr, frames):
+    pool = ConnectionPool()
+    for f in frames:
+        pool.send(addr, f)
+    pool.close()
+
+
+def run_sink(addr, ready, stop):
+    async def main():
+        sink = Sink(*addr)
+        await sink.start()
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        await sink.close()
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--packets", type=int, default=5000)
+    args = ap.parse_args()
+
+    addr = ("127.0.0.1", free_port())
+    ready, stop = threading.Event(), threading.Event()
+    t = threading.Thread(target=run_sink, args=(addr, ready, stop), daemon=True)
+    t.start()
+    ready.wait()
+
+    frames = [f"packet {i}".encode() * 20 for i in range(args.packets)]
+    print(f"{'mode':<10} {'frames/s':>10}")
+    for name, fn in (("one-shot", one_shot), ("pooled", pooled)):
+        t0 = time.perf_counter()
+        fn(addr, frames)
+        print(f"{name:<10} {args.packets / (time.perf_counter() - t0):>10.0f}")
+    time.sleep(0.5)   # let the sink drain queued connections before shutting it down
+    stop.set()
+    t.join()
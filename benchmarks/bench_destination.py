@@ -0,0 +1,127 @@
+# benchmarks/bench_destination.py
+"""
+Destination throughput: messages in, ACKs out.
+
+destination.py runs as a subprocess on its own keys.json. --connections
+framed connections play the last-hop relays and write --messages innermost
+layers as fast as they can. Each message asks for an ACK at one of
+--endpoints sender.AckListener endpoints. With --slow, that fraction of
+messages names a blackhole endpoint instead: it never accepts, so
+connecting to it hangs until the ACK sender's timeout.
+
+The report gives the ACK rate to the healthy endpoints, RTT percentiles
+(from the start of the burst, so they mostly show how long the queue took
+to drain) and how many ids arrived per ACK frame (coalescing). --script
+runs another destination.py for comparison, e.g. one saved with
+`git show <rev>:destination.py > /tmp/old_destination.py`.
+
+Usage:
+    python benchmarks/bench_destination.py [--messages 20000] [--connections 8] [--slow 0 0.05]
+"""
+import argparse, asyncio, base64, json, os, random, socket, subprocess, sys, time
+
+from _common import ROOT, make_config, workdir, wait_for_port, summarize
+from framing import write_frame
+from onion import seal_gcm
+from sender import AckListener
+
+DEST_PY = os.path.join(ROOT, "destination.py")
+
+
+class CountingAckListener(AckListener):
+    def __init__(self, *args, **kwargs):
+        self.frames = 0
+        super().__init__(*args, **kwargs)
+
+    def _ack(self, data):
+        self.frames += 1
+        super()._ack(data)
+
+
+def blackhole():
+    """A listening socket whose accept queue is full: connects to it hang."""
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    s.listen(0)
+    fillers = []
+    for _ in range(4):
+        c = socket.socket()
+        c.setblocking(False)
+        c.connect_ex(s.getsockname())
+        fillers.append(c)
+    return s, fillers
+
+
+async def blast(addr, frames, connections):
+    async def one(chunk):
+        _, writer = await asyncio.open_connection(*addr)
+        for frame in chunk:
+            write_frame(writer, frame)
+            if writer.transport.get_write_buffer_size() > 1 << 20:
+                await writer.drain()
+        await writer.drain()
+        writer.close()
+    await asyncio.gather(*(one(frames[i::connections]) for i in range(connections)))
+
+
+def run(script, messages, connections, endpoints, slow, timeout):
+    cfg = make_config(["Destination"])
+    key = base64.b64decode(cfg["keys"]["Destination"])
+    with workdir(cfg):
+        env = {**os.environ, "PYTHONPATH": ROOT, "NODE_LOG_LEVEL": "warning"}
+        p = subprocess.Popen([sys.executable, script], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        listeners = [CountingAckListener(timeout=timeout) for _ in range(endpoints)]
+        hole, fillers = blackhole()
+        try:
+            if not wait_for_port(*cfg["addrs"]["Destination"]):
+                raise RuntimeError("destination did not start")
+            rng = random.Random(1)
+            frames, futures = [], []
+            for i in range(messages):
+                if rng.random() < slow:
+                    reply_to = list(hole.getsockname())
+                else:
+                    acks = listeners[i % endpoints]
+                    reply_to = list(acks.addr)
+                    futures.append((acks, str(i)))
+                frames.append(seal_gcm(key, json.dumps({"id": str(i), "message": "x" * 64,
+                                                        "reply_to": reply_to}).encode()))
+            pending = [acks.expect(msg_id) for acks, msg_id in futures]
+            t0 = time.perf_counter()
+            asyncio.run(blast(tuple(cfg["addrs"]["Destination"]), frames, connections))
+            rtts = [f.result() for f in pending]
+            acked = [r for r in rtts if r is not None]
+            elapsed = max(acked) if acked else time.perf_counter() - t0
+            frames_in = sum(a.frames for a in listeners)
+            return {"messages": messages, "healthy": len(pending), "acked": len(acked),
+                    "acks_per_s": round(len(acked) / elapsed) if acked else 0,
+                    **summarize(acked), "ids_per_frame": round(len(acked) / max(1, frames_in), 1)}
+        finally:
+            for acks in listeners:
+                acks.close()
+            for c in fillers:
+                c.close()
+            hole.close()
+            p.terminate()
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--connections", type=int, default=8, help="simulated last-hop relay connections")
+    ap.add_argument("--endpoints", type=int, default=4, help="healthy reply_to endpoints")
+    ap.add_argument("--slow", type=float, nargs="+", default=[0.0, 0.05],
+                    help="fractions of messages whose reply_to is a blackhole")
+    ap.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each ACK")
+    ap.add_argument("--script", default=DEST_PY, help="destination script to run")
+    args = ap.parse_args()
+
+    print(f"{'slow':>5} {'healthy':>8} {'acked':>7} {'ACK/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'ids/frame':>9}")
+    for slow in args.slow:
+        r = run(args.script, args.messages, args.connections, args.endpoints, slow, args.timeout)
+        print(f"{slow:>5.2f} {r['healthy']:>8} {r['acked']:>7} {r['acks_per_s']:>7} "
+              f"{r['p50_ms']:>8} {r['p99_ms']:>8} {r['ids_per_frame']:>9}")
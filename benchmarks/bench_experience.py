@@ -0,0 +1,114 @@
+# benchmarks/bench_experience.py
+"""
+RouteRLAgent learning backends: one scalar update per episode vs experience
+replay (experience.ReplayBuffer, vectorized steps over sampled minibatches).
+
+Both parts replay the logged history, the (route, reward) rows of
+logs/performance_log.csv (--log), without a network:
+
+    speed       agent.update() over the history repeated to --updates rows,
+                including the table's checkpoints (the default of every 100
+                episodes) and, for replay, its learning steps. Reported as
+                episodes/s and as Q-updates/s: a replay step updates from the
+                new experiences and the minibatch, so it learns from more
+                samples per episode
+    convergence the rows are fed in logged order. Each route's mean reward
+                over the whole history stands in for its true value (routes
+                with fewer than --min-count rows are left out). Every --every
+                rows, the greedy route is scored by its regret: the best
+                mean minus the greedy route's mean. The convergence row is
+                the first at which the regret, averaged over --window
+                checkpoints, is within --tolerance. The history is fed
+                --passes times, since one run of the sender is short.
+
+Replay configs are buffer/update_every/minibatch, e.g. 10000/16/64. The
+buffer's sampling is seeded, so results are repeatable.
+
+Usage:
+    python benchmarks/bench_experience.py [--log logs/performance_log.csv] [--configs 10000/16/64 10000/1/8]
+"""
+import argparse, os, time
+
+import numpy as np
+
+from _common import ROOT, workdir
+from bench_route_convergence import converged_at
+from experience import ReplayBuffer
+from perflog import read_logs
+from sender import RouteRLAgent, CHECKPOINT_EVERY
+
+
+def history(path, passes):
+    df = read_logs(path)
+    routes = [tuple(r.split("→")) for r in df["route"]]
+    layers = {f"L{i + 1}": sorted({r[i] for r in routes}) for i in range(len(routes[0]))}
+    rewards = df["reward"].astype(float).tolist()
+    return layers, routes * passes, rewards * passes, df
+
+
+def make_agent(layers, config, alpha, checkpoint_every, seed=1):
+    if config == "scalar":
+        return RouteRLAgent(layers, alpha, epsilon=0.0, qfile="q.json", checkpoint_every=checkpoint_every)
+    size, every, minibatch = map(int, config.split("/"))
+    return RouteRLAgent(layers, alpha, epsilon=0.0, qfile="q.json", checkpoint_every=checkpoint_every,
+                        buffer=ReplayBuffer(size, seed=seed), update_every=every, minibatch=minibatch)
+
+
+def updates_per_s(layers, routes, rewards, config, alpha, n):
+    reps = -(-n // len(routes))
+    routes, rewards = (routes * reps)[:n], (rewards * reps)[:n]
+    with workdir():
+        agent = make_agent(layers, config, alpha, CHECKPOINT_EVERY)
+        t0 = time.perf_counter()
+        for route, reward in zip(routes, rewards):
+            agent.update(route, reward)
+        agent.flush_updates()
+        elapsed = time.perf_counter() - t0
+        mem = agent.buffer.nbytes if agent.buffer is not None else 0
+        samples = n if agent.buffer is None else n + (-(-n // agent.update_every) - 1) * agent.minibatch
+    return n / elapsed, samples / elapsed, mem
+
+
+def regret_curve(layers, routes, rewards, truth, config, alpha, every):
+    best, worst = max(truth.values()), min(truth.values())
+    regret = []
+    with workdir():
+        agent = make_agent(layers, config, alpha, 10**9)
+        for i, (route, reward) in enumerate(zip(routes, rewards), 1):
+            agent.update(route, reward)
+            if i % every == 0:
+                agent.flush_updates()
+                greedy = agent.best_route()
+                regret.append(best - truth.get(greedy, worst))
+    return np.array(regret)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.path.join(ROOT, "logs", "performance_log.csv"))
+    ap.add_argument("--configs", nargs="+", default=["10000/16/64", "10000/64/256", "10000/256/1024"],
+                    help="replay configs buffer/update_every/minibatch (scalar always runs)")
+    ap.add_argument("--alpha", type=float, default=0.1)
+    ap.add_argument("--updates", type=int, default=200_000, help="updates timed per config")
+    ap.add_argument("--passes", type=int, default=3, help="times the history is fed for convergence")
+    ap.add_argument("--every", type=int, default=100, help="rows between greedy-route checkpoints")
+    ap.add_argument("--window", type=int, default=5)
+    ap.add_argument("--tolerance", type=float, default=0.5)
+    ap.add_argument("--min-count", type=int, default=20, help="rows a route needs to count as known")
+    args = ap.parse_args()
+
+    layers, routes, rewards, df = history(args.log, args.passes)
+    stats = df.groupby("route")["reward"].agg(["mean", "count"])
+    stats = stats[stats["count"] >= args.min_count]
+    truth = {tuple(r.split("→")): m for r, m in stats["mean"].items()}
+    ranked = sorted(truth, key=truth.get, reverse=True)
+    print(f"{len(df)} logged rows, {len(truth)} routes with >= {args.min_count} rows; "
+          f"best {' → '.join(ranked[0])} ({truth[ranked[0]]:.2f}), runner-up {truth[ranked[1]]:.2f}")
+
+    print(f"\n{'backend':<14} {'episodes/s':>10} {'Q-upd/s':>10} {'buffer B':>9} {'converged':>10} {'tail regret':>11}")
+    for config in ["scalar"] + args.configs:
+        rate, qrate, mem = updates_per_s(layers, routes, rewards, config, args.alpha, args.updates)
+        regret = regret_curve(layers, routes, rewards, truth, config, args.alpha, args.every)
+        conv = converged_at(regret, args.tolerance, args.window, args.every)
+        tail = regret[-max(1, len(regret) // 4):].mean()
+        print(f"{config:<14} {rate:>10,.0f} {qrate:>10,.0f} {mem:>9} {conv if conv is not None else 'no':>10} {tail:>11.2f}")
@@ -0,0 +1,80 @@
+# benchmarks/bench_framing.py
+"""
+Framed-transport throughput across a 3-hop circuit for 1 KB .. 10 MB messages.
+
+Three relays run as node.py subprocesses (drops and processing delay disabled)
+and an in-process sink stands in for the Destination. For each message size
+the onion is built up front, then sent `reps` times one after another; the
+time is measured from the first byte leaving the sender to the frame arriving
+at the sink.
+
+Usage:
+    python benchmarks/bench_framing.py [--engine thread|asyncio]
+"""
+import argparse, asyncio, json, os, time
+
+from _common import make_config, workdir, spawn_node, stop, Sink, b64d
+from onion import encrypt_aes
+from framing import write_frame
+
+HOPS = ["BenchL1", "BenchL2", "BenchL3"]
+DEST = "BenchDest"
+SIZES = [1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20]
+
+
+def build_onion(cfg, size):
+    keys = {n: b64d(cfg["keys"][n]) for n in HOPS + [DEST]}
+    enc = encrypt_aes(keys[DEST], os.urandom(size))
+    next_hop = DEST
+    for hop in reversed(HOPS):
+        enc = encrypt_aes(keys[hop], json.dumps({"next_hop": next_hop, "payload": enc}).encode())
+        next_hop = hop
+    return enc.encode()
+
+
+async def drive(cfg, reps):
+    sink = Sink(*cfg["addrs"][DEST])
+    await sink.start()
+    host, port = cfg["addrs"][HOPS[0]]
+    rows = []
+    for size in SIZES:
+        onion = build_onion(cfg, size)
+        times = []
+        for _ in range(reps if size < (1 << 20) else max(1, reps // 5)):
+            before = len(sink.arrivals)
+            t0 = time.perf_counter()
+            _, writer = await asyncio.open_connection(host, port)
+            write_frame(writer, onion)
+            await writer.drain()
+            writer.close()
+            deadline = t0 + 30
+            while len(sink.arrivals) == before and time.perf_counter() < deadline:
+                await asyncio.sleep(0.001)
+            if len(sink.arrivals) == before:
+                raise RuntimeError(f"{size}-byte message never reached the sink")
+            times.append(time.perf_counter() - t0)
+            sink.arrivals.clear()
+        mean = sum(times) / len(times)
+        rows.append((size, len(onion), mean, size / mean / 1e6))
+    await sink.close()
+    return rows
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", choices=["thread", "asyncio"], default="thread")
+    ap.add_argument("--reps", type=int, default=20)
+    args = ap.parse_args()
+
+    behavior = {n: {"drop_prob": 0.0, "delay_mean": 0.0, "delay_std": 0.0} for n in HOPS}
+    cfg = make_config(HOPS + [DEST], behavior)
+    with workdir(cfg):
+        procs = [spawn_node(n, cfg, "--engine", args.engine) for n in HOPS]
+        try:
+            rows = asyncio.run(drive(cfg, args.reps))
+        finally:
+            stop(procs)
+
+    print(f"{'message':>10} {'L1 frame':>12} {'3-hop ms':>10} {'MB/s':>8}")
+    for size, wire, mean, mbps in rows:
+        print(f"{size:>10} {wire:>12} {mean * 1000:>10.2f} {mbps:>8.2f}")
@@ -0,0 +1,71 @@
+# benchmarks/bench_greedy.py
+"""
+Greedy route selection + Q-update cost as the number of relays per layer grows.
+
+For each L the table is pre-filled with min(L^3, --max-routes) learned routes,
+then `--ops` greedy steps are timed (choose the best route, update it with a
+random reward, as an exploiting agent does):
+
+    legacy  dict + max(q_table, key=q_table.get)  (O(routes) per step)
+    heap    qtable.QTable.best_route() / set()     (O(log routes) amortized)
+
+Usage:
+    python benchmarks/bench_greedy.py [--sizes 4 10 25 50 100 200]
+"""
+import argparse, random, time
+
+import numpy as np
+
+from _common import workdir
+from qtable import QTable
+
+
+def make_layers(n):
+    return {f"L{l}": [f"L{l}_Node{i}" for i in range(n)] for l in (1, 2, 3)}
+
+
+def sample_routes(layers, k):
+    total = len(layers["L1"]) * len(layers["L2"]) * len(layers["L3"])
+    flat = random.sample(range(total), min(k, total))
+    n2, n3 = len(layers["L2"]), len(layers["L3"])
+    return [(layers["L1"][i // (n2 * n3)], layers["L2"][(i // n3) % n2], layers["L3"][i % n3]) for i in flat]
+
+
+def bench(n, max_routes, ops):
+    layers = make_layers(n)
+    routes = sample_routes(layers, max_routes)
+    values = [random.uniform(-15, 10) for _ in routes]
+
+    q_dict = dict(zip(routes, values))
+    legacy_ops = max(5, min(ops, 2_000_000 // len(routes)))
+    t0 = time.perf_counter()
+    for _ in range(legacy_ops):
+        best = max(q_dict, key=q_dict.get)
+        q_dict[best] += 0.1 * (random.uniform(-15, 10) - q_dict[best])
+    legacy = (time.perf_counter() - t0) / legacy_ops
+
+    with workdir():
+        table = QTable(layers)
+        table.load_items(zip(routes, values))
+        t0 = time.perf_counter()
+        for _ in range(ops):
+            best = table.best_route()
+            old = table.get(best)
+            table.set(best, old + 0.1 * (random.uniform(-15, 10) - old))
+        heap = (time.perf_counter() - t0) / ops
+        assert table.route_at_flat(int(np.nanargmax(table.flat))) == table.best_route()
+        del table
+    return len(routes), legacy, heap
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[4, 10, 25, 50, 100, 200])
+    ap.add_argument("--max-routes", type=int, default=1_000_000)
+    ap.add_argument("--ops", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"{'L':>4} {'learned routes':>14} {'legacy us/step':>15} {'heap us/step':>13} {'speedup':>8}")
+    for n in args.sizes:
+        routes, legacy, heap = bench(n, args.max_routes, args.ops)
+        print(f"{n:>4} {routes:>14} {legacy * 1e6:>15.1f} {heap * 1e6:>13.2f} {legacy / heap:>7.1f}x")
@@ -0,0 +1,188 @@
+# benchmarks/bench_mesh_load.py
+"""
+Capacity benchmark: the full 12-node mesh + destination under open-loop load.
+
+For every rate in --rates a fresh mesh is started with run_all_nodes.py (on
+free loopback ports, in a temp dir) and loadgen.generate() offers that many
+messages/s for --duration seconds. The mesh is then stopped with SIGINT, so
+every node writes its final metrics/<node>.json.
+
+Per rate it reports end-to-end throughput (ACKed messages/s), p50/p95/p99
+RTT, overall loss, and per layer the share of accepted packets dropped
+(early + overload + refused by admission control). The mesh's node behaviour
+and admission settings are copied from ./keys.json when present, so the
+configured base drop rates show up at every rate; --admission and
+--signal-congestion override the latter. --layers / --nodes benchmark a
+generated mesh instead (topology.py: any depth, relay behaviour drawn
+with --seed). The
+saturation rate is the first rate where the delivery ratio, or any layer's
+drop rate, is more than --knee-margin worse than at the lowest rate. That is
+where NodeBehavior.capacity overload kicks in.
+
+Results are written as JSON (with the git commit) to --out; --baseline
+prints a per-rate comparison with an earlier result file.
+
+Usage:
+    python benchmarks/bench_mesh_load.py [--rates 25 50 100 200 400] [--duration 5] [--mode supervisor]
+    python benchmarks/bench_mesh_load.py --layers 5 --nodes 40 --rates 100 200 400
+    python benchmarks/bench_mesh_load.py --baseline benchmarks/results/mesh_load-<commit>.json
+"""
+import argparse, asyncio, glob, json, os, random, signal, subprocess, sys, time
+
+from _common import ROOT, make_config, workdir, wait_for_port
+import run_all_nodes
+import loadgen
+import topology
+
+LAUNCHER = os.path.join(ROOT, "run_all_nodes.py")
+LAYERS = {"L1": run_all_nodes.L1, "L2": run_all_nodes.L2, "L3": run_all_nodes.L3}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def start_mesh(mode, cfg):
+    """Launch the mesh in the cwd (keys.json already written) and wait for every listener."""
+    out = open(os.environ["BENCH_NODE_LOG"], "a") if os.environ.get("BENCH_NODE_LOG") else subprocess.DEVNULL
+    extra = ["--report-interval", "0"] if mode == "supervisor" else []
+    p = subprocess.Popen([sys.executable, LAUNCHER, mode, *extra], stdout=out, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+    for name, addr in cfg["addrs"].items():
+        if not wait_for_port(*addr, timeout=20):
+            stop_mesh(p)
+            raise RuntimeError(f"{name} did not come up")
+    return p
+
+
+def stop_mesh(p):
+    """SIGINT is the launcher's Ctrl+C path: children stop cleanly and flush their metrics."""
+    p.send_signal(signal.SIGINT)
+    try:
+        p.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(p.pid, signal.SIGKILL)
+        p.wait()
+    try:
+        os.killpg(p.pid, signal.SIGTERM)   # the destination and anything else left behind
+    except ProcessLookupError:
+        pass
+    time.sleep(0.5)
+
+
+def layer_drops(layers):
+    snaps = {}
+    for path in glob.glob(os.path.join("metrics", "*.json")):
+        with open(path) as f:
+            snap = json.load(f)
+        snaps[snap["node"]] = snap["counters"]
+    out = {}
+    for layer, nodes in layers.items():
+        accepted = sum(snaps.get(n, {}).get("accepted", 0) for n in nodes)
+        dropped = sum(snaps.get(n, {}).get(c, 0) for n in nodes
+                      for c in ("dropped_early", "dropped_overload", "dropped_admission"))
+        out[layer] = {"accepted": accepted, "dropped": dropped,
+                      "drop_rate": round(dropped / accepted, 4) if accepted else None}
+    return out
+
+
+def saturation(steps, margin):
+    """First rate whose delivery ratio or any layer's drop rate is `margin` worse than at the lowest rate."""
+    layers = list(steps[0]["layers"])
+    base = {l: steps[0]["layers"][l]["drop_rate"] or 0.0 for l in layers}
+    base_delivery = 1 - steps[0]["loss_rate"]
+    for s in steps:
+        if 1 - s["loss_rate"] < base_delivery - margin:
+            return s["offered_rate"]
+        if any((s["layers"][l]["drop_rate"] or 0.0) > base[l] + margin for l in layers):
+            return s["offered_rate"]
+    return None
+
+
+def compare(result, baseline, baseline_path):
+    base = {s["offered_rate"]: s for s in baseline["steps"]}
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')})")
+    print(f"{'rate':>6} {'thru':>8} {'Δ thru':>8} {'p99 ms':>8} {'Δ p99':>8}")
+    for s in result["steps"]:
+        b = base.get(s["offered_rate"])
+        if not b:
+            continue
+        dp99 = (s["p99_ms"] or 0) - (b["p99_ms"] or 0)
+        print(f"{s['offered_rate']:>6g} {s['throughput']:>8} {s['throughput'] - b['throughput']:>+8.1f} "
+              f"{s['p99_ms']!s:>8} {dp99:>+8.1f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rates", type=float, nargs="+", default=[25, 50, 100, 200, 400])
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--size", type=int, default=256)
+    ap.add_argument("--route", default=None, help="fixed route, e.g. L1_NodeA,L2_NodeB,L3_NodeC")
+    ap.add_argument("--routes", choices=loadgen.ROUTE_MODES, default="random")
+    ap.add_argument("--arrivals", choices=["fixed", "poisson"], default="poisson")
+    ap.add_argument("--mode", choices=["thread", "proc", "supervisor"], default="supervisor")
+    ap.add_argument("--ack-timeout", type=float, default=3.0)
+    ap.add_argument("--admission", choices=["tail", "red", "reject"], default=None)
+    ap.add_argument("--signal-congestion", action="store_true")
+    ap.add_argument("--knee-margin", type=float, default=0.05, help="drop-rate rise over baseline that marks overload")
+    ap.add_argument("--layers", type=int, default=None, help="generated mesh: number of layers")
+    ap.add_argument("--nodes", type=int, default=4, help="generated mesh: relays per layer")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="result file (default benchmarks/results/mesh_load-<commit>.json)")
+    ap.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    args = ap.parse_args()
+
+    baseline = None
+    if args.baseline:   # read now: the new result may be written to the same path
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    layers, behavior, admission = LAYERS, {}, {}
+    if os.path.exists(os.path.join(ROOT, "keys.json")):
+        live = topology.load_config(os.path.join(ROOT, "keys.json"))
+        behavior, admission = live.get("behavior", {}), dict(live.get("admission", {}))
+    if args.layers:
+        layers = topology.node_names(args.layers, args.nodes)
+        behavior = topology.random_behavior([n for ns in layers.values() for n in ns], random.Random(args.seed))
+    if args.admission:
+        admission["policy"] = args.admission
+    if args.signal_congestion:
+        admission["signal"] = True
+    cfg = make_config([n for ns in layers.values() for n in ns] + [run_all_nodes.DEST], behavior)
+    cfg["admission"] = admission
+    qfile = "route_qtable.json" if args.layers else os.path.join(ROOT, "route_qtable.json")   # generated: per-run table
+    routes = args.route.split(",") if args.route else args.routes
+
+    steps = []
+    print(f"{'rate':>6} {'acked':>7} {'thru/s':>8} {'loss':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          + " ".join(f"{l + ' drop':>8}" for l in layers))
+    for rate in args.rates:
+        with workdir(cfg):
+            mesh = start_mesh(args.mode, cfg)
+            try:
+                r = asyncio.run(loadgen.generate(cfg, rate, args.duration, args.size, routes, args.arrivals,
+                                                 args.seed, ack_timeout=args.ack_timeout, qfile=qfile))
+            finally:
+                stop_mesh(mesh)
+            r["layers"] = layer_drops(layers)
+        steps.append(r)
+        print(f"{rate:>6g} {r['acked']:>7} {r['throughput']:>8} {r['loss_rate']:>6} {r['p50_ms']!s:>8} "
+              f"{r['p95_ms']!s:>8} {r['p99_ms']!s:>8} "
+              + " ".join(f"{r['layers'][l]['drop_rate']!s:>8}" for l in layers))
+
+    result = {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+              "saturation_rate": saturation(steps, args.knee_margin), "steps": steps}
+    print(f"\nsaturation (capacity overload) at: {result['saturation_rate'] or 'not reached'} msg/s")
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"mesh_load-{result['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results saved to {out}")
+    if baseline:
+        compare(result, baseline, args.baseline)
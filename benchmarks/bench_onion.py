@@ -0,0 +1,69 @@
+# benchmarks/bench_onion.py
+"""
+Onion construction: legacy JSON/base64 layers vs onion.OnionBuilder.
+
+    legacy   keys re-decoded per onion, JSON + base64 at every layer (old sender.py)
+    binary   cached keys, binary layers, one onion at a time
+    batch    cached keys, binary layers, build_batch() of --batch onions
+
+Reports onions/sec and the bytes handed to the first hop for 3-hop and deeper
+circuits. Every format is peeled hop by hop with onion.peel() as a check.
+
+Usage:
+    python benchmarks/bench_onion.py [--hops 3 5 8] [--sizes 64 1024]
+"""
+import argparse, json, time
+
+from _common import make_config, b64d
+from onion import OnionBuilder, encrypt_aes, peel, open_message
+
+
+def legacy_build(cfg, route, message):
+    enc = encrypt_aes(b64d(cfg["keys"]["Destination"]), message)
+    next_hop = "Destination"
+    for hop in reversed(route):
+        enc = encrypt_aes(b64d(cfg["keys"][hop]), json.dumps({"next_hop": next_hop, "payload": enc}).encode())
+        next_hop = hop
+    return enc.encode()
+
+
+def check(cfg, route, onion, message):
+    data = onion
+    for hop in route:
+        next_hop, data = peel(b64d(cfg["keys"][hop]), data)
+    assert next_hop == "Destination" and open_message(b64d(cfg["keys"]["Destination"]), data) == message
+
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    fn(n)
+    return n / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hops", type=int, nargs="+", default=[3, 5, 8])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[64, 1024])
+    ap.add_argument("--count", type=int, default=5000)
+    ap.add_argument("--batch", type=int, default=256)
+    args = ap.parse_args()
+
+    print(f"{'hops':>4} {'msg B':>6} | {'legacy /s':>10} {'bytes':>7} | {'binary /s':>10} {'batch /s':>10} {'bytes':>7}")
+    for hops in args.hops:
+        route = [f"Relay{i}" for i in range(hops)]
+        cfg = make_config(route + ["Destination"])
+        builder = OnionBuilder(cfg, "binary")
+        for size in args.sizes:
+            message = b"x" * size
+            legacy = legacy_build(cfg, route, message)
+            binary = builder.build(route, message)
+            check(cfg, route, legacy, message)
+            check(cfg, route, binary, message)
+
+            r_legacy = rate(lambda n: [legacy_build(cfg, route, message) for _ in range(n)], args.count)
+            r_binary = rate(lambda n: [builder.build(route, message) for _ in range(n)], args.count)
+            items = [(route, message)] * args.batch
+            r_batch = rate(lambda n: [builder.build_batch(items) for _ in range(n // args.batch)],
+                           args.count // args.batch * args.batch)
+            print(f"{hops:>4} {size:>6} | {r_legacy:>10.0f} {len(legacy):>7} | "
+                  f"{r_binary:>10.0f} {r_batch:>10.0f} {len(binary):>7}")
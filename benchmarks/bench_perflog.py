@@ -0,0 +1,52 @@
+# benchmarks/bench_perflog.py
+"""
+Per-episode logging cost: reopen-and-append CSV vs perflog.PerformanceLog.
+
+Times `--rows` calls on the episode loop's side (including the final flush)
+and reports the bytes on disk for each format.
+
+Usage:
+    python benchmarks/bench_perflog.py [--rows 50000]
+"""
+import argparse, csv, os, time
+
+from _common import workdir
+from perflog import PerformanceLog, log_files
+
+ROUTE = ("L1_NodeA", "L2_NodeB", "L3_NodeC")
+
+
+def legacy_log(route, success, latency, reward, logfile="logs/performance_log.csv"):
+    os.makedirs("logs", exist_ok=True)
+    write_header = not os.path.exists(logfile)
+    with open(logfile, "a", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        if write_header:
+            writer.writerow(["timestamp", "route", "success", "latency", "reward"])
+        writer.writerow([time.strftime('%Y-%m-%d %H:%M:%S'), "→".join(route), int(success),
+                         round(latency, 4), round(reward, 3)])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50000)
+    args = ap.parse_args()
+
+    print(f"{'writer':<18} {'us/row':>8} {'bytes':>10}")
+    with workdir():
+        t0 = time.perf_counter()
+        for i in range(args.rows):
+            legacy_log(ROUTE, i % 2, 0.0123, 9.5)
+        per_row = (time.perf_counter() - t0) / args.rows
+        print(f"{'reopen csv':<18} {per_row * 1e6:>8.2f} {os.path.getsize('logs/performance_log.csv'):>10}")
+
+    for fmt in ("csv", "csv.gz", "parquet"):
+        with workdir():
+            log = PerformanceLog(fmt=fmt)
+            t0 = time.perf_counter()
+            for i in range(args.rows):
+                log.log(ROUTE, i % 2, 0.0123, 9.5)
+            log.close()
+            per_row = (time.perf_counter() - t0) / args.rows
+            size = sum(os.path.getsize(p) for p in log_files())
+            print(f"{'buffered ' + fmt:<18} {per_row * 1e6:>8.2f} {size:>10}")
@@ -0,0 +1,77 @@
+# benchmarks/bench_qtable.py
+"""
+Q-table startup and per-episode update cost: legacy JSON table vs qtable.QTable.
+
+For L nodes per layer (L^3 routes, every route learned) it measures
+
+    load        legacy: json.load + eval() of every key
+                new:    reopen the memory-mapped .npy (after a one-off JSON import)
+    update      legacy: dict update + full json.dump(indent=2), as every episode did
+                new:    RouteRLAgent.update() incl. a checkpoint every 100 episodes
+
+Usage:
+    python benchmarks/bench_qtable.py [--sizes 4 20 50]
+"""
+import argparse, json, random, time
+
+from _common import workdir
+from sender import RouteRLAgent
+
+
+def make_layers(n):
+    return {f"L{l}": [f"L{l}_Node{i}" for i in range(n)] for l in (1, 2, 3)}
+
+
+def legacy_load(path):
+    with open(path, "r") as f:
+        return {tuple(eval(k)): v for k, v in json.load(f).items()}
+
+
+def legacy_save(path, q_table):
+    with open(path, "w") as f:
+        json.dump({str(k): v for k, v in q_table.items()}, f, indent=2)
+
+
+def bench(n, episodes):
+    layers = make_layers(n)
+    routes = [(a, b, c) for a in layers["L1"] for b in layers["L2"] for c in layers["L3"]]
+    with workdir():
+        legacy_save("route_qtable.json", {r: random.uniform(-15, 10) for r in routes})
+
+        t0 = time.perf_counter()
+        q = legacy_load("route_qtable.json")
+        legacy_load_s = time.perf_counter() - t0
+        legacy_eps = min(episodes, max(3, 2000 // n))
+        t0 = time.perf_counter()
+        for _ in range(legacy_eps):
+            r = random.choice(routes)
+            q[r] = q[r] + 0.1 * (1.0 - q[r])
+            legacy_save("route_qtable.json", q)
+        legacy_update_s = (time.perf_counter() - t0) / legacy_eps
+
+        t0 = time.perf_counter()
+        RouteRLAgent(layers).save()              # one-off import from JSON
+        import_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        agent = RouteRLAgent(layers)             # steady state: reopen .npy
+        load_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(episodes):
+            agent.update(random.choice(routes), 1.0)
+        update_s = (time.perf_counter() - t0) / episodes
+        agent.save()
+    return len(routes), legacy_load_s, legacy_update_s, import_s, load_s, update_s
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[4, 20, 50])
+    ap.add_argument("--episodes", type=int, default=10000)
+    args = ap.parse_args()
+
+    print(f"{'L':>4} {'routes':>8} | {'legacy load ms':>14} {'legacy upd ms':>13} | "
+          f"{'import ms':>9} {'load ms':>8} {'upd us':>7}")
+    for n in args.sizes:
+        routes, ll, lu, imp, lo, up = bench(n, args.episodes)
+        print(f"{n:>4} {routes:>8} | {ll * 1e3:>14.1f} {lu * 1e3:>13.2f} | "
+              f"{imp * 1e3:>9.1f} {lo * 1e3:>8.2f} {up * 1e6:>7.2f}")
@@ -0,0 +1,80 @@
+# benchmarks/bench_relay_engines.py
+"""
+Threaded vs asyncio relay engine: packets/sec and hop latency through one node.
+
+A single relay (node.py as a subprocess) forwards every packet to an
+in-process sink. Drops are disabled so every packet should arrive; the
+per-packet processing delay is kept so the threaded engine pays for the
+sleeping threads it parks.
+
+Usage:
+    python benchmarks/bench_relay_engines.py [--packets 2000] [--concurrency 200] [--delay-mean 0.02]
+"""
+import argparse, asyncio, json, time
+
+from _common import make_config, workdir, spawn_node, stop, Sink, summarize, b64d
+from onion import encrypt_aes
+from framing import write_frame
+
+RELAY, SINK = "BenchRelay", "BenchSink"
+
+
+async def drive(cfg, packets, concurrency):
+    key = b64d(cfg["keys"][RELAY])
+    onions = [encrypt_aes(key, json.dumps({"next_hop": SINK, "payload": str(i)}).encode()).encode()
+              for i in range(packets)]
+    sink = Sink(*cfg["addrs"][SINK])
+    await sink.start()
+    host, port = cfg["addrs"][RELAY]
+    sent = {}
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(i, onion):
+        async with slots:
+            sent[str(i).encode()] = time.perf_counter()
+            _, writer = await asyncio.open_connection(host, port)
+            write_frame(writer, onion)
+            await writer.drain()
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(send(i, o) for i, o in enumerate(onions)))
+    # wait for stragglers (bounded)
+    deadline = time.perf_counter() + 10
+    while len(sink.arrivals) < packets and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    await sink.close()
+
+    arrived = sink.arrivals
+    elapsed = (max(arrived.values()) - t0) if arrived else float("nan")
+    lat = [arrived[k] - sent[k] for k in arrived]
+    return {"delivered": len(arrived), "pps": round(len(arrived) / elapsed, 1), **summarize(lat)}
+
+
+def run(engine, args):
+    behavior = {RELAY: {"drop_prob": 0.0, "delay_mean": args.delay_mean,
+                        "delay_std": args.delay_mean / 2, "capacity": 10 ** 6}}
+    cfg = make_config([RELAY, SINK], behavior)
+    with workdir(cfg):
+        extra = ["--engine", engine]
+        if engine == "asyncio":
+            extra += ["--max-concurrency", str(args.max_concurrency)]
+        proc = spawn_node(RELAY, cfg, *extra)
+        try:
+            return asyncio.run(drive(cfg, args.packets, args.concurrency))
+        finally:
+            stop([proc])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--packets", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=200, help="client connections in flight")
+    ap.add_argument("--delay-mean", type=float, default=0.02)
+    ap.add_argument("--max-concurrency", type=int, default=256, help="asyncio engine slot limit")
+    args = ap.parse_args()
+
+    print(f"{'engine':<8} {'delivered':>9} {'pkt/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for engine in ("thread", "asyncio"):
+        r = run(engine, args)
+        print(f"{engine:<8} {r['delivered']:>9} {r['pps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
@@ -0,0 +1,125 @@
+# benchmarks/bench_route_convergence.py
+"""
+Convergence speed: tabular RouteRLAgent vs link-decomposed LinkRLAgent.
+
+Agents are trained against simulator.NetworkModel (no sockets):
+
+    route        sender.RouteRLAgent, one Q-value per route
+    link         routing.LinkRLAgent, per-link values from rewards only
+    link+trust   LinkRLAgent with the relays' trust (simulated NodeTrust updates)
+
+Every route's true expected reward is estimated first by Monte Carlo
+(--truth-episodes per route). Every --every episodes the agent's greedy route
+is scored by its regret (best route's value - greedy route's value), and the
+regret is averaged over --seeds. The table shows that average at a few
+points of the run (each point averaged over the checkpoints since the
+previous one), the mean regret over the last quarter of the run, and the
+convergence episode: the first checkpoint at which the average regret,
+smoothed over --window checkpoints, is within --tolerance.
+
+The per-episode reward has a standard deviation around 8, so with a
+constant step size every estimate carries noise of roughly 8 * sqrt(alpha/2).
+That noise, not the agent, sets the floor for regret. The default --alpha is
+therefore smaller than the agents' 0.1.
+
+With --nodes N the mesh is N relays per layer with random behaviour (the
+L^3 route count is what the tabular agent has to explore). Otherwise it
+uses the nodes and behaviour in ./keys.json.
+
+Usage:
+    python benchmarks/bench_route_convergence.py [--episodes 40000] [--seeds 1 2 3 4 5] [--nodes 10]
+"""
+import argparse, itertools, os, random
+
+import numpy as np
+
+from _common import ROOT, workdir
+from simulator import NetworkModel, run_simulation
+from routing import LinkRLAgent, TrustScores
+from sender import RouteRLAgent
+from topology import load_config, node_names
+
+AGENTS = ("route", "link", "link+trust")
+
+
+def mesh(nodes, rng):
+    if nodes is None:
+        cfg = load_config(os.path.join(ROOT, "keys.json"))
+        return cfg, cfg.layers
+    layers = node_names(3, nodes)
+    behavior = {n: {"drop_prob": round(rng.uniform(0.01, 0.1), 3), "delay_mean": round(rng.uniform(0.01, 0.05), 3),
+                    "delay_std": 0.01, "capacity": 10} for ns in layers.values() for n in ns}
+    return {"keys": {n: "" for ns in layers.values() for n in ns}, "behavior": behavior}, layers
+
+
+def true_values(model, layers, per_route, seed):
+    """{route: Monte Carlo mean reward}."""
+    routes = list(itertools.product(*layers.values()))
+    rng = np.random.default_rng(seed)
+    ids = np.repeat(model.route_ids(routes), per_route, axis=0)
+    _, _, reward = model.simulate(ids, rng)
+    return dict(zip(routes, reward.reshape(len(routes), per_route).mean(axis=1).tolist()))
+
+
+def make_agent(kind, layers, args):
+    if kind == "route":
+        return RouteRLAgent(layers, args.alpha, epsilon=args.epsilon, qfile="q.json", checkpoint_every=10**9), None
+    trust = TrustScores(layers, directory=None) if kind == "link+trust" else None
+    agent = LinkRLAgent(layers, args.alpha, epsilon=args.epsilon, qfile="links.json", checkpoint_every=10**9,
+                        trust=trust)
+    return agent, trust
+
+
+def regret_curve(kind, cfg, layers, truth, seed, args):
+    best, worst = max(truth.values()), min(truth.values())
+    random.seed(seed)
+    with workdir():
+        agent, trust = make_agent(kind, layers, args)
+        model = NetworkModel(cfg, layers, trust)
+        regret = []
+        for chunk in range(args.episodes // args.every):
+            run_simulation(agent, model, args.every, args.batch, seed=seed * 100_003 + chunk)
+            greedy = agent.best_route()
+            regret.append(best - (truth[greedy] if greedy else worst))
+    return np.array(regret)
+
+
+def converged_at(regret, tolerance, window, every):
+    smooth = np.convolve(regret, np.ones(window) / window, mode="valid")   # smooth[i] ends at checkpoint i+window-1
+    within = np.flatnonzero(smooth <= tolerance)
+    return (int(within[0]) + window) * every if len(within) else None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--episodes", type=int, default=40_000)
+    ap.add_argument("--every", type=int, default=250, help="episodes between greedy-route checkpoints")
+    ap.add_argument("--window", type=int, default=8, help="checkpoints the convergence test smooths over")
+    ap.add_argument("--batch", type=int, default=16, help="episodes chosen before their updates apply")
+    ap.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    ap.add_argument("--nodes", type=int, default=None, help="relays per layer (random behaviour)")
+    ap.add_argument("--alpha", type=float, default=0.01)
+    ap.add_argument("--epsilon", type=float, default=0.2)
+    ap.add_argument("--tolerance", type=float, default=0.5, help="reward gap to the best route counted as converged")
+    ap.add_argument("--truth-episodes", type=int, default=20_000, help="Monte Carlo episodes per route")
+    args = ap.parse_args()
+
+    cfg, layers = mesh(args.nodes, random.Random(0))
+    truth = true_values(NetworkModel(cfg, layers), layers, args.truth_episodes, seed=0)
+    ranked = sorted(truth, key=truth.get, reverse=True)
+    print(f"{len(truth)} routes; best {' → '.join(ranked[0])} ({truth[ranked[0]]:.2f}), "
+          f"runner-up {truth[ranked[1]]:.2f}, worst {truth[ranked[-1]]:.2f}")
+
+    points = [p for p in (500, 1000, 2000, 5000, 10_000, 20_000, 50_000, 100_000) if p <= args.episodes]
+    print(f"\nmean regret over {len(args.seeds)} seeds after N episodes (alpha={args.alpha}, epsilon={args.epsilon})")
+    print(f"{'agent':<12} " + " ".join(f"{p:>7}" for p in points) + f" {'tail':>7} {'converged':>10}")
+    for kind in AGENTS:
+        regret = np.mean([regret_curve(kind, cfg, layers, truth, seed, args) for seed in args.seeds], axis=0)
+        cells, prev = [], 0
+        for p in points:
+            lo, hi = prev // args.every, max(prev // args.every + 1, p // args.every)
+            cells.append(f"{regret[lo:hi].mean():>7.2f}")
+            prev = p
+        conv = converged_at(regret, args.tolerance, args.window, args.every)
+        tail = regret[-max(1, len(regret) // 4):].mean()
+        print(f"{kind:<12} " + " ".join(cells) + f" {tail:>7.2f} {conv if conv is not None else 'no':>10}")
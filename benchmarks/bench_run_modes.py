@@ -0,0 +1,112 @@
+# benchmarks/bench_run_modes.py
+"""
+Aggregate relay throughput of the 12-node mesh under each run_all_nodes.py mode.
+
+    thread       every node in one process (one GIL)
+    proc         one `node.py` process per node
+    supervisor   nodes packed into one worker process per core
+
+run_all_nodes.py runs in its own session (so every child can be stopped
+together) with --no-destination; the destination is an in-process sink.
+Packets take random L1 -> L2 -> L3 -> Destination routes and are written
+over --connections persistent framed connections per first hop. Drops are
+disabled and the processing delay is small, so nodes are CPU-bound.
+
+Usage:
+    python benchmarks/bench_run_modes.py [--packets 6000] [--modes thread proc supervisor]
+"""
+import argparse, asyncio, os, random, signal, subprocess, sys, time
+
+from _common import ROOT, make_config, workdir, wait_for_port, Sink, summarize
+from framing import write_frame
+from onion import OnionBuilder, open_message
+import run_all_nodes
+
+LAUNCHER = os.path.join(ROOT, "run_all_nodes.py")
+DEST = run_all_nodes.DEST
+
+
+def launch(mode, cfg, extra):
+    out = open(os.environ["BENCH_NODE_LOG"], "a") if os.environ.get("BENCH_NODE_LOG") else subprocess.DEVNULL
+    p = subprocess.Popen([sys.executable, LAUNCHER, mode, "--no-destination", *extra],
+                         stdout=out, stderr=subprocess.STDOUT, start_new_session=True)
+    for name in run_all_nodes.ALL_NODES:
+        if not wait_for_port(*cfg["addrs"][name], timeout=20):
+            shutdown(p)
+            raise RuntimeError(f"{mode}: {name} did not come up")
+    return p
+
+
+def shutdown(p):
+    try:
+        os.killpg(p.pid, signal.SIGTERM)
+        p.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(p.pid, signal.SIGKILL)
+
+
+async def drive(cfg, args):
+    rng = random.Random(args.seed)
+    builder = OnionBuilder(cfg)
+    packets = []
+    for i in range(args.packets):
+        route = [rng.choice(layer) for layer in (run_all_nodes.L1, run_all_nodes.L2, run_all_nodes.L3)]
+        packets.append((route[0], str(i).encode(), builder.build(route, str(i).encode())))
+    sink = Sink(*cfg["addrs"][DEST])
+    await sink.start()
+    sent = {}
+
+    async def feeder(first_hop, batch):
+        _, writer = await asyncio.open_connection(*cfg["addrs"][first_hop])
+        for pid, onion in batch:
+            sent[pid] = time.perf_counter()
+            write_frame(writer, onion)
+            await writer.drain()
+        writer.close()
+
+    feeders = []
+    for hop in run_all_nodes.L1:
+        mine = [(pid, onion) for first, pid, onion in packets if first == hop]
+        for c in range(args.connections):
+            feeders.append(feeder(hop, mine[c::args.connections]))
+    t0 = time.perf_counter()
+    await asyncio.gather(*feeders)
+    deadline = time.perf_counter() + 20
+    while len(sink.arrivals) < args.packets and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await sink.close()
+
+    dest_key = builder.key(DEST)
+    arrived = {open_message(dest_key, k): t for k, t in sink.arrivals.items()}
+    elapsed = (max(arrived.values()) - t0) if arrived else float("nan")
+    lat = [arrived[k] - sent[k] for k in arrived if k in sent]
+    return {"delivered": len(arrived), "pps": round(len(arrived) / elapsed, 1), **summarize(lat)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--packets", type=int, default=6000)
+    ap.add_argument("--connections", type=int, default=4, help="persistent connections per first hop")
+    ap.add_argument("--modes", nargs="+", default=["thread", "proc", "supervisor"])
+    ap.add_argument("--engine", choices=["thread", "asyncio"], default="asyncio", help="supervisor worker engine")
+    ap.add_argument("--workers", type=int, default=None, help="supervisor workers (default: one per core)")
+    ap.add_argument("--delay-mean", type=float, default=0.001)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    behavior = {n: {"drop_prob": 0.0, "delay_mean": args.delay_mean, "delay_std": args.delay_mean / 2,
+                    "capacity": 10 ** 6} for n in run_all_nodes.ALL_NODES}
+    cfg = make_config(run_all_nodes.ALL_NODES + [DEST], behavior)
+    print(f"cores available: {len(run_all_nodes.usable_cpus())}")
+    print(f"{'mode':<11} {'delivered':>9} {'pkt/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        extra = ["--engine", args.engine, "--report-interval", "0"] if mode == "supervisor" else []
+        if mode == "supervisor" and args.workers:
+            extra += ["--workers", str(args.workers)]
+        with workdir(cfg):
+            proc = launch(mode, cfg, extra)
+            try:
+                r = asyncio.run(drive(cfg, args))
+            finally:
+                shutdown(proc)
+        print(f"{mode:<11} {r['delivered']:>9} {r['pps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
@@ -0,0 +1,68 @@
+# benchmarks/bench_sender_concurrency.py
+"""
+Sequential vs pipelined sender: episodes/sec and learning-curve equivalence.
+
+First hops are in-process sinks; one L1 relay is deliberately unreachable so
+there is something to learn (routes through it always fail). Every mode runs
+the same seeded workload (same per-episode congestion/drop draws, same
+exploration seed) with congestion sleeps scaled by --time-scale, starting
+from an empty Q-table.
+
+Reported per mode: wall time, episodes/sec, and per-window success rate and
+mean reward (windows by episode number), so the curves can be compared.
+
+Usage:
+    python benchmarks/bench_sender_concurrency.py [--episodes 600] [--concurrency 1 8 32]
+"""
+import argparse, contextlib, io, random, time
+
+from _common import make_config, workdir, SinkThread
+import sender
+
+LAYERS = {f"L{l}": [f"L{l}_Node{c}" for c in "ABCD"] for l in (1, 2, 3)}
+DEAD = "L1_NodeD"
+
+
+def run(cfg, concurrency, args):
+    with workdir():
+        random.seed(args.seed)
+        agent = sender.RouteRLAgent(LAYERS)
+        pool = sender.ConnectionPool()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = sender.run_experiment(cfg, agent, pool, args.episodes, concurrency,
+                                            seed=args.seed, time_scale=args.time_scale,
+                                            logfile="performance_log.csv")
+        elapsed = time.perf_counter() - t0
+        pool.close()
+    results.sort(key=lambda r: r[0])
+    curve = []
+    for i in range(0, len(results), args.window):
+        w = results[i:i + args.window]
+        curve.append((sum(r[2] for r in w) / len(w), sum(r[4] for r in w) / len(w)))
+    return elapsed, curve
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--episodes", type=int, default=600)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--time-scale", type=float, default=0.05)
+    ap.add_argument("--window", type=int, default=100)
+    args = ap.parse_args()
+
+    cfg = make_config([n for nodes in LAYERS.values() for n in nodes] + ["Destination"])
+    live = [cfg["addrs"][n] for n in LAYERS["L1"] if n != DEAD]
+    curves = {}
+    with SinkThread(live):
+        print(f"{'concurrency':>11} {'wall s':>8} {'episodes/s':>11}")
+        for c in args.concurrency:
+            elapsed, curves[c] = run(cfg, c, args)
+            print(f"{c:>11} {elapsed:>8.2f} {args.episodes / elapsed:>11.1f}")
+
+    print(f"\nlearning curve (success rate / mean reward per {args.window} episodes)")
+    print(f"{'episodes':>10} " + " ".join(f"{'c=' + str(c):>16}" for c in args.concurrency))
+    for i in range(len(curves[args.concurrency[0]])):
+        cells = " ".join(f"{curves[c][i][0]:>7.2f} /{curves[c][i][1]:>7.2f}" for c in args.concurrency)
+        print(f"{(i + 1) * args.window:>10} {cells}")
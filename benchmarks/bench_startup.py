@@ -0,0 +1,95 @@
+# benchmarks/bench_startup.py
+"""
+Mesh time-to-ready and config-reload latency per launcher mode.
+
+For every mode and mesh size a generated mesh (3 layers, --relays in
+total, free loopback ports) is started with run_all_nodes.py in a temp dir.
+Time-to-ready is measured from the launcher's spawn until every relay and
+the destination accept a connection, probed from outside. The launcher's
+own figure (its "Mesh ready" line) is shown next to it. Then keys.json is
+rewritten with a new behaviour for every relay and the launcher gets
+SIGHUP. Reload is the time until every relay has logged "Reloaded config".
+
+proc mode starts one interpreter per relay, so sizes above --max-proc are
+skipped for it.
+
+Usage:
+    python benchmarks/bench_startup.py [--modes proc thread supervisor] [--relays 12 48 192]
+"""
+import argparse, json, os, re, signal, subprocess, sys, time
+
+from _common import ROOT, make_config, workdir, wait_for_port
+import topology
+
+LAUNCHER = os.path.join(ROOT, "run_all_nodes.py")
+
+
+def count(path, needle):
+    with open(path, errors="replace") as f:
+        return f.read().count(needle)
+
+
+def measure(mode, relays, timeout):
+    layers = topology.node_names(3, [relays // 3 + (i < relays % 3) for i in range(3)])
+    names = [n for ns in layers.values() for n in ns]
+    cfg = make_config(names + [topology.DEST])
+    with workdir(cfg):
+        out = "mesh.log"
+        t0 = time.perf_counter()
+        p = subprocess.Popen([sys.executable, LAUNCHER, mode, "--report-interval", "0"],
+                             stdout=open(out, "w"), stderr=subprocess.STDOUT, start_new_session=True)
+        try:
+            deadline = time.time() + timeout
+            for host, port in cfg["addrs"].values():
+                if not wait_for_port(host, port, timeout=max(0.1, deadline - time.time())):
+                    return None
+            ready = time.perf_counter() - t0
+            while "Mesh ready" not in open(out).read() and time.time() < deadline:
+                time.sleep(0.01)
+            m = re.search(r"Mesh ready: .* after ([\d.]+)s", open(out).read())
+            own = float(m.group(1)) if m else None
+
+            cfg["behavior"] = topology.random_behavior(names, __import__("random").Random(1))
+            with open("keys.json.tmp", "w") as f:
+                json.dump(cfg, f)
+            os.replace("keys.json.tmp", "keys.json")
+            t1 = time.perf_counter()
+            p.send_signal(signal.SIGHUP)
+            while count(out, "Reloaded config") < len(names) and time.time() < deadline + 10:
+                time.sleep(0.01)
+            reload = time.perf_counter() - t1 if count(out, "Reloaded config") >= len(names) else None
+            return ready, own, reload
+        finally:
+            p.send_signal(signal.SIGINT)
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                pass
+            try:
+                os.killpg(p.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            p.wait()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", nargs="+", choices=["proc", "thread", "supervisor"],
+                    default=["proc", "thread", "supervisor"])
+    ap.add_argument("--relays", type=int, nargs="+", default=[12, 48, 192])
+    ap.add_argument("--max-proc", type=int, default=48, help="largest mesh to run in proc mode")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    args = ap.parse_args()
+
+    print(f"{'mode':<11} {'relays':>6} {'ready s':>8} {'launcher s':>10} {'reload s':>9}")
+    for mode in args.modes:
+        for relays in args.relays:
+            if mode == "proc" and relays > args.max_proc:
+                continue
+            r = measure(mode, relays, args.timeout)
+            if r is None:
+                print(f"{mode:<11} {relays:>6} {'timeout':>8}")
+                continue
+            ready, own, reload = r
+            fmt = lambda x: f"{x:.2f}" if x is not None else "-"
+            print(f"{mode:<11} {relays:>6} {ready:>8.2f} {fmt(own):>10} {fmt(reload):>9}")
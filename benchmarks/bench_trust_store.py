@@ -0,0 +1,45 @@
+# benchmarks/bench_trust_store.py
+"""
+Forwarding throughput under different NodeTrust durability settings.
+
+Runs the single-relay setup from bench_relay_engines.py (zero processing delay,
+so trust persistence is the dominant per-packet cost) with:
+
+    per-update+fsync   flush_every=1, fsync=True   (write + fsync on every packet)
+    per-update         flush_every=1               (the old behaviour)
+    batched            defaults (background flush every 1 s / 100 updates)
+
+Usage:
+    python benchmarks/bench_trust_store.py [--packets 3000] [--engine thread|asyncio]
+"""
+import argparse, asyncio
+
+from _common import make_config, workdir, spawn_node, stop
+from bench_relay_engines import drive, RELAY, SINK
+
+VARIANTS = [
+    ("per-update+fsync", {"flush_every": 1, "fsync": True}),
+    ("per-update", {"flush_every": 1}),
+    ("batched", {}),
+]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--packets", type=int, default=3000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--engine", choices=["thread", "asyncio"], default="thread")
+    args = ap.parse_args()
+
+    print(f"{'trust store':<18} {'delivered':>9} {'pkt/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, trust in VARIANTS:
+        behavior = {RELAY: {"drop_prob": 0.0, "delay_mean": 0.0, "delay_std": 0.0, "capacity": 10 ** 6}}
+        cfg = make_config([RELAY, SINK], behavior)
+        cfg["trust"] = trust
+        with workdir(cfg):
+            proc = spawn_node(RELAY, cfg, "--engine", args.engine)
+            try:
+                r = asyncio.run(drive(cfg, args.packets, args.concurrency))
+            finally:
+                stop([proc])
+        print(f"{name:<18} {r['delivered']:>9} {r['pps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
@@ -0,0 +1,329 @@
+# circuit.py
+"""
+Circuits: set a route up once, then stream fixed-size cells along it.
+
+A per-message onion (onion.py) makes every relay open an authenticated
+layer and parse the next hop out of it, for every message. A circuit pays
+that once. The CREATE cell is an onion whose layers also hand each hop a
+fresh circuit key, and each hop stores (next hop, key) in its CircuitTable
+under the circuit ID. From then on a message travels as DATA cells: a relay
+looks the ID up, strips its AES-CTR layer in place and forwards the cell.
+The cell is the same size at every hop.
+
+    CREATE   0x04 | circ_id(4) | gcm layer( len(next_hop) | next_hop | circuit key(16) | next CREATE layer )
+    DATA     0x05 | circ_id(4) | seq(8) | body(CELL_BODY)
+    DESTROY  0x06 | circ_id(4)
+
+The Destination's CREATE layer holds its circuit key and a JSON message
+({"id", "reply_to"}) that it ACKs like any other, so the sender knows when
+the circuit is up. The body of a DATA cell is the Destination's layer,
+AES-GCM under its circuit key with the cell header as associated data,
+wrapped in one AES-CTR layer per relay. All nonces derive from seq, which
+never repeats on a circuit. As in Tor, relays don't check integrity; the
+Destination's tag catches tampering anywhere en route. Its plaintext is
+
+    index(2) | count(2) | length(2) | chunk, zero-padded to CHUNK bytes
+
+so a message longer than CHUNK bytes goes as `count` cells with
+consecutive seqs and is reassembled at the Destination.
+
+Relays and the Destination keep at most MAX_CIRCUITS circuits, evicting the
+least recently used, and forget circuits idle for IDLE_TIMEOUT seconds. The
+sender's CircuitPool reuses one circuit per route. It keeps at most
+`max_circuits` circuits, evicting the least recently used, and tears idle
+ones down with DESTROY. A circuit that loses MAX_FAILURES messages in a row
+is rebuilt.
+"""
+import collections, json, struct, threading, time
+from concurrent.futures import Future
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+
+from onion import LayerError, OnionBuilder, TAG, layer_plaintext, open_message, peel, seal_gcm
+
+CREATE = 0x04
+DATA = 0x05
+DESTROY = 0x06
+CELLS = (CREATE, DATA, DESTROY)
+ID_BYTES = 4
+SEQ_BYTES = 8
+KEY_BYTES = 16
+CELL_SIZE = 512
+HEADER = 1 + ID_BYTES + SEQ_BYTES
+CELL_BODY = CELL_SIZE - HEADER
+_FRAGMENT = struct.Struct(">HHH")   # index, count, chunk length
+CHUNK = CELL_BODY - TAG - _FRAGMENT.size   # message bytes per DATA cell
+
+MAX_CIRCUITS = 10000    # circuits a relay or the Destination keeps
+IDLE_TIMEOUT = 300.0    # seconds before a relay forgets an unused circuit
+SENDER_CIRCUITS = 16    # circuits the sender keeps open
+SENDER_IDLE = 60.0      # seconds before the sender tears down an unused circuit (< IDLE_TIMEOUT)
+MAX_FAILURES = 3        # lost messages in a row before the sender rebuilds a circuit
+
+
+class CircuitError(LayerError):
+    """A cell for a circuit this hop doesn't know (never created, evicted or destroyed)."""
+
+
+def is_cell(data):
+    return len(data) > ID_BYTES and data[0] in CELLS
+
+
+def _ctr(key, seq):
+    return AES.new(key, AES.MODE_CTR, nonce=bytes(seq))
+
+
+def _gcm(key, header):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=bytes(header[1 + ID_BYTES:HEADER]) + bytes(12 - SEQ_BYTES))
+    cipher.update(header)
+    return cipher
+
+
+# --- relay and Destination side ---
+class CircuitTable:
+    """One hop's circuits: circ_id -> [next hop (None at the Destination), key, last use, fragments]."""
+    def __init__(self, max_circuits=MAX_CIRCUITS, idle_timeout=IDLE_TIMEOUT):
+        self.max_circuits = max_circuits
+        self.idle_timeout = idle_timeout
+        self.circuits = collections.OrderedDict()   # least recently used first
+        self.lock = threading.Lock()                # the thread engine's workers share the table
+
+    def __len__(self):
+        return len(self.circuits)
+
+    def add(self, circ_id, next_hop, key):
+        with self.lock:
+            self.circuits[circ_id] = [next_hop, key, time.monotonic(), {}]
+            self.circuits.move_to_end(circ_id)
+            while len(self.circuits) > self.max_circuits:
+                self.circuits.popitem(last=False)
+
+    def get(self, circ_id):
+        now = time.monotonic()
+        with self.lock:
+            while self.circuits:   # expire from the idle end
+                oldest = next(iter(self.circuits.values()))
+                if now - oldest[2] < self.idle_timeout:
+                    break
+                self.circuits.popitem(last=False)
+            entry = self.circuits.get(circ_id)
+            if entry is None:
+                raise CircuitError(f"unknown circuit {circ_id.hex()}")
+            entry[2] = now
+            self.circuits.move_to_end(circ_id)
+            return entry
+
+    def remove(self, circ_id):
+        with self.lock:
+            entry = self.circuits.pop(circ_id, None)
+        if entry is None:
+            raise CircuitError(f"unknown circuit {circ_id.hex()}")
+        return entry
+
+    def relay(self, key, data):
+        """
+        A relay's step for one cell. Returns (next_hop, cell to forward), like
+        onion.peel(). A writable DATA cell is decrypted in place.
+        """
+        view = memoryview(data)
+        marker, circ_id = view[0], bytes(view[1:1 + ID_BYTES])
+        if marker == CREATE:
+            next_hop, rest = peel(key, view[1 + ID_BYTES:])
+            self.add(circ_id, next_hop, bytes(rest[:KEY_BYTES]))
+            return next_hop, b"".join((view[:1 + ID_BYTES], rest[KEY_BYTES:]))
+        if marker == DESTROY:
+            return self.remove(circ_id)[0], data
+        if len(view) != CELL_SIZE:
+            raise LayerError(f"DATA cell of {len(view)} bytes")
+        next_hop, ckey = self.get(circ_id)[:2]
+        if view.readonly:
+            view = memoryview(bytearray(view))
+        body = view[HEADER:]
+        _ctr(ckey, view[1 + ID_BYTES:HEADER]).decrypt(body, output=body)
+        return next_hop, view
+
+    def exit(self, key, data):
+        """
+        The Destination's step for one cell: the message it carries (a CREATE's
+        JSON, or a DATA message once all its cells are in), or None.
+        """
+        view = memoryview(data)
+        marker, circ_id = view[0], bytes(view[1:1 + ID_BYTES])
+        if marker == CREATE:
+            plaintext = open_message(key, view[1 + ID_BYTES:])
+            self.add(circ_id, None, plaintext[:KEY_BYTES])
+            return plaintext[KEY_BYTES:]
+        if marker == DESTROY:
+            self.remove(circ_id)
+            return None
+        if len(view) != CELL_SIZE:
+            raise LayerError(f"DATA cell of {len(view)} bytes")
+        entry = self.get(circ_id)
+        try:
+            plain = _gcm(entry[1], view[:HEADER]).decrypt_and_verify(view[HEADER:-TAG], view[-TAG:])
+        except ValueError as e:
+            raise LayerError("cell failed authentication") from e
+        index, count, n = _FRAGMENT.unpack_from(plain)
+        chunk = plain[_FRAGMENT.size:_FRAGMENT.size + n]
+        if count == 1:
+            return chunk
+        first = int.from_bytes(view[1 + ID_BYTES:HEADER], "big") - index
+        with self.lock:
+            parts = entry[3].setdefault(first, {})
+            parts[index] = chunk
+            if len(parts) < count:
+                return None
+            del entry[3][first]
+        return b"".join(parts[i] for i in range(count))
+
+
+# --- sender side ---
+class Circuit:
+    """One circuit along `route` to the Destination, built by the sender."""
+    def __init__(self, route, dest):
+        self.id = get_random_bytes(ID_BYTES)
+        self.route = tuple(route)
+        self.dest = dest
+        self.keys = [get_random_bytes(KEY_BYTES) for _ in range(len(route) + 1)]   # relays..., Destination
+        self.seq = 0
+        self.failures = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def create_cell(self, builder, message):
+        """The CREATE cell; `message` is what the Destination ACKs once the circuit is up."""
+        layer = seal_gcm(builder.key(self.dest), self.keys[-1] + message)
+        next_hop = self.dest
+        for hop, ckey in zip(reversed(self.route), reversed(self.keys[:-1])):
+            layer = seal_gcm(builder.key(hop), layer_plaintext(next_hop, ckey + layer))
+            next_hop = hop
+        return bytes([CREATE]) + self.id + layer
+
+    def destroy_cell(self):
+        return bytes([DESTROY]) + self.id
+
+    def cells(self, message):
+        """DATA cells carrying `message`."""
+        chunks = [message[i:i + CHUNK] for i in range(0, len(message), CHUNK)] or [b""]
+        with self.lock:
+            first, self.seq = self.seq, self.seq + len(chunks)
+            self.last_used = time.monotonic()
+        out = []
+        for index, chunk in enumerate(chunks):
+            header = bytes([DATA]) + self.id + (first + index).to_bytes(SEQ_BYTES, "big")
+            plain = _FRAGMENT.pack(index, len(chunks), len(chunk)) + chunk + bytes(CHUNK - len(chunk))
+            ct, tag = _gcm(self.keys[-1], header).encrypt_and_digest(plain)
+            body = bytearray(ct + tag)
+            for ckey in reversed(self.keys[:-1]):   # the first hop's layer outermost
+                _ctr(ckey, header[1 + ID_BYTES:]).encrypt(body, output=body)
+            out.append(header + body)
+        return out
+
+
+class CircuitPool:
+    """
+    The sender's circuits, one per route. send(route, message) reuses the
+    route's circuit or builds one first: the CREATE goes out and the call
+    waits for its ACK (`acks`, a sender.AckListener). Frames go over `pool`
+    (a connpool.ConnectionPool). Thread-safe; concurrent sends on a route
+    that is still being built wait for the same CREATE.
+    """
+    def __init__(self, cfg, pool, acks, builder=None, max_circuits=SENDER_CIRCUITS, idle_timeout=SENDER_IDLE,
+                 dest="Destination"):
+        self.cfg = cfg
+        self.pool = pool
+        self.acks = acks
+        self.builder = builder or OnionBuilder(cfg)
+        self.max_circuits = max_circuits
+        self.idle_timeout = idle_timeout
+        self.dest = dest
+        self.circuits = collections.OrderedDict()   # route -> Future of Circuit, least recently used first
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(("created", "reused", "evicted", "failed"), 0)
+
+    def get(self, route):
+        route = tuple(route)
+        evicted = []
+        with self.lock:
+            fut = self.circuits.get(route)
+            if fut is not None and fut.done() and fut.exception() is None \
+                    and time.monotonic() - fut.result().last_used >= self.idle_timeout:
+                evicted.append(self._evict(route))   # the relays may have forgotten it already
+                fut = None
+            if fut is None:
+                fut = self.circuits[route] = Future()
+                owner = True
+                evicted += self._evict_lru()
+            else:
+                owner = False
+                self.circuits.move_to_end(route)
+                self.stats["reused"] += 1
+        self._destroy(evicted)
+        if owner:
+            self._create(route, fut)
+        return fut.result()
+
+    def _create(self, route, fut):
+        circuit = Circuit(route, self.dest)
+        msg_id = f"circuit:{circuit.id.hex()}"
+        ack = self.acks.expect(msg_id)
+        cell = circuit.create_cell(self.builder, json.dumps({"id": msg_id, "reply_to": list(self.acks.addr)}).encode())
+        try:
+            self.pool.send(self.cfg["addrs"][route[0]], cell)
+            if ack.result() is None:
+                raise CircuitError(f"circuit along {' → '.join(route)} not confirmed in time")
+        except Exception as e:
+            with self.lock:
+                if self.circuits.get(route) is fut:
+                    del self.circuits[route]
+                self.stats["failed"] += 1
+            fut.set_exception(e)
+            return
+        self.stats["created"] += 1
+        fut.set_result(circuit)
+
+    def send(self, route, message):
+        """Send `message` along `route` over its circuit; returns the Circuit."""
+        circuit = self.get(route)
+        addr = self.cfg["addrs"][circuit.route[0]]
+        for cell in circuit.cells(message):
+            self.pool.send(addr, cell)
+        return circuit
+
+    def outcome(self, circuit, delivered):
+        """Record whether a message sent on `circuit` arrived; rebuild it after MAX_FAILURES losses in a row."""
+        circuit.failures = 0 if delivered else circuit.failures + 1
+        if circuit.failures >= MAX_FAILURES:
+            with self.lock:
+                fut = self.circuits.get(circuit.route)
+                if fut is None or not fut.done() or fut.exception() is not None or fut.result() is not circuit:
+                    return
+                self._evict(circuit.route)
+            self._destroy([circuit])
+
+    def _evict_lru(self):
+        # circuits still being built are skipped, so the pool may briefly hold more than max_circuits
+        ready = [route for route, fut in self.circuits.items() if fut.done()]
+        return [self._evict(route) for route in ready[:len(self.circuits) - self.max_circuits]]
+
+    def _evict(self, route):
+        # lock held; returns the built Circuit (or None) for _destroy once the lock is released
+        fut = self.circuits.pop(route)
+        self.stats["evicted"] += 1
+        return fut.result() if fut.done() and fut.exception() is None else None
+
+    def _destroy(self, circuits):
+        # DESTROY is best effort, the relays expire circuits on their own too
+        for circuit in circuits:
+            if circuit is None:
+                continue
+            try:
+                self.pool.send(self.cfg["addrs"][circuit.route[0]], circuit.destroy_cell())
+            except Exception:
+                pass
+
+    def close(self):
+        with self.lock:
+            evicted = [self._evict(route) for route in list(self.circuits)]
+        self._destroy(evicted)
@@ -0,0 +1,71 @@
+# congestion.py
+"""
+Congestion signals from a relay back to the hop that feeds it.
+
+A relay that rejects a packet, or whose work queue has grown past its
+capacity, writes a control frame back on the connection the packet came in
+on:
+
+    CONGESTED <node> <level>
+
+`level` is the node's queue occupancy in [0, 1]; a rejected packet is
+signalled as 1.0. Signals ride on the pooled connections the previous hop
+already holds. ConnectionPool / AsyncConnectionPool decode them (on_signal)
+and the receiver decides what to do:
+
+    relay    nudge NodeTrust for a direct next hop, and (with signalling on)
+             pass hot entries further upstream
+    sender   RouteRLAgent steers its greedy choice around congested nodes
+
+Levels are soft state: a CongestionTable forgets an entry linearly over
+`hold` seconds unless it is refreshed.
+"""
+import threading, time
+
+PREFIX = b"CONGESTED "
+SIGNAL_INTERVAL = 0.1   # min seconds between signals written on one connection
+HOLD = 2.0              # seconds for a level to decay to zero
+HOT = 0.25              # level at which a node counts as congested
+
+
+def encode(node, level):
+    return PREFIX + f"{node} {min(1.0, max(0.0, level)):.3f}".encode()
+
+
+def decode(payload):
+    """(node, level) for a congestion frame, None for anything else."""
+    if bytes(payload[:len(PREFIX)]) != PREFIX:
+        return None
+    try:
+        node, level = bytes(payload[len(PREFIX):]).decode().split()
+        return node, float(level)
+    except ValueError:
+        return None
+
+
+class CongestionTable:
+    """Most recent congestion level per node, decaying to zero over `hold` seconds."""
+    def __init__(self, hold=HOLD):
+        self.hold = hold
+        self.levels = {}   # node -> (level, monotonic time noted)
+        self.lock = threading.Lock()
+
+    def note(self, node, level):
+        with self.lock:
+            self.levels[node] = (level, time.monotonic())
+
+    def level(self, node):
+        entry = self.levels.get(node)
+        if entry is None:
+            return 0.0
+        level, noted = entry
+        return max(0.0, level * (1 - (time.monotonic() - noted) / self.hold))
+
+    def hot(self, threshold=HOT):
+        """[(node, current level), ...] for every node at or above `threshold`."""
+        with self.lock:
+            nodes = list(self.levels)
+        return [(n, l) for n in nodes if (l := self.level(n)) >= threshold]
+
+    def congested(self, node, threshold=HOT):
+        return self.level(node) >= threshold
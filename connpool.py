@@ -0,0 +1,298 @@
+# connpool.py
+"""
+Pools of long-lived, framed connections to next hops.
+
+One pool per node (or sender / destination) keeps idle connections per
+(host, port) and reuses them for later frames instead of paying a TCP
+handshake and a TIME_WAIT socket per packet.
+
+- limit: at most `max_conns_per_addr` connections per next hop are in use at
+  once; further senders wait (up to the connect timeout) for one to free up
+  instead of opening a burst of new connections
+- health check: an idle connection that has become readable (peer closed or
+  sent something unexpected) is discarded before reuse
+- congestion signals: with `on_signal`, CONGESTED frames the peer wrote back
+  (congestion.py) are passed to on_signal(addr, node, level) and the
+  connection stays in use
+- reconnect: a frame that fails on a reused connection is retried once on a
+  fresh one, since the peer may simply have restarted
+- backoff: after a failed connect the address is skipped for an exponentially
+  growing window; sends during that window fail immediately
+- eviction: connections idle for longer than `max_idle` seconds are closed
+
+Any failure is raised to the caller, so callers keep handling errors exactly
+as they did with one-shot sockets (e.g. NodeTrust.update(next_hop, False)).
+"""
+import socket, select, threading, time, asyncio
+
+from framing import send_frame, write_frame, recv_frame, read_frame, FrameError
+import congestion
+
+CONNECT_TIMEOUT = 2.0
+MAX_IDLE = 30.0            # seconds an unused connection is kept
+MAX_CONNS_PER_ADDR = 8     # connections per next hop
+BACKOFF_BASE = 0.05        # first backoff window after a failed connect (s)
+BACKOFF_MAX = 5.0
+
+
+class Backoff:
+    """Per-address exponential backoff after failed connects."""
+    def __init__(self, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+        self.base = base
+        self.cap = cap
+        self.failures = {}    # addr -> consecutive failures
+        self.retry_at = {}    # addr -> monotonic time of the next allowed attempt
+
+    def check(self, addr):
+        wait = self.retry_at.get(addr, 0) - time.monotonic()
+        if wait > 0:
+            raise ConnectionError(f"{addr[0]}:{addr[1]} unreachable, backing off {wait:.2f}s")
+
+    def failed(self, addr):
+        n = self.failures.get(addr, 0) + 1
+        self.failures[addr] = n
+        self.retry_at[addr] = time.monotonic() + min(self.cap, self.base * 2 ** (n - 1))
+
+    def succeeded(self, addr):
+        self.failures.pop(addr, None)
+        self.retry_at.pop(addr, None)
+
+
+# --- blocking sockets (thread engine, sender, destination) ---
+class ConnectionPool:
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, max_idle=MAX_IDLE,
+                 max_conns_per_addr=MAX_CONNS_PER_ADDR, backoff=None, on_signal=None):
+        self.connect_timeout = connect_timeout
+        self.max_idle = max_idle
+        self.max_conns_per_addr = max_conns_per_addr
+        self.backoff = backoff or Backoff()
+        self.on_signal = on_signal
+        self.idle = {}        # addr -> [(sock, last_used), ...] (most recent last)
+        self.slots = {}       # addr -> BoundedSemaphore(max_conns_per_addr)
+        self.lock = threading.Lock()
+        self.last_reap = time.monotonic()
+
+    def _healthy(self, addr, sock):
+        # an idle connection should have nothing to read but congestion signals;
+        # anything else readable means EOF/RST or junk
+        try:
+            while select.select([sock], [], [], 0)[0]:
+                if self.on_signal is None:
+                    return False
+                payload = recv_frame(sock)
+                signal = congestion.decode(payload) if payload is not None else None
+                if signal is None:
+                    return False
+                self.on_signal(addr, *signal)
+        except (OSError, ValueError, FrameError):
+            return False
+        return True
+
+    def _checkout(self, addr):
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                conns = self.idle.get(addr)
+                if not conns:
+                    return None
+                sock, last_used = conns.pop()
+            # checked outside the lock: reading signals may call back into the owner
+            if now - last_used <= self.max_idle and self._healthy(addr, sock):
+                return sock
+            sock.close()
+
+    def _connect(self, addr):
+        self.backoff.check(addr)
+        try:
+            sock = socket.create_connection(addr, timeout=self.connect_timeout)
+        except OSError:
+            self.backoff.failed(addr)
+            raise
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _checkin(self, addr, sock):
+        now = time.monotonic()
+        with self.lock:
+            conns = self.idle.setdefault(addr, [])
+            if len(conns) < self.max_conns_per_addr:
+                conns.append((sock, now))
+                sock = None
+            if now - self.last_reap > 1.0:
+                self._reap(now)
+        if sock is not None:
+            sock.close()
+
+    def _reap(self, now):
+        for addr, conns in self.idle.items():
+            keep = []
+            for sock, last_used in conns:
+                if now - last_used > self.max_idle:
+                    sock.close()
+                else:
+                    keep.append((sock, last_used))
+            self.idle[addr] = keep
+        self.last_reap = now
+
+    def _slot(self, addr):
+        with self.lock:
+            slot = self.slots.get(addr)
+            if slot is None:
+                slot = self.slots[addr] = threading.BoundedSemaphore(self.max_conns_per_addr)
+        return slot
+
+    def send(self, addr, payload):
+        """Send one frame to `addr` over a pooled connection; raises on failure."""
+        addr = (addr[0], int(addr[1]))
+        slot = self._slot(addr)
+        if not slot.acquire(timeout=self.connect_timeout):
+            raise TimeoutError(f"no free connection to {addr[0]}:{addr[1]} within {self.connect_timeout}s")
+        try:
+            self._send(addr, payload)
+        finally:
+            slot.release()
+
+    def _send(self, addr, payload):
+        sock = self._checkout(addr)
+        if sock is not None:
+            try:
+                send_frame(sock, payload)
+                self._checkin(addr, sock)
+                return
+            except OSError:
+                sock.close()   # stale: fall through to a fresh connection
+        sock = self._connect(addr)
+        try:
+            send_frame(sock, payload)
+        except OSError:
+            sock.close()
+            self.backoff.failed(addr)
+            raise
+        self.backoff.succeeded(addr)
+        self._checkin(addr, sock)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for sock, _ in conns:
+                    sock.close()
+            self.idle.clear()
+
+
+# --- asyncio streams (asyncio engine) ---
+class AsyncConnectionPool:
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, max_idle=MAX_IDLE,
+                 max_conns_per_addr=MAX_CONNS_PER_ADDR, backoff=None, on_signal=None):
+        self.connect_timeout = connect_timeout
+        self.max_idle = max_idle
+        self.max_conns_per_addr = max_conns_per_addr
+        self.backoff = backoff or Backoff()
+        self.on_signal = on_signal
+        self.watchers = set()
+        self.idle = {}        # addr -> [(reader, writer, last_used), ...]
+        self.slots = {}       # addr -> asyncio.Semaphore(max_conns_per_addr)
+        self.last_reap = time.monotonic()
+
+    def _checkout(self, addr):
+        now = time.monotonic()
+        conns = self.idle.get(addr, [])
+        while conns:
+            reader, writer, last_used = conns.pop()
+            healthy = not (writer.is_closing() or reader.at_eof())
+            if now - last_used <= self.max_idle and healthy:
+                return reader, writer
+            writer.close()
+        return None
+
+    async def _connect(self, addr):
+        self.backoff.check(addr)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*addr), timeout=self.connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.backoff.failed(addr)
+            raise
+        if self.on_signal is not None:
+            task = asyncio.create_task(self._watch(addr, reader, writer))
+            self.watchers.add(task)
+            task.add_done_callback(self.watchers.discard)
+        return reader, writer
+
+    async def _watch(self, addr, reader, writer):
+        # signals arrive whenever the peer writes them; anything else ends the connection
+        try:
+            while (payload := await read_frame(reader)) is not None:
+                signal = congestion.decode(payload)
+                if signal is None:
+                    break
+                self.on_signal(addr, *signal)
+        except (OSError, FrameError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _checkin(self, addr, reader, writer):
+        now = time.monotonic()
+        conns = self.idle.setdefault(addr, [])
+        if len(conns) < self.max_conns_per_addr:
+            conns.append((reader, writer, now))
+        else:
+            writer.close()
+        if now - self.last_reap > 1.0:
+            self._reap(now)
+
+    def _reap(self, now):
+        for addr, conns in self.idle.items():
+            keep = []
+            for reader, writer, last_used in conns:
+                if now - last_used > self.max_idle:
+                    writer.close()
+                else:
+                    keep.append((reader, writer, last_used))
+            self.idle[addr] = keep
+        self.last_reap = now
+
+    async def _send_on(self, writer, payload):
+        write_frame(writer, payload)
+        await asyncio.wait_for(writer.drain(), timeout=self.connect_timeout)
+
+    async def send(self, addr, payload):
+        """Send one frame to `addr` over a pooled connection; raises on failure."""
+        addr = (addr[0], int(addr[1]))
+        slot = self.slots.get(addr)
+        if slot is None:
+            slot = self.slots[addr] = asyncio.Semaphore(self.max_conns_per_addr)
+        try:
+            await asyncio.wait_for(slot.acquire(), timeout=self.connect_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no free connection to {addr[0]}:{addr[1]} within {self.connect_timeout}s") from None
+        try:
+            await self._send(addr, payload)
+        finally:
+            slot.release()
+
+    async def _send(self, addr, payload):
+        conn = self._checkout(addr)
+        if conn is not None:
+            try:
+                await self._send_on(conn[1], payload)
+                self._checkin(addr, *conn)
+                return
+            except (OSError, asyncio.TimeoutError):
+                conn[1].close()
+        reader, writer = await self._connect(addr)
+        try:
+            await self._send_on(writer, payload)
+        except (OSError, asyncio.TimeoutError):
+            writer.close()
+            self.backoff.failed(addr)
+            raise
+        self.backoff.succeeded(addr)
+        self._checkin(addr, reader, writer)
+
+    def close(self):
+        for conns in self.idle.values():
+            for _, writer, _ in conns:
+                writer.close()
+        self.idle.clear()
+        for task in self.watchers:
+            task.cancel()
@@ -1,62 +1,189 @@
 # destination.py
-import socket, json, base64, time
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
+"""
+The mesh's exit: opens the innermost onion layer of every message the
+last-hop relays deliver and ACKs the ones that ask for it.
+
+Ingestion runs on one asyncio event loop with a reader per connection
+(last-hop relays keep pooled connections open), so a quiet or slow
+connection never holds up another.
+
+ACKs never block ingestion. Each one is queued for its reply_to endpoint,
+and a flusher task per endpoint delivers the queue over an
+AsyncConnectionPool. While a send is in flight, further ACKs for that
+endpoint accumulate and go out together as one frame:
+
+    ACK <id> <id> ...       (at most ACK_BATCH ids; a lone "ACK <id>" as before)
+
+A slow or unreachable endpoint only delays its own ACKs. At most
+MAX_PENDING_ACKS wait per endpoint; beyond that the oldest are dropped and
+counted.
+
+Circuit cells (circuit.py) end here too. A CREATE's message is ACKed like
+any other, which tells the sender its circuit is up. DATA cells are opened
+with the circuit's key and reassembled into messages.
+
+start_destination() runs it until the process exits, like
+node.start_node(), and run_all_nodes.py imports it in thread mode.
+`python destination.py` runs it standalone. Per-message lines are debug
+(--log-level debug or NODE_LOG_LEVEL=debug).
+"""
+import argparse, asyncio, base64, collections, json
+
+from circuit import CircuitTable, is_cell
+from connpool import AsyncConnectionPool
+from framing import read_frame
+from onion import open_message
+from nodelog import get_logger, set_level, LEVELS
+from topology import load_config, DEST
+
+ACK_BATCH = 256            # ids per coalesced ACK frame
+MAX_PENDING_ACKS = 10000   # ACKs queued per reply endpoint before the oldest are dropped
+YIELD_EVERY = 32           # frames read from one connection between turns for the other tasks
+STATS = ("received", "acks_sent", "ack_frames", "ack_failed", "ack_dropped", "errors")
 
-BUFFER = 8192
 def b64d(x): return base64.b64decode(x)
 
-# load keys and addresses
-with open("keys.json", "r") as f:
-    cfg = json.load(f)
-
-dest_name = "Destination"
-if dest_name not in cfg["keys"] or dest_name not in cfg["addrs"]:
-    raise RuntimeError("Destination key/address missing in keys.json")
-
-dest_key = b64d(cfg["keys"][dest_name])
-host, port = cfg["addrs"][dest_name]
-
-def decrypt_aes(key_bytes, enc_b64):
-    raw = b64d(enc_b64)
-    iv = raw[:16]
-    ct = raw[16:]
-    cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
-    return unpad(cipher.decrypt(ct), AES.block_size)
-
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-s.bind((host, port))
-s.listen(5)
-print(f"[Destination] Listening on {host}:{port} ...")
-
-while True:
-    conn, addr = s.accept()
-    data = conn.recv(BUFFER)
-    conn.close()
-    if not data:
-        continue
-    try:
-        enc_payload = data.decode()
-        plaintext = decrypt_aes(dest_key, enc_payload)
-        payload_obj = json.loads(plaintext.decode())
 
-        # innermost payload expected to contain 'message' and 'reply_to'
-        message = payload_obj.get("message")
-        reply_to = payload_obj.get("reply_to")  # e.g. ["127.0.0.1", 55000]
-        print(f"[Destination] Received message: {message}")
+def ack_frames(ids, batch=ACK_BATCH):
+    """(frame, number of ids) pairs carrying `ids` (None: a bare "ACK"); ids with spaces go out alone."""
+    frames, joinable = [], []
+    for msg_id in ids:
+        if msg_id is None:
+            frames.append((b"ACK", 1))
+        elif " " in str(msg_id):
+            frames.append((f"ACK {msg_id}".encode(), 1))
+        else:
+            joinable.append(str(msg_id))
+    for i in range(0, len(joinable), batch):
+        chunk = joinable[i:i + batch]
+        frames.append((("ACK " + " ".join(chunk)).encode(), len(chunk)))
+    return frames
+
+
+class Destination:
+    def __init__(self, cfg=None, name=DEST, ack_batch=ACK_BATCH, max_pending=MAX_PENDING_ACKS):
+        cfg = cfg or load_config()
+        if name not in cfg["keys"] or name not in cfg["addrs"]:
+            raise RuntimeError("Destination key/address missing in keys.json")
+        self.key = b64d(cfg["keys"][name])
+        self.host, self.port = cfg["addrs"][name]
+        self.ack_batch = ack_batch
+        self.max_pending = max_pending
+        self.log = get_logger(name)
+        self.stats = dict.fromkeys(STATS, 0)
+        self.pending = {}    # reply endpoint -> deque of ACK ids not yet sent
+        self.flushers = {}   # reply endpoint -> its flusher task
+        self.pool = None     # AsyncConnectionPool, created on the serving loop
+        self.circuits = CircuitTable()
 
-        # send ACK back if reply_to present
+    def handle(self, data):
+        """Open one message (or circuit cell) and queue its ACK."""
+        if is_cell(data):
+            plaintext = self.circuits.exit(self.key, data)
+            if plaintext is None:   # DESTROY, or more cells of the message to come
+                return
+        else:
+            plaintext = open_message(self.key, data)   # any onion layer format
+        try:
+            obj = json.loads(plaintext)
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict):
+            # plain message without an ACK request
+            obj = {"message": plaintext.decode(errors="replace")}
+        self.stats["received"] += 1
+        self.log.debug("Received message: %s", obj.get("message"))
+
+        # innermost payload may contain 'message', 'reply_to' and a message 'id'
+        reply_to = obj.get("reply_to")   # e.g. ["127.0.0.1", 55000]
         if reply_to and isinstance(reply_to, list) and len(reply_to) == 2:
-            ack_ip, ack_port = reply_to[0], int(reply_to[1])
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as ack_sock:
-                    ack_sock.settimeout(2.0)
-                    ack_sock.connect((ack_ip, ack_port))
-                    ack_sock.send(b"ACK")
-                print(f"[Destination] Sent ACK to {reply_to}")
-            except Exception as e:
-                print(f"[Destination] Failed to send ACK to {reply_to}: {e}")
-
-    except Exception as e:
-        print("[Destination] Decrypt/processing error:", e)
+            self.ack((reply_to[0], int(reply_to[1])), obj.get("id"))
+
+    def ack(self, addr, msg_id):
+        queue = self.pending.get(addr)
+        if queue is None:
+            queue = self.pending[addr] = collections.deque()
+        if len(queue) >= self.max_pending:
+            queue.popleft()
+            self.stats["ack_dropped"] += 1
+        queue.append(msg_id)
+        if addr not in self.flushers:
+            self.flushers[addr] = asyncio.create_task(self._flush(addr, queue))
+
+    async def _flush(self, addr, queue):
+        # one send in flight per endpoint; whatever queues up meanwhile goes in the next frame
+        try:
+            while queue:
+                ids = [queue.popleft() for _ in range(min(len(queue), self.ack_batch))]
+                sent = 0
+                for frame, n in ack_frames(ids, self.ack_batch):
+                    try:
+                        await self.pool.send(addr, frame)
+                    except Exception as e:
+                        self.stats["ack_failed"] += len(ids) - sent   # only the ids not yet written
+                        self.log.warning("Failed to send ACKs to %s:%s: %s", addr[0], addr[1], e)
+                        break
+                    self.stats["ack_frames"] += 1
+                    sent += n
+                self.stats["acks_sent"] += sent
+                if sent:
+                    self.log.debug("Sent %d ACK(s) to %s:%s", sent, addr[0], addr[1])
+        finally:
+            del self.flushers[addr]
+            if not queue:
+                self.pending.pop(addr, None)
+
+    async def _on_conn(self, reader, writer):
+        n = 0
+        try:
+            while (data := await read_frame(reader)) is not None:
+                try:
+                    self.handle(data)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.log.warning("Decrypt/processing error: %s", e)
+                n += 1
+                if n % YIELD_EVERY == 0:
+                    await asyncio.sleep(0)   # buffered frames never suspend read_frame; let the flushers run
+        except Exception as e:
+            self.log.warning("Receive error: %s", e)
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """Accept connections until cancelled."""
+        self.pool = AsyncConnectionPool()   # reused connections back to reply_to endpoints
+        server = await asyncio.start_server(self._on_conn, self.host, self.port, reuse_address=True, backlog=1024)
+        self.log.info("Listening on %s:%s ...", self.host, self.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.close()
+
+
+def start_destination(cfg=None, **kwargs):
+    """Run the destination until the process exits. `cfg` defaults to keys.json."""
+    dest = Destination(cfg, **kwargs)
+    try:
+        asyncio.run(dest.serve())
+    finally:
+        s = dest.stats
+        dest.log.info("%d messages, %d ACKs sent in %d frames, %d failed, %d dropped, %d errors",
+                      s["received"], s["acks_sent"], s["ack_frames"], s["ack_failed"], s["ack_dropped"], s["errors"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mesh's destination.")
+    parser.add_argument("--ack-batch", type=int, default=ACK_BATCH, help="ACK ids per coalesced frame")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_ACKS,
+                        help="ACKs queued per reply endpoint before the oldest are dropped")
+    parser.add_argument("--log-level", choices=sorted(LEVELS), default=None,
+                        help="per-message lines are debug (default: info, or $NODE_LOG_LEVEL)")
+    args = parser.parse_args()
+    if args.log_level:
+        set_level(args.log_level)
+    try:
+        start_destination(ack_batch=args.ack_batch, max_pending=args.max_pending)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,68 @@
+# experience.py
+"""
+Experience replay for RouteRLAgent.
+
+ReplayBuffer keeps the last `capacity` experiences, each a route (as the
+Q-table's flat index) and the reward it earned, in two preallocated NumPy
+arrays used as a ring: once full, the newest overwrites the oldest. Memory
+is fixed at 16 bytes per slot however long the run.
+
+With a buffer attached, RouteRLAgent.update() only records the experience.
+Every `update_every` experiences it applies one vectorized step (learn())
+to the new experiences plus `minibatch` drawn uniformly from the buffer,
+so each episode keeps contributing after its first update. Within a step,
+the k samples of one route move its Q-value towards their mean reward by
+1 - (1 - alpha)^k, the same aggregation routing.TrustScores.observe() uses.
+That equals k sequential updates when the rewards agree.
+
+An episode is a single terminal step (route in, reward out), so the target
+is the reward itself and gamma has nothing to discount.
+"""
+import numpy as np
+
+BUFFER_SIZE = 10_000   # experiences kept
+UPDATE_EVERY = 64      # experiences between vectorized learning steps
+MINIBATCH = 256        # replayed experiences per step, on top of the new ones
+
+
+class ReplayBuffer:
+    def __init__(self, capacity=BUFFER_SIZE, seed=None):
+        if capacity < 1:
+            raise ValueError("replay buffer needs at least one slot")
+        self.capacity = capacity
+        self.routes = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.size = 0    # slots filled
+        self.head = 0    # next slot to write
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.routes.nbytes + self.rewards.nbytes
+
+    def extend(self, routes, rewards):
+        """Append experiences (arrays, at most `capacity` of them) with one slice store per wrap."""
+        n = len(routes)
+        first = min(n, self.capacity - self.head)
+        self.routes[self.head:self.head + first] = routes[:first]
+        self.rewards[self.head:self.head + first] = rewards[:first]
+        self.routes[:n - first] = routes[first:]
+        self.rewards[:n - first] = rewards[first:]
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, n):
+        """n experiences drawn uniformly, with replacement."""
+        if not self.size or n <= 0:
+            return self.routes[:0], self.rewards[:0]
+        slots = self.rng.integers(0, self.size, n)
+        return self.routes[slots], self.rewards[slots]
+
+
+def batch_targets(routes, rewards):
+    """Per distinct route in a step: (route indices, mean reward, sample count)."""
+    uniq, inverse, counts = np.unique(routes, return_inverse=True, return_counts=True)
+    return uniq, np.bincount(inverse, weights=rewards, minlength=len(uniq)) / counts, counts
@@ -0,0 +1,139 @@
+# framing.py
+"""
+Length-prefixed wire framing shared by sender.py, node.py and destination.py.
+
+    frame = MAGIC (2 bytes) | length (uint32, big endian) | payload
+
+MAGIC starts with a NUL byte, which never occurs in the base64 text that
+unframed (older) peers write, so a receiver can accept both on one port:
+an unframed connection is read to EOF and treated as a single packet.
+
+A connection may carry any number of frames back to back. Each payload is
+received straight into one preallocated buffer, so a large onion is held
+in memory once per hop instead of as a pile of recv() chunks.
+"""
+import struct, asyncio
+
+MAGIC = b"\x00\xf1"
+HEADER = struct.Struct("!2sI")
+MAX_FRAME = 256 * 1024 * 1024   # refuse absurd lengths from a corrupt header
+CHUNK = 64 * 1024
+OFFER_TIMEOUT = 1.0   # seconds offer_frame() waits to finish a partly sent frame
+
+
+class FrameError(Exception):
+    """Raised when a peer sends a malformed or truncated frame."""
+
+
+def _check_header(header):
+    magic, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise FrameError(f"bad frame magic {magic!r}")
+    if length > MAX_FRAME:
+        raise FrameError(f"frame of {length} bytes exceeds MAX_FRAME ({MAX_FRAME})")
+    return length
+
+
+# --- blocking sockets ---
+def _recv_into(sock, view):
+    """Fill `view` completely; return False on EOF before the first byte."""
+    got = 0
+    while got < len(view):
+        n = sock.recv_into(view[got:], min(CHUNK, len(view) - got))
+        if n == 0:
+            if got == 0:
+                return False
+            raise FrameError(f"connection closed after {got} of {len(view)} bytes")
+        got += n
+    return True
+
+
+def offer_frame(sock, payload, timeout=OFFER_TIMEOUT):
+    """
+    Send a small frame only if the socket can take it now. Returns False, with
+    nothing written, when the send buffer is full (the peer isn't reading). A
+    frame that only partly fits is finished within `timeout` seconds; past
+    that socket.timeout is raised, and the stream is no longer usable.
+    """
+    frame = HEADER.pack(MAGIC, len(payload)) + payload
+    previous = sock.gettimeout()
+    try:
+        sock.settimeout(0)
+        try:
+            sent = sock.send(frame)
+        except BlockingIOError:
+            return False
+        if sent < len(frame):
+            sock.settimeout(timeout)
+            sock.sendall(frame[sent:])
+        return True
+    finally:
+        sock.settimeout(previous)
+
+
+def send_frame(sock, payload):
+    header = HEADER.pack(MAGIC, len(payload))
+    if len(payload) <= CHUNK:
+        sock.sendall(header + payload)   # bytes + any buffer: one copy, even for a memoryview
+    else:
+        sock.sendall(header)
+        sock.sendall(payload)
+
+
+def recv_frame(sock):
+    """
+    Return the next payload from `sock` as a bytearray, or None on clean EOF.
+    Unframed legacy data is read to EOF and returned as one payload.
+    """
+    first = bytearray(1)
+    if not _recv_into(sock, memoryview(first)):
+        return None
+    if first[0] != MAGIC[0]:
+        chunks = [bytes(first)]
+        while True:
+            chunk = sock.recv(CHUNK)
+            if not chunk:
+                return bytearray(b"".join(chunks))
+            chunks.append(chunk)
+    header = bytearray(HEADER.size)
+    header[0] = first[0]
+    if not _recv_into(sock, memoryview(header)[1:]):
+        raise FrameError("connection closed inside frame header")
+    payload = bytearray(_check_header(header))
+    if payload and not _recv_into(sock, memoryview(payload)):
+        raise FrameError("connection closed before frame payload")
+    return payload
+
+
+def recv_frames(sock):
+    """Yield every payload on `sock` until the peer closes it."""
+    while True:
+        payload = recv_frame(sock)
+        if payload is None:
+            return
+        yield payload
+
+
+# --- asyncio streams ---
+def write_frame(writer, payload):
+    """Queue one frame on an asyncio StreamWriter (caller awaits drain())."""
+    writer.write(HEADER.pack(MAGIC, len(payload)))
+    writer.write(payload)
+
+
+async def read_frame(reader):
+    """asyncio counterpart of recv_frame()."""
+    first = await reader.read(1)
+    if not first:
+        return None
+    if first[0] != MAGIC[0]:
+        return first + await reader.read()
+    try:
+        header = first + await reader.readexactly(HEADER.size - 1)
+    except asyncio.IncompleteReadError as e:
+        raise FrameError("connection closed inside frame header") from e
+    length = _check_header(header)
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise FrameError(f"connection closed after {len(e.partial)} of {length} bytes") from e
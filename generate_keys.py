@@ -1,31 +1,45 @@
 # generate_keys.py
-import json, base64
-from Crypto.Random import get_random_bytes
-
-def b64(b): return base64.b64encode(b).decode()
-
-keys = {}
-addrs = {}
-base_port = 5000
-
-# 4 nodes per layer
-for i in range(1, 4 + 1):
-    keys[f"L1_Node{i}"] = b64(get_random_bytes(16))
-    addrs[f"L1_Node{i}"] = ["127.0.0.1", base_port + i]
-
-for i in range(1, 4 + 1):
-    keys[f"L2_Node{i}"] = b64(get_random_bytes(16))
-    addrs[f"L2_Node{i}"] = ["127.0.0.1", base_port + 100 + i]
-
-for i in range(1, 4 + 1):
-    keys[f"L3_Node{i}"] = b64(get_random_bytes(16))
-    addrs[f"L3_Node{i}"] = ["127.0.0.1", base_port + 200 + i]
-
-# Destination
-keys["Destination"] = b64(get_random_bytes(16))
-addrs["Destination"] = ["127.0.0.1", base_port + 999]
-
-with open("keys.json", "w") as f:
-    json.dump({"keys": keys, "addrs": addrs}, f, indent=2)
-
-print("[+] keys.json generated successfully (12 nodes + destination)")
+"""
+Write keys.json for a mesh of any size (see topology.py for names and ports).
+
+Usage:
+    python generate_keys.py                                  # 3 layers x 4 relays (L1_NodeA .. L3_NodeD)
+    python generate_keys.py --layers 5 --nodes 100 --seed 1 # 500 relays, 5 hops
+    python generate_keys.py --nodes 8 16 8 --base-port 20000 --layer-stride 100
+
+Relay behaviour is drawn uniformly from --drop-prob, --delay-mean and
+--capacity. Top-level sections other than keys/addrs/behavior (trust,
+admission, ...) of an existing output file are kept.
+"""
+import argparse, json, os
+
+import topology
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate keys, addresses and relay behaviour for the mesh.")
+    ap.add_argument("--layers", type=int, default=3)
+    ap.add_argument("--nodes", type=int, nargs="+", default=[4], help="relays per layer (one value, or one per layer)")
+    ap.add_argument("--host", default=topology.HOST)
+    ap.add_argument("--base-port", type=int, default=topology.BASE_PORT)
+    ap.add_argument("--layer-stride", type=int, default=None, help="ports per layer (default: power of ten above --nodes)")
+    ap.add_argument("--dest-port", type=int, default=None, help="destination port (default: after the last layer)")
+    ap.add_argument("--drop-prob", type=float, nargs=2, default=topology.DROP_PROB, metavar=("LO", "HI"))
+    ap.add_argument("--delay-mean", type=float, nargs=2, default=topology.DELAY_MEAN, metavar=("LO", "HI"))
+    ap.add_argument("--capacity", type=int, nargs=2, default=topology.CAPACITY, metavar=("LO", "HI"))
+    ap.add_argument("--seed", type=int, default=None, help="seed the behaviour draws (keys are always random)")
+    ap.add_argument("--out", default=topology.KEYS_FILE)
+    args = ap.parse_args()
+
+    nodes = args.nodes[0] if len(args.nodes) == 1 else args.nodes
+    cfg = topology.generate(args.layers, nodes, args.host, args.base_port, args.layer_stride, args.dest_port,
+                            args.seed, drop_prob=args.drop_prob, delay_mean=args.delay_mean, capacity=args.capacity)
+    if os.path.exists(args.out):
+        with open(args.out) as f:
+            cfg = {**{k: v for k, v in json.load(f).items() if k not in cfg}, **cfg}
+    with open(args.out, "w") as f:
+        json.dump(cfg, f, indent=2)
+
+    relays = len(cfg["keys"]) - 1
+    ports = [p for _, p in cfg["addrs"].values()]
+    print(f"[+] {args.out} generated: {relays} relays in {args.layers} layers + destination, "
+          f"ports {min(ports)}-{max(ports)}")
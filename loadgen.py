@@ -0,0 +1,139 @@
+# loadgen.py
+"""
+Open-loop load generator for a running onion mesh.
+
+Messages are sent at a target rate whatever happens to earlier ones (open
+loop), so a slow mesh shows up as queueing and loss rather than as a slower
+sender. Every message asks the destination for an ACK; sender.AckListener
+matches them, and the end-to-end round-trip time is the latency.
+
+Routes are one fixed route (--route L1_NodeA,L2_NodeB,L3_NodeC), uniformly
+random ("random") or chosen by RouteRLAgent from a Q-table ("rl", no
+learning). Onions are built before the clock starts, so building them does
+not limit the offered rate. Message ids and any padding up to --size bytes
+are in the innermost payload.
+
+Usage:
+    python loadgen.py --rate 200 --duration 10 [--size 1024] [--routes random|rl] [--json out.json]
+"""
+import argparse, asyncio, json, random, time
+
+from connpool import AsyncConnectionPool
+from onion import OnionBuilder
+from sender import AckListener, RouteRLAgent, ACK_TIMEOUT
+from topology import layers_of, load_config
+
+ROUTE_MODES = ("random", "rl")
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (same definition as the benchmarks)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+def plan_routes(cfg, n, routes="random", rng=random, qfile="route_qtable.json", epsilon=0.0):
+    """
+    n routes: a fixed route (list of names), a list of routes (cycled, e.g.
+    from a replayed trace), "random", or "rl" (RouteRLAgent.choose_route).
+    """
+    layers = layers_of(cfg)
+    if isinstance(routes, (list, tuple)) and routes and isinstance(routes[0], (list, tuple)):
+        return [tuple(routes[i % len(routes)]) for i in range(n)]
+    if isinstance(routes, (list, tuple)):
+        return [tuple(routes)] * n
+    if routes == "rl":
+        agent = RouteRLAgent(layers, epsilon=epsilon, qfile=qfile)
+        return [agent.choose_route() for _ in range(n)]
+    return [tuple(rng.choice(layers[l]) for l in layers) for _ in range(n)]
+
+
+async def generate(cfg, rate, duration, size=64, routes="random", arrivals="fixed", seed=None,
+                   acks=None, ack_timeout=ACK_TIMEOUT, qfile="route_qtable.json", epsilon=0.0):
+    """
+    Offer `rate` messages/s for `duration` seconds and wait for the ACKs.
+    Returns a dict of counts, achieved throughput and RTT percentiles (ms).
+    """
+    rng = random.Random(seed)
+    n = max(1, int(rate * duration))
+    builder = OnionBuilder(cfg)
+    own_acks = acks is None
+    acks = acks or AckListener(timeout=ack_timeout)
+    run_id = f"{rng.getrandbits(32):08x}:"
+    plan = plan_routes(cfg, n, routes, rng, qfile, epsilon)
+
+    onions = []
+    for i, route in enumerate(plan):
+        msg = {"id": f"{run_id}{i}", "message": "", "reply_to": list(acks.addr)}
+        msg["message"] = "x" * max(0, size - len(json.dumps(msg).encode()))
+        onions.append((route, msg["id"], builder.build(route, json.dumps(msg).encode())))
+
+    pool = AsyncConnectionPool()
+    futures, lags = [], []
+    send_errors = 0
+
+    async def send(route, msg_id, onion):
+        nonlocal send_errors
+        fut = acks.expect(msg_id)
+        futures.append(fut)
+        try:
+            await pool.send(cfg["addrs"][route[0]], onion)
+        except Exception:
+            send_errors += 1
+
+    tasks = []
+    t0 = time.perf_counter()
+    due = t0
+    for route, msg_id, onion in onions:
+        now = time.perf_counter()
+        if due > now:
+            await asyncio.sleep(due - now)
+        lags.append(max(0.0, time.perf_counter() - due))
+        tasks.append(asyncio.create_task(send(route, msg_id, onion)))
+        due += rng.expovariate(rate) if arrivals == "poisson" else 1.0 / rate
+    await asyncio.gather(*tasks)
+    send_window = time.perf_counter() - t0
+
+    results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    pool.close()
+    if own_acks:
+        acks.close()
+    rtts = [r for r in results if r is not None]
+    ms = lambda s: None if s is None else round(s * 1000, 2)
+    return {"offered_rate": rate, "duration_s": round(send_window, 3), "size": size,
+            "sent": n - send_errors, "send_errors": send_errors, "acked": len(rtts),
+            "lost": n - send_errors - len(rtts), "loss_rate": round(1 - len(rtts) / n, 4),
+            "throughput": round(len(rtts) / send_window, 1),
+            "p50_ms": ms(percentile(rtts, 50)), "p95_ms": ms(percentile(rtts, 95)), "p99_ms": ms(percentile(rtts, 99)),
+            "max_send_lag_ms": ms(max(lags))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the onion mesh.")
+    parser.add_argument("--rate", type=float, default=100.0, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of offered load")
+    parser.add_argument("--size", type=int, default=64, help="innermost message size in bytes")
+    parser.add_argument("--route", default=None, help="fixed route, e.g. L1_NodeA,L2_NodeB,L3_NodeC")
+    parser.add_argument("--routes", choices=ROUTE_MODES, default="random", help="route choice without --route")
+    parser.add_argument("--qfile", default="route_qtable.json", help="Q-table for --routes rl")
+    parser.add_argument("--epsilon", type=float, default=0.0, help="exploration for --routes rl")
+    parser.add_argument("--arrivals", choices=["fixed", "poisson"], default="fixed")
+    parser.add_argument("--ack-timeout", type=float, default=ACK_TIMEOUT)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="also write the result to this file")
+    args = parser.parse_args()
+
+    cfg = load_config()
+    routes = args.route.split(",") if args.route else args.routes
+    result = asyncio.run(generate(cfg, args.rate, args.duration, args.size, routes, args.arrivals, args.seed,
+                                  ack_timeout=args.ack_timeout, qfile=args.qfile, epsilon=args.epsilon))
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
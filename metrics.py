@@ -0,0 +1,227 @@
+# metrics.py
+"""
+Per-node instrumentation: counters, latency histograms and a queue gauge.
+
+Each relay owns a NodeMetrics with
+
+    counters     accepted, dropped_early, dropped_overload, dropped_admission
+                 (refused by admission control), forwarded, forward_failed,
+                 unknown_next_hop, bad_layer (failed to decrypt or
+                 authenticate), errors, signals_sent / signals_received
+                 (congestion frames to / from neighbours)
+    histograms   queue_wait (frame received -> processing starts),
+                 decrypt (peeling this node's layer), forward (hand-off to
+                 the next hop)
+    gauge        queue_len (packets admitted to NodeBehavior's work queue)
+
+Histograms are HDR-style: values are recorded in microseconds into
+log-linear buckets (16 sub-buckets per power of two, so any quantile is
+within ~3% of the true value) and recording is O(1) with no allocation.
+
+Snapshots are exported two ways, both optional:
+
+    MetricsWriter   every `interval` seconds, metrics/<node>.json (atomic rename)
+    serve_metrics   GET http://host:port/metrics -> {node: snapshot} for every
+                    node in the process
+
+`python metrics.py [metrics_dir]` prints a one-line-per-node table from the
+snapshot files, so the slowest relay stands out.
+"""
+import glob, json, os, sys, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+METRICS_DIR = "metrics"
+METRICS_INTERVAL = 5.0
+COUNTERS = ("accepted", "dropped_early", "dropped_overload", "dropped_admission", "forwarded",
+            "forward_failed", "unknown_next_hop", "bad_layer", "unknown_circuit", "errors", "signals_sent", "signals_received")
+HISTOGRAMS = ("queue_wait", "decrypt", "forward")
+
+SUB_BITS = 5                  # 5 significant bits kept: 2^4 sub-buckets per power of two
+HALF = 1 << (SUB_BITS - 1)
+BUCKETS = (64 - SUB_BITS + 2) * HALF
+
+
+class Histogram:
+    """Log-linear histogram of durations, recorded in microseconds."""
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def bucket(us):
+        if us < 2 * HALF:
+            return us
+        e = us.bit_length() - SUB_BITS
+        return e * HALF + (us >> e)
+
+    @staticmethod
+    def bucket_value(i):
+        """Midpoint (us) of bucket i."""
+        if i < 2 * HALF:
+            return i
+        e = i // HALF - 1
+        return ((i - e * HALF) << e) + (1 << (e - 1))
+
+    def record(self, seconds):
+        us = max(0, int(seconds * 1e6))
+        i = self.bucket(us)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += us
+            if self.min is None or us < self.min:
+                self.min = us
+            if us > self.max:
+                self.max = us
+
+    def record_many(self, seconds):
+        """Record an array of durations at once (vectorized bucket())."""
+        import numpy as np
+        us = np.maximum(0, (np.asarray(seconds, dtype=np.float64) * 1e6)).astype(np.int64)
+        if not len(us):
+            return
+        e = np.maximum(np.frexp(us)[1] - SUB_BITS, 0)        # frexp's exponent is the bit length
+        idx = np.where(us < 2 * HALF, us, e * HALF + (us >> e))
+        counts = np.bincount(idx, minlength=BUCKETS)
+        with self.lock:
+            for i in np.flatnonzero(counts):
+                self.counts[i] += int(counts[i])
+            self.count += len(us)
+            self.total += int(us.sum())
+            lo, hi = int(us.min()), int(us.max())
+            if self.min is None or lo < self.min:
+                self.min = lo
+            if hi > self.max:
+                self.max = hi
+
+    def percentile(self, q):
+        """q-th percentile in microseconds (0 if empty)."""
+        with self.lock:
+            if not self.count:
+                return 0
+            rank = max(1, int(q / 100.0 * self.count + 0.5))
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    return min(self.bucket_value(i), self.max)
+        return self.max
+
+    def snapshot(self):
+        """Summary in milliseconds."""
+        ms = lambda us: round(us / 1000.0, 3)
+        return {"count": self.count,
+                "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+                "min_ms": ms(self.min or 0), "max_ms": ms(self.max),
+                **{f"p{q:g}_ms".replace(".", ""): ms(self.percentile(q)) for q in (50, 90, 99, 99.9)}}
+
+
+class NodeMetrics:
+    def __init__(self, node_name, queue_len=None):
+        self.node_name = node_name
+        self.started = time.time()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {h: Histogram() for h in HISTOGRAMS}
+        self.queue_len = queue_len or (lambda: 0)   # gauge callback
+        self.lock = threading.Lock()
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def observe(self, name, seconds):
+        self.histograms[name].record(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {"node": self.node_name, "time": time.time(), "uptime_s": round(time.time() - self.started, 1),
+                "queue_len": self.queue_len(), "counters": counters,
+                "histograms": {h: hist.snapshot() for h, hist in self.histograms.items()}}
+
+
+REGISTRY = {}   # node name -> NodeMetrics, for every node in this process
+
+def register(metrics):
+    REGISTRY[metrics.node_name] = metrics
+    return metrics
+
+
+# --- exporters ---
+WRITERS = []   # every MetricsWriter in this process (closed explicitly where atexit doesn't run)
+
+class MetricsWriter:
+    """Write metrics/<node>.json every `interval` seconds from a daemon thread."""
+    def __init__(self, metrics, directory=METRICS_DIR, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = os.path.join(directory, f"{metrics.node_name}.json")
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        WRITERS.append(self)
+        self.stop = threading.Event()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while not self.stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.metrics.snapshot(), f, indent=2)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        self.stop.set()
+        self.write()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps({name: m.snapshot() for name, m in REGISTRY.items()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+def serve_metrics(host="127.0.0.1", port=0):
+    """Start (once per process) the HTTP endpoint for every registered node; returns its address."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server.server_address
+
+
+# --- report ---
+def report(directory=METRICS_DIR):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as f:
+            rows.append(json.load(f))
+    print(f"{'node':<14} {'queue':>5} {'accepted':>9} {'fwd':>8} {'drop_e':>7} {'drop_o':>7} {'drop_a':>7} "
+          f"{'fail':>5} {'wait p99':>9} {'decr p99':>9} {'fwd p99':>9}")
+    for r in rows:
+        c, h = r["counters"], r["histograms"]
+        print(f"{r['node']:<14} {r['queue_len']:>5} {c['accepted']:>9} {c['forwarded']:>8} {c['dropped_early']:>7} "
+              f"{c['dropped_overload']:>7} {c.get('dropped_admission', 0):>7} {c['forward_failed']:>5} "
+              f"{h['queue_wait']['p99_ms']:>9} {h['decrypt']['p99_ms']:>9} {h['forward']['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else METRICS_DIR)
@@ -1,29 +1,119 @@
 # node.py
-import socket, json, base64, sys, os, time, random, threading
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
+import socket, json, base64, copy, sys, os, time, random, threading, asyncio, argparse, atexit, signal, queue
+from framing import recv_frames, read_frame, offer_frame, write_frame
+from connpool import ConnectionPool, AsyncConnectionPool
+from congestion import CongestionTable, SIGNAL_INTERVAL, encode as congestion_signal
+from onion import peel, peel_batch, LayerError
+from circuit import CircuitTable, CircuitError, is_cell
+from metrics import NodeMetrics, MetricsWriter, register, serve_metrics, METRICS_DIR, METRICS_INTERVAL
+from nodelog import get_logger, set_level, LEVELS
+from topology import load_config, KEYS_FILE
 
-BUFFER = 8192
+MAX_CONCURRENCY = 256   # asyncio engine: packets processed at once
+WORKERS = 32            # thread engine: worker threads per node
+QUEUE_LIMIT_FACTOR = 8  # default queue_limit = QUEUE_LIMIT_FACTOR * capacity
+DECRYPT_BATCH = 16      # queued packets a worker peels in one peel_batch() call
+ADMISSION_POLICIES = ("tail", "red", "reject")
+RED_MAX_P = 0.5         # RED drop probability as the averaged queue reaches queue_limit
+RED_WEIGHT = 0.02       # RED: weight of each arrival in the averaged queue length
+RELOAD_INTERVAL = 1.0   # seconds between keys.json change checks (watch_config)
+
+RUNNING = {}            # node name -> (NodeTrust, NodeBehavior) for nodes started in this process
+RELOADERS = {}          # node name -> callable(cfg) applying a reloaded config to the running node
+CONFIG_OVERRIDES = {}   # command-line settings kept across reloads: {"admission": {...}, "behavior": {node: {...}}}
 
 def b64d(x): return base64.b64decode(x)
 
-def decrypt_aes(key_bytes, enc_b64):
-    raw = b64d(enc_b64)
-    iv = raw[:16]
-    ct = raw[16:]
-    cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
-    return unpad(cipher.decrypt(ct), AES.block_size)
+def open_layer(key_bytes, packet, circuits):
+    """
+    Decrypt this node's onion layer (any onion.FORMATS), or take a circuit cell
+    one hop (circuit.py), and return (next_hop, payload bytes).
+    """
+    if is_cell(packet):
+        return circuits.relay(key_bytes, packet)
+    return peel(key_bytes, packet)
+
+def open_layers(key_bytes, items, metrics, circuits):
+    """
+    Peel a batch of queued work items in one call. Returns the items with their
+    result attached: (packet, received, (next_hop, payload) or the exception).
+    Circuit cells in the batch go through the circuit table instead.
+    """
+    t = time.perf_counter()
+    packets = [packet for packet, _, _ in items]
+    onions = iter(peel_batch(key_bytes, [p for p in packets if not is_cell(p)]))
+    peeled = []
+    for packet in packets:
+        if not is_cell(packet):
+            peeled.append(next(onions))
+            continue
+        try:
+            peeled.append(circuits.relay(key_bytes, packet))
+        except Exception as e:
+            peeled.append(e)
+    share = (time.perf_counter() - t) / len(items)
+    for _ in items:
+        metrics.observe("decrypt", share)
+    return [(packet, received, result) for (packet, received, _), result in zip(items, peeled)]
+
+# --- work queues: batches are taken from and returned to the head ---
+def _take_unpeeled(items, n):
+    """Pop up to n packets not yet peeled off the head of deque `items` (stops at a None or peeled item)."""
+    out = []
+    while items and len(out) < n and items[0] is not None and items[0][2] is None:
+        out.append(items.popleft())
+    return out
+
+class WorkQueue(queue.Queue):
+    """The thread engine's queue, plus head access for decrypt batches."""
+    def take(self, n):
+        with self.mutex:
+            return _take_unpeeled(self.queue, n)
 
-def load_config():
-    with open("keys.json","r") as f:
-        return json.load(f)
+    def put_front(self, items):
+        """Requeue `items` ahead of everything waiting, in their order."""
+        with self.not_empty:
+            self.queue.extendleft(reversed(items))
+            self.not_empty.notify(len(items))
+
+class AsyncWorkQueue(asyncio.Queue):
+    """The asyncio engine's queue, plus head access for decrypt batches."""
+    def take(self, n):
+        return _take_unpeeled(self._queue, n)
+
+    def put_front(self, items):
+        self._queue.extendleft(reversed(items))
+        for _ in items:
+            self._wakeup_next(self._getters)   # as put_nowait() does
 
 # --- RL Trust Table for each node ---
+TRUST_FLUSH_INTERVAL = 1.0   # seconds between background flushes
+TRUST_FLUSH_EVERY = 100      # flush early after this many updates (1 = write on every update)
+
 class NodeTrust:
-    def __init__(self, node_name):
+    """
+    Trust scores for this node's next hops, kept in memory and flushed to
+    trust_<node>.json by a background thread every `flush_interval` seconds or
+    after `flush_every` updates, whichever comes first. Files are written to a
+    temp file and renamed into place, so a crash never leaves half a JSON file.
+    With flush_every=1 every update is written synchronously (the old behaviour);
+    fsync=True additionally forces each write to disk.
+    """
+    def __init__(self, node_name, flush_interval=TRUST_FLUSH_INTERVAL, flush_every=TRUST_FLUSH_EVERY, fsync=False):
         self.node_name = node_name
         self.filename = f"trust_{node_name}.json"
+        self.flush_interval = float(flush_interval)
+        self.flush_every = max(1, int(flush_every))
+        self.fsync = bool(fsync)
+        self.log = get_logger(node_name)
         self.scores = self.load()
+        self.lock = threading.Lock()      # guards scores / dirty
+        self.io_lock = threading.Lock()   # serializes file writes
+        self.dirty = 0
+        self.wake = threading.Event()
+        self.closed = False
+        if self.flush_every > 1:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
 
     def load(self):
         if os.path.exists(self.filename):
@@ -35,134 +125,657 @@ class NodeTrust:
         return {}
 
     def save(self):
-        with open(self.filename,"w") as f:
-            json.dump(self.scores, f, indent=2)
+        with self.io_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                snapshot = dict(self.scores)
+                self.dirty = 0
+            tmp = f"{self.filename}.tmp"
+            with open(tmp,"w") as f:
+                json.dump(snapshot, f, indent=2)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+            if self.fsync and hasattr(os, "O_DIRECTORY"):
+                dir_fd = os.open(os.path.dirname(os.path.abspath(self.filename)), os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
 
-    def update(self, next_hop, success, alpha=0.1):
-        reward = 5 if success else -5
-        old = self.scores.get(next_hop, 0)
-        self.scores[next_hop] = old + alpha * (reward - old)
+    def _flush_loop(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.save()
+            except Exception as e:
+                self.log.warning("Trust flush failed: %s", e)
+
+    def close(self):
+        """Stop the background flusher and write any pending updates."""
+        self.closed = True
+        self.wake.set()
         self.save()
-        print(f"[{self.node_name}] Trust[{next_hop}] = {self.scores[next_hop]:.2f}")
+
+    def update(self, next_hop, success, alpha=0.1):
+        self._move(next_hop, 5 if success else -5, alpha)
+
+    def congestion(self, next_hop, level, alpha=0.1):
+        """Congestion signal from next_hop: pull its score from 5 (idle) towards -5 (full/rejecting)."""
+        self._move(next_hop, 5 - 10 * level, alpha)
+
+    def _move(self, next_hop, reward, alpha):
+        with self.lock:
+            old = self.scores.get(next_hop, 0)
+            self.scores[next_hop] = new = old + alpha * (reward - old)
+            self.dirty += 1
+            pending = self.dirty
+        if self.flush_every == 1:
+            self.save()
+        elif pending >= self.flush_every:
+            self.wake.set()
+        self.log.debug("Trust[%s] = %.2f", next_hop, new)
 
 # --- Node behavior for congestion & drops ---
+def node_rng(name):
+    """Per-node RNG: reproducible for a given $NODE_SEED, independent of the other nodes'."""
+    seed = os.environ.get("NODE_SEED")
+    return random.Random(f"{seed}:{name}") if seed is not None else random.Random()
+
 class NodeBehavior:
-    """Per-node behavior: base drop probability, processing delay, capacity and a queue counter."""
+    """
+    Per-node behavior: base drop probability, processing delay, capacity, and
+    admission control for the node's bounded work queue.
+
+    queue_len counts packets admitted and not yet finished (queued or being
+    processed) and never exceeds queue_limit. The admission policy (shared
+    cfg["admission"]["policy"]) decides what happens to an arrival:
+
+        tail     refuse only when the queue is full
+        red      also refuse early, with a probability rising from 0 at
+                 `capacity` to RED_MAX_P at `queue_limit` (averaged queue length)
+        reject   tail drop, and tell the previous hop (congestion.py)
+
+    With cfg["admission"]["signal"] the node also reports its own queue once
+    past capacity and relays congestion it hears from downstream.
+
+    Drops, delays and RED draws come from the node's own RNG, seeded from
+    $NODE_SEED and the node name when set (node.py / run_all_nodes.py --seed).
+    """
     def __init__(self, cfg, name):
-        beh = cfg.get("behavior", {}).get(name, {})
-        # defaults
-        self.drop_prob = float(beh.get("drop_prob", 0.02))
-        self.delay_mean = float(beh.get("delay_mean", 0.02))    # seconds
-        self.delay_std = float(beh.get("delay_std", 0.01))
-        self.capacity = int(beh.get("capacity", 10))
         # runtime state
+        self.rng = node_rng(name)
         self.queue_len = 0
+        self.avg_queue = 0.0
         self.lock = threading.Lock()
+        self.configure(cfg, name)
+
+    def configure(self, cfg, name):
+        """(Re)read the settings; the queue and its counters are kept, so a reload drops nothing."""
+        beh = cfg.get("behavior", {}).get(name, {})
+        adm = cfg.get("admission", {})
+        admission = adm.get("policy", "tail")
+        if admission not in ADMISSION_POLICIES:
+            raise ValueError(f"unknown admission policy {admission!r}")
+        capacity = int(beh.get("capacity", 10))
+        with self.lock:
+            self.drop_prob = float(beh.get("drop_prob", 0.02))
+            self.delay_mean = float(beh.get("delay_mean", 0.02))    # seconds
+            self.delay_std = float(beh.get("delay_std", 0.01))
+            self.capacity = capacity
+            self.queue_limit = int(beh.get("queue_limit", QUEUE_LIMIT_FACTOR * capacity))
+            self.workers = int(beh.get("workers", WORKERS))
+            self.max_concurrency = beh.get("max_concurrency")   # asyncio engine; None: start_node's value
+            self.decrypt_batch = max(1, int(beh.get("decrypt_batch", DECRYPT_BATCH)))
+            self.admission = admission
+            self.signal = bool(adm.get("signal", False))
+
+    def admit(self):
+        """Admission decision for one arrival; True means it was counted into queue_len."""
+        with self.lock:
+            q = self.queue_len
+            self.avg_queue += RED_WEIGHT * (q - self.avg_queue)
+            if q >= self.queue_limit:
+                return False
+            if self.admission == "red" and self.avg_queue > self.capacity:
+                span = max(1, self.queue_limit - self.capacity)
+                if self.rng.random() < RED_MAX_P * (self.avg_queue - self.capacity) / span:
+                    return False
+            self.queue_len = q + 1
+            return True
+
+    def release(self):
+        """An admitted packet is done (forwarded, dropped or failed)."""
+        with self.lock:
+            self.queue_len = max(0, self.queue_len - 1)
+
+    def occupancy(self):
+        return self.queue_len / max(1, self.queue_limit)
+
+    def overloaded(self):
+        return self.queue_len >= self.capacity
 
     def maybe_drop(self):
         """Return True if packet should be dropped (simulated)."""
         base = self.drop_prob
         overload_factor = max(0, (self.queue_len - self.capacity) / max(1, self.capacity))
         prob = min(0.99, base + overload_factor * 0.3)
-        return random.random() < prob
+        return self.rng.random() < prob
 
     def processing_delay(self):
         """Return a processing delay that grows slightly with queue length."""
-        delay = max(0, random.gauss(self.delay_mean, self.delay_std))
+        delay = max(0, self.rng.gauss(self.delay_mean, self.delay_std))
         delay += 0.001 * self.queue_len
         return delay
 
-def start_node(node_name):
-    cfg = load_config()
+def upstream_signals(node_name, behavior, downstream, rejected):
+    """
+    Congestion frames to write back to the previous hop after one arrival: the
+    rejection under the "reject" policy and, with signalling on, this node's
+    own queue once past capacity plus whatever is congested further downstream.
+    """
+    out = []
+    if rejected and behavior.admission == "reject":
+        out.append(congestion_signal(node_name, 1.0))
+    elif behavior.signal and behavior.overloaded():
+        out.append(congestion_signal(node_name, behavior.occupancy()))
+    if behavior.signal:
+        out += [congestion_signal(n, level) for n, level in downstream.hot() if n != node_name]
+    return out
+
+def downstream_listener(cfg, trust, metrics, downstream):
+    """on_signal callback for a node's pool: remember the level, nudge trust for a direct next hop."""
+    def on_signal(addr, node, level):
+        metrics.incr("signals_received")
+        downstream.note(node, level)
+        if tuple(cfg["addrs"].get(node, ())) == addr:   # from the next hop itself, not relayed
+            trust.congestion(node, level)
+    return on_signal
+
+# --- config reload ---
+def effective_config(cfg):
+    """cfg with CONFIG_OVERRIDES applied (a copy if there are any; the loaded config is shared)."""
+    if not CONFIG_OVERRIDES:
+        return cfg
+    out = copy.deepcopy(cfg)
+    out.setdefault("admission", {}).update(CONFIG_OVERRIDES.get("admission", {}))
+    for name, beh in CONFIG_OVERRIDES.get("behavior", {}).items():
+        out.setdefault("behavior", {}).setdefault(name, {}).update(beh)
+    return out
+
+def apply_config(node_name, cfg, new, behavior):
+    """
+    Apply a reloaded config to a running node: next-hop addresses and the
+    node's behavior/admission settings change in place. Packets already
+    queued or in flight are untouched. The node's own key and listen
+    address only change on restart.
+    """
+    log = get_logger(node_name)
+    if new["keys"].get(node_name) != cfg["keys"][node_name] or \
+            list(new["addrs"].get(node_name, ())) != list(cfg["addrs"][node_name]):
+        log.warning("Key or listen address changed in keys.json; restart the node to apply it")
+    behavior.configure(new, node_name)
+    addrs = cfg["addrs"]                       # shared with the packet handlers: update, never replace
+    addrs.update({n: a for n, a in new["addrs"].items() if n != node_name})
+    for gone in set(addrs) - set(new["addrs"]) - {node_name}:
+        addrs.pop(gone, None)
+    log.info("Reloaded config (drop_prob=%s, delay_mean=%s, capacity=%s, queue_limit=%d, admission=%s, %d addrs)",
+             behavior.drop_prob, behavior.delay_mean, behavior.capacity, behavior.queue_limit,
+             behavior.admission, len(addrs))
+
+def reload_running(cfg):
+    """Apply `cfg` to every node running in this process."""
+    cfg = effective_config(cfg)
+    for name, reconfigure in list(RELOADERS.items()):
+        try:
+            reconfigure(cfg)
+        except Exception as e:
+            get_logger(name).error("Config reload failed, keeping the old settings: %s", e)
+
+_reload_requested = threading.Event()
+
+def request_reload(signum=None, frame=None):
+    """SIGHUP handler: reload now instead of at the next file check."""
+    _reload_requested.set()
+
+def watch_config(path=KEYS_FILE, interval=RELOAD_INTERVAL):
+    """
+    Reload every node in this process when `path` changes (checked every
+    `interval` seconds; 0 = only on request) or on SIGHUP. Call once per
+    process, from the main thread so the signal handler can be installed.
+    """
+    if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, request_reload)
+
+    def loop():
+        current = load_config(path)
+        while True:
+            forced = _reload_requested.wait(interval or None)
+            _reload_requested.clear()
+            try:
+                new = load_config(path)
+            except (OSError, ValueError) as e:   # mid-write or removed: try again next time
+                get_logger("config").warning("Could not reload %s: %s", path, e)
+                continue
+            if new is not current or forced:
+                current = new
+                reload_running(new)
+
+    threading.Thread(target=loop, name="config-watch", daemon=True).start()
+
+def start_node(node_name, engine="thread", max_concurrency=MAX_CONCURRENCY,
+               metrics_dir=METRICS_DIR, metrics_interval=METRICS_INTERVAL, cfg=None):
+    """
+    Run one relay until the process exits. Metrics snapshots are written to
+    <metrics_dir>/<node_name>.json every `metrics_interval` seconds
+    (metrics_dir=None disables them). `cfg` defaults to keys.json.
+    """
+    cfg = cfg or effective_config(load_config())
+    log = get_logger(node_name)
     if node_name not in cfg["keys"] or node_name not in cfg["addrs"]:
-        print(f"[{node_name}] ERROR: node name not found in keys.json.")
+        log.error("ERROR: node name not found in keys.json.")
         return
+    cfg = {**cfg, "addrs": dict(cfg["addrs"])}   # this node's own address table, updated on reload
 
     key_b64 = cfg["keys"][node_name]
     key = b64d(key_b64)
     host, port = cfg["addrs"][node_name]
 
-    trust = NodeTrust(node_name)
+    trust_cfg = cfg.get("trust", {})   # optional durability settings shared by all nodes
+    trust = NodeTrust(node_name,
+                      flush_interval=trust_cfg.get("flush_interval", TRUST_FLUSH_INTERVAL),
+                      flush_every=trust_cfg.get("flush_every", TRUST_FLUSH_EVERY),
+                      fsync=trust_cfg.get("fsync", False))
+    atexit.register(trust.close)
     behavior = NodeBehavior(cfg, node_name)
+    circuits = CircuitTable()
+    RUNNING[node_name] = (trust, behavior)
+    metrics = register(NodeMetrics(node_name, queue_len=lambda: behavior.queue_len))
+    if metrics_dir:
+        atexit.register(MetricsWriter(metrics, metrics_dir, metrics_interval).close)
+
+    if engine == "asyncio":
+        asyncio.run(serve_async(node_name, cfg, key, host, port, trust, behavior, metrics, circuits, max_concurrency))
+    else:
+        serve_threaded(node_name, cfg, key, host, port, trust, behavior, metrics, circuits)
 
+# --- Thread engine: bounded work queue + fixed worker pool ---
+def serve_threaded(node_name, cfg, key, host, port, trust, behavior, metrics, circuits):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     s.bind((host, port))
-    s.listen(10)
-    print(f"[{node_name}] Listening on {host}:{port} ... (drop_prob={behavior.drop_prob}, delay_mean={behavior.delay_mean}, capacity={behavior.capacity})")
+    s.listen(128)
+    downstream = CongestionTable()
+    # long-lived connections to next hops
+    pool = ConnectionPool(on_signal=downstream_listener(cfg, trust, metrics, downstream))
+    work = WorkQueue()   # bounded by admit(): queue_limit may change on reload
+    log = get_logger(node_name)
+    log.info("Listening on %s:%s [%d workers, queue_limit=%d, admission=%s] ... "
+             "(drop_prob=%s, delay_mean=%s, capacity=%s)", host, port, behavior.workers, behavior.queue_limit,
+             behavior.admission, behavior.drop_prob, behavior.delay_mean, behavior.capacity)
+
+    def handle_packet(enc_packet_b64, received, peeled=None):
+        try:
+            metrics.observe("queue_wait", time.perf_counter() - received)
+            # initial processing fraction
+            delay = behavior.processing_delay()
+            time.sleep(delay * 0.5)
+
+            # early drop (simulate loss in queue/buffer); a peeled packet passed it when batched
+            if peeled is None and drop_early():
+                return
+
+            # decrypt this node's layer (a worker may already have, with a batch)
+            if peeled is None:
+                t = time.perf_counter()
+                peeled = open_layer(key, enc_packet_b64, circuits)
+                metrics.observe("decrypt", time.perf_counter() - t)
+            elif isinstance(peeled, Exception):
+                raise peeled
+            next_hop, payload = peeled   # payload: the next hop's layer, forwarded as-is
+
+            # remainder of processing
+            time.sleep(delay * 0.5)
+
+            log.debug("Decrypted layer. Next hop: %s", next_hop)
+
+            if next_hop not in cfg["addrs"]:
+                metrics.incr("unknown_next_hop")
+                log.warning("Unknown next hop: %s", next_hop)
+                return
+
+            nh_host, nh_port = cfg["addrs"][next_hop]
+
+            # potential drop before forwarding due to overload
+            if behavior.maybe_drop():
+                metrics.incr("dropped_overload")
+                log.debug("DROPPED before forwarding to %s (overload queue=%d)", next_hop, behavior.queue_len)
+                # update trust for next_hop as failed
+                trust.update(next_hop, False)
+                return
+
+            # try forwarding to next hop
+            start_time = time.perf_counter()
+            try:
+                pool.send((nh_host, nh_port), payload)
+                duration = time.perf_counter() - start_time
+                metrics.observe("forward", duration)
+                metrics.incr("forwarded")
+                log.debug("Forwarded to %s (%.3fs)", next_hop, duration)
+                trust.update(next_hop, True)
+            except Exception as e:
+                metrics.incr("forward_failed")
+                log.warning("Forwarding failed to %s: %s", next_hop, e)
+                trust.update(next_hop, False)
+
+        except CircuitError as e:
+            metrics.incr("unknown_circuit")
+            log.debug("Dropped cell: %s", e)
+        except LayerError as e:
+            metrics.incr("bad_layer")
+            log.debug("Dropped undecryptable packet: %s", e)
+        except Exception as e:
+            metrics.incr("errors")
+            log.warning("Error during decrypt/forward: %s", e)
+        finally:
+            behavior.release()
+
+    def drop_early():
+        if not behavior.maybe_drop():
+            return False
+        metrics.incr("dropped_early")
+        log.debug("DROPPED packet early (queue=%d)", behavior.queue_len)
+        # we don't know next_hop here; treat as a local drop (no trust update)
+        return True
+
+    def peel_queued(item):
+        # under backlog, peel the packets waiting behind `item` in one call and put them
+        # back at the head, so they keep their place and idle workers still share them.
+        # Early drops are decided first, so no dropped packet is decrypted.
+        batch = []
+        for nxt in [item, *work.take(behavior.decrypt_batch - 1)]:
+            if drop_early():
+                metrics.observe("queue_wait", time.perf_counter() - nxt[1])
+                behavior.release()
+            else:
+                batch.append(nxt)
+        if not batch:
+            return None
+        batch = open_layers(key, batch, metrics, circuits)
+        work.put_front(batch[1:])
+        return batch[0]
+
+    def worker():
+        while (item := work.get()) is not None:   # None: the pool shrank
+            if item[2] is None and behavior.decrypt_batch > 1 and not work.empty():
+                item = peel_queued(item)
+            if item is not None:
+                handle_packet(*item)
+
+    running_workers = 0
+
+    def resize():
+        nonlocal running_workers
+        while running_workers < behavior.workers:
+            threading.Thread(target=worker, daemon=True).start()
+            running_workers += 1
+        while running_workers > max(1, behavior.workers):
+            work.put(None)
+            running_workers -= 1
+
+    def reconfigure(new):
+        apply_config(node_name, cfg, new, behavior)
+        resize()
+
+    resize()
+    RELOADERS[node_name] = reconfigure
+
+    def serve_conn(conn):
+        # a connection may carry several frames; admitted packets wait in the work queue
+        last_signal = 0.0
+        try:
+            with conn:
+                for data in recv_frames(conn):
+                    if not data:
+                        continue
+                    metrics.incr("accepted")
+                    admitted = behavior.admit()
+                    if admitted:
+                        work.put_nowait((data, time.perf_counter(), None))   # admit() keeps it below queue_limit
+                    else:
+                        metrics.incr("dropped_admission")
+                        log.debug("REFUSED packet (queue=%d/%d, %s)", behavior.queue_len,
+                                  behavior.queue_limit, behavior.admission)
+                    now = time.monotonic()
+                    if now - last_signal >= SIGNAL_INTERVAL:
+                        # never block the receive path on a previous hop that doesn't read: drop the signal
+                        sent = [offer_frame(conn, frame) for frame in
+                                upstream_signals(node_name, behavior, downstream, not admitted)]
+                        if any(sent):
+                            metrics.incr("signals_sent", sum(sent))
+                            last_signal = now
+        except Exception as e:
+            log.warning("Receive error: %s", e)
 
     while True:
         conn, addr = s.accept()
-        data = conn.recv(BUFFER)
-        conn.close()
-        if not data:
-            continue
+        threading.Thread(target=serve_conn, args=(conn,), daemon=True).start()
 
-        # increment queue length to simulate in-flight packets
-        with behavior.lock:
-            behavior.queue_len += 1
+# --- asyncio event-loop engine ---
+async def serve_async(node_name, cfg, key, host, port, trust, behavior, metrics, circuits, max_concurrency=MAX_CONCURRENCY):
+    """
+    Same relay semantics as serve_threaded, but the workers are `max_concurrency`
+    coroutines on one event loop: processing delays are awaited instead of holding
+    an OS thread. Admission control and the bounded queue are the same. A
+    "max_concurrency" behavior key overrides the argument and is applied on reload.
+    """
+    downstream = CongestionTable()
+    # long-lived connections to next hops
+    pool = AsyncConnectionPool(on_signal=downstream_listener(cfg, trust, metrics, downstream))
+    work = AsyncWorkQueue()   # bounded by admit(): queue_limit may change on reload
+    log = get_logger(node_name)
 
-        def handle_packet(enc_packet_b64):
-            try:
-                # initial processing fraction
-                delay = behavior.processing_delay()
-                time.sleep(delay * 0.5)
-
-                # early drop (simulate loss in queue/buffer)
-                if behavior.maybe_drop():
-                    print(f"[{node_name}] DROPPED packet early (queue={behavior.queue_len})")
-                    # we don't know next_hop here; treat as a local drop (no trust update)
-                    return
+    async def handle_packet(enc_packet_b64, received, peeled=None):
+        try:
+            metrics.observe("queue_wait", time.perf_counter() - received)
+            delay = behavior.processing_delay()
+            await asyncio.sleep(delay * 0.5)
 
-                # decrypt this node's layer
-                plaintext = decrypt_aes(key, enc_packet_b64)
-                payload_obj = json.loads(plaintext.decode())
-                next_hop = payload_obj.get("next_hop")
-                payload = payload_obj.get("payload")  # base64 string intended for next hop
+            if peeled is None and drop_early():   # a peeled packet passed this when batched
+                return
 
-                # remainder of processing
-                time.sleep(delay * 0.5)
+            if peeled is None:
+                t = time.perf_counter()
+                peeled = open_layer(key, enc_packet_b64, circuits)
+                metrics.observe("decrypt", time.perf_counter() - t)
+            elif isinstance(peeled, Exception):
+                raise peeled
+            next_hop, payload = peeled
 
-                print(f"[{node_name}] Decrypted layer. Next hop: {next_hop}")
+            await asyncio.sleep(delay * 0.5)
 
-                if next_hop not in cfg["addrs"]:
-                    print(f"[{node_name}] Unknown next hop: {next_hop}")
-                    return
+            log.debug("Decrypted layer. Next hop: %s", next_hop)
 
-                nh_host, nh_port = cfg["addrs"][next_hop]
+            if next_hop not in cfg["addrs"]:
+                metrics.incr("unknown_next_hop")
+                log.warning("Unknown next hop: %s", next_hop)
+                return
 
-                # potential drop before forwarding due to overload
-                if behavior.maybe_drop():
-                    print(f"[{node_name}] DROPPED before forwarding to {next_hop} (overload queue={behavior.queue_len})")
-                    # update trust for next_hop as failed
-                    trust.update(next_hop, False)
-                    return
+            nh_host, nh_port = cfg["addrs"][next_hop]
 
-                # try forwarding to next hop
-                start_time = time.time()
-                try:
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s2:
-                        s2.settimeout(2.0)
-                        s2.connect((nh_host, nh_port))
-                        s2.send(payload.encode())
-                    duration = time.time() - start_time
-                    print(f"[{node_name}] Forwarded to {next_hop} ({duration:.3f}s)")
-                    trust.update(next_hop, True)
-                except Exception as e:
-                    print(f"[{node_name}] Forwarding failed to {next_hop}: {e}")
-                    trust.update(next_hop, False)
+            if behavior.maybe_drop():
+                metrics.incr("dropped_overload")
+                log.debug("DROPPED before forwarding to %s (overload queue=%d)", next_hop, behavior.queue_len)
+                trust.update(next_hop, False)
+                return
 
+            start_time = time.perf_counter()
+            try:
+                await pool.send((nh_host, nh_port), payload)
+                duration = time.perf_counter() - start_time
+                metrics.observe("forward", duration)
+                metrics.incr("forwarded")
+                log.debug("Forwarded to %s (%.3fs)", next_hop, duration)
+                trust.update(next_hop, True)
             except Exception as e:
-                print(f"[{node_name}] Error during decrypt/forward: {e}")
-            finally:
-                with behavior.lock:
-                    behavior.queue_len = max(0, behavior.queue_len - 1)
+                metrics.incr("forward_failed")
+                log.warning("Forwarding failed to %s: %s", next_hop, e)
+                trust.update(next_hop, False)
+
+        except CircuitError as e:
+            metrics.incr("unknown_circuit")
+            log.debug("Dropped cell: %s", e)
+        except LayerError as e:
+            metrics.incr("bad_layer")
+            log.debug("Dropped undecryptable packet: %s", e)
+        except Exception as e:
+            metrics.incr("errors")
+            log.warning("Error during decrypt/forward: %s", e)
+        finally:
+            behavior.release()
+
+    def drop_early():
+        if not behavior.maybe_drop():
+            return False
+        metrics.incr("dropped_early")
+        log.debug("DROPPED packet early (queue=%d)", behavior.queue_len)
+        return True
+
+    def peel_queued(item):
+        # as in serve_threaded: peel up to decrypt_batch waiting packets at once, early drops first,
+        # and put the rest back at the head
+        batch = []
+        for nxt in [item, *work.take(behavior.decrypt_batch - 1)]:
+            if drop_early():
+                metrics.observe("queue_wait", time.perf_counter() - nxt[1])
+                behavior.release()
+            else:
+                batch.append(nxt)
+        if not batch:
+            return None
+        batch = open_layers(key, batch, metrics, circuits)
+        work.put_front(batch[1:])
+        return batch[0]
+
+    async def worker():
+        while (item := await work.get()) is not None:   # None: the pool shrank
+            if item[2] is None and behavior.decrypt_batch > 1 and not work.empty():
+                item = peel_queued(item)
+            if item is not None:
+                await handle_packet(*item)
+
+    loop = asyncio.get_running_loop()
+    tasks = set()   # worker tasks, referenced until they finish
+    running_workers = 0
+
+    def resize():
+        nonlocal running_workers
+        target = max(1, int(behavior.max_concurrency or max_concurrency))
+        while running_workers < target:
+            task = asyncio.create_task(worker())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            running_workers += 1
+        while running_workers > target:
+            work.put_nowait(None)
+            running_workers -= 1
+
+    def reconfigure(new):   # called from the config watcher's thread
+        apply_config(node_name, cfg, new, behavior)
+        loop.call_soon_threadsafe(resize)
+
+    resize()
+    RELOADERS[node_name] = reconfigure
+
+    async def on_connection(reader, writer):
+        # a connection may carry several frames; admitted packets wait in the work queue
+        last_signal = 0.0
+        try:
+            while (data := await read_frame(reader)) is not None:
+                if not data:
+                    continue
+                metrics.incr("accepted")
+                admitted = behavior.admit()
+                if admitted:
+                    work.put_nowait((data, time.perf_counter(), None))
+                else:
+                    metrics.incr("dropped_admission")
+                    log.debug("REFUSED packet (queue=%d/%d, %s)", behavior.queue_len,
+                              behavior.queue_limit, behavior.admission)
+                now = time.monotonic()
+                if now - last_signal >= SIGNAL_INTERVAL:
+                    signals = upstream_signals(node_name, behavior, downstream, not admitted)
+                    # still unsent signals: the previous hop isn't reading, so don't queue more behind them
+                    if signals and not writer.transport.get_write_buffer_size():
+                        for frame in signals:
+                            write_frame(writer, frame)   # a few bytes; the previous hop's pool reads them
+                        metrics.incr("signals_sent", len(signals))
+                        last_signal = now
+        except Exception as e:
+            log.warning("Receive error: %s", e)
+        finally:
+            writer.close()
 
-        t = threading.Thread(target=handle_packet, args=(data.decode(),), daemon=True)
-        t.start()
+    server = await asyncio.start_server(on_connection, host, port, reuse_address=True, backlog=128)
+    log.info("Listening on %s:%s [asyncio, max_concurrency=%d, queue_limit=%d, admission=%s] ... "
+             "(drop_prob=%s, delay_mean=%s, capacity=%s)", host, port, running_workers, behavior.queue_limit,
+             behavior.admission, behavior.drop_prob, behavior.delay_mean, behavior.capacity)
+    async with server:
+        await server.serve_forever()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python node.py NodeName")
-        sys.exit(1)
-    start_node(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Run a single onion relay node.")
+    parser.add_argument("node_name", help="node name as listed in keys.json, e.g. L1_NodeA")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread",
+                        help="relay engine: a pool of worker threads behind a bounded queue (default) "
+                             "or a single asyncio event loop")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help=f"asyncio engine only: packets processed concurrently (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--workers", type=int, default=None, help="thread engine only: worker threads")
+    parser.add_argument("--decrypt-batch", type=int, default=None,
+                        help=f"queued packets peeled per call under backlog (default: {DECRYPT_BATCH}, 1 = off)")
+    parser.add_argument("--queue-limit", type=int, default=None,
+                        help=f"packets admitted at once (default: {QUEUE_LIMIT_FACTOR} x capacity)")
+    parser.add_argument("--admission", choices=ADMISSION_POLICIES, default=None,
+                        help="what to do with arrivals when the queue fills (default: keys.json, else tail)")
+    parser.add_argument("--signal-congestion", action="store_true",
+                        help="report this node's queue and relay downstream congestion to the previous hop")
+    parser.add_argument("--log-level", choices=sorted(LEVELS), default=None,
+                        help="per-packet messages are debug (default: info, or $NODE_LOG_LEVEL)")
+    parser.add_argument("--metrics-dir", default=METRICS_DIR, help="where <node>.json snapshots go ('' = off)")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL)
+    parser.add_argument("--metrics-port", type=int, default=None, help="also serve GET /metrics on this port")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="seconds between keys.json change checks (0 = reload on SIGHUP only)")
+    parser.add_argument("--seed", default=None, help="seed the node's drop/delay draws (default: $NODE_SEED)")
+    args = parser.parse_args()
+    if args.log_level:
+        set_level(args.log_level)
+    if args.seed is not None:
+        os.environ["NODE_SEED"] = args.seed
+    if args.metrics_port is not None:
+        mhost, mport = serve_metrics(port=args.metrics_port)
+        get_logger(args.node_name).info("Metrics on http://%s:%d/metrics", mhost, mport)
+    # command-line overrides on top of keys.json, kept when the file is reloaded
+    adm = CONFIG_OVERRIDES.setdefault("admission", {})
+    if args.admission:
+        adm["policy"] = args.admission
+    if args.signal_congestion:
+        adm["signal"] = True
+    beh = CONFIG_OVERRIDES.setdefault("behavior", {}).setdefault(args.node_name, {})
+    if args.workers is not None:
+        beh["workers"] = args.workers
+    if args.max_concurrency is not None:
+        beh["max_concurrency"] = args.max_concurrency
+    if args.queue_limit is not None:
+        beh["queue_limit"] = args.queue_limit
+    if args.decrypt_batch is not None:
+        beh["decrypt_batch"] = args.decrypt_batch
+    # turn SIGTERM (run_all_nodes.py's terminate()) into a normal exit so pending trust updates are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    watch_config(interval=args.reload_interval)   # keys.json edits and SIGHUP reload the node in place
+    start_node(args.node_name, engine=args.engine, max_concurrency=args.max_concurrency or MAX_CONCURRENCY,
+               metrics_dir=args.metrics_dir or None, metrics_interval=args.metrics_interval)
@@ -0,0 +1,62 @@
+# nodelog.py
+"""
+Level-gated logger for the relays, replacing unconditional print().
+
+Messages are %-style format strings with their arguments passed separately,
+so a disabled level costs one integer comparison and no string formatting:
+
+    log = get_logger("L1_NodeA")
+    log.debug("Forwarded to %s (%.3fs)", next_hop, duration)
+
+Per-packet messages (decrypt, forward, drops, trust updates) are DEBUG;
+startup lines are INFO; failures are WARNING. The level is process-wide
+(set_level(), node.py --log-level, or the NODE_LOG_LEVEL environment
+variable) and defaults to INFO.
+"""
+import os, sys, threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+_level = LEVELS.get(os.environ.get("NODE_LOG_LEVEL", "info").lower(), INFO)
+_write_lock = threading.Lock()
+_loggers = {}
+
+
+def set_level(level):
+    global _level
+    _level = LEVELS[level.lower()] if isinstance(level, str) else int(level)
+
+
+class Logger:
+    def __init__(self, name):
+        self.prefix = f"[{name}] "
+
+    def log(self, level, msg, *args):
+        if level < _level:
+            return
+        line = self.prefix + (msg % args if args else msg) + "\n"
+        with _write_lock:
+            sys.stdout.write(line)
+
+    def debug(self, msg, *args):
+        if DEBUG >= _level:
+            self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        if INFO >= _level:
+            self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        if WARNING >= _level:
+            self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(ERROR, msg, *args)
+
+
+def get_logger(name):
+    log = _loggers.get(name)
+    if log is None:
+        log = _loggers[name] = Logger(name)
+    return log
@@ -0,0 +1,212 @@
+# onion.py
+"""
+Onion construction and peeling.
+
+Three layer formats are understood by every node:
+
+    json (legacy)  base64( iv | AES-CBC( {"next_hop": ..., "payload": "<base64 inner layer>"} ) )
+    binary         0x02 | iv | AES-CBC( len(next_hop) | next_hop | inner layer )
+    gcm            0x03 | nonce | AES-GCM( len(next_hop) | next_hop | inner layer ) | tag
+
+The binary formats carry the inner layer as raw bytes, so a layer costs
+one marker byte, an IV and at most one block of padding, instead of growing
+the onion by a third (base64) plus JSON quoting at every hop. The marker
+byte is never a base64 character, so a node can tell the formats apart
+without trying to decrypt.
+
+gcm (the default) authenticates every layer: a corrupted or truncated
+packet fails the tag check before any of it is used, where CBC only
+notices when the padding happens to be wrong. It needs no padding (29
+bytes per layer), and a writable packet (the bytearray recv_frame()
+returns) is decrypted in place; the payload handed back is a memoryview
+into it, so peeling a layer copies nothing. peel_batch() peels several
+queued packets in one call, decrypting read-only ones into one shared
+buffer. A layer that fails to decrypt raises LayerError.
+
+OnionBuilder decodes each node key once and reuses it, and can build a
+batch of onions drawing all IVs from a single RNG call.
+"""
+import base64, json
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from Crypto.Random import get_random_bytes
+
+BINARY = 0x02
+GCM = 0x03
+FORMATS = ("gcm", "binary", "json")
+NONCE = 12   # gcm nonce bytes
+TAG = 16     # gcm tag bytes
+_GCM_MARKER = bytes([GCM])
+DEST = "Destination"
+
+
+class LayerError(ValueError):
+    """A layer failed to decrypt: wrong key, corrupted, truncated or forged."""
+
+
+# --- single layers ---
+def seal(key, data, iv=None):
+    """Encrypt one binary layer: marker | iv | ciphertext."""
+    iv = iv or get_random_bytes(16)
+    return bytes([BINARY]) + iv + AES.new(key, AES.MODE_CBC, iv).encrypt(pad(data, AES.block_size))
+
+
+def encrypt_aes(key, data):
+    """Encrypt one legacy JSON-format layer: base64(iv | AES-CBC ciphertext), as text."""
+    iv = get_random_bytes(16)
+    return base64.b64encode(iv + AES.new(key, AES.MODE_CBC, iv).encrypt(pad(data, AES.block_size))).decode()
+
+
+def seal_gcm(key, data, nonce=None):
+    """Encrypt one authenticated layer: marker | nonce | ciphertext | tag."""
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce or get_random_bytes(NONCE))
+    cipher.update(_GCM_MARKER)
+    ct, tag = cipher.encrypt_and_digest(data)
+    return _GCM_MARKER + cipher.nonce + ct + tag
+
+
+def layer_plaintext(next_hop, payload):
+    hop = next_hop.encode()
+    if len(hop) > 255:
+        raise ValueError(f"next hop name too long: {next_hop!r}")
+    return bytes([len(hop)]) + hop + payload
+
+
+def _open_gcm(key, view, out=None):
+    """Verify and decrypt a gcm layer into `out`, by default in place if `view` is writable."""
+    if len(view) < 1 + NONCE + TAG:
+        raise LayerError(f"truncated layer ({len(view)} bytes)")
+    ct = view[1 + NONCE:-TAG]
+    if out is None:
+        out = memoryview(bytearray(len(ct))) if view.readonly else ct
+    cipher = AES.new(key, AES.MODE_GCM, nonce=view[1:1 + NONCE])
+    cipher.update(view[:1])
+    try:
+        cipher.decrypt_and_verify(ct, view[-TAG:], output=out)
+    except ValueError as e:
+        raise LayerError("layer failed authentication") from e
+    return out
+
+
+def _decrypt(key, data):
+    """Decrypt a layer in any format; returns (plaintext, is_binary)."""
+    view = memoryview(data)
+    if not view:
+        raise LayerError("empty layer")
+    if view[0] == GCM:
+        return _open_gcm(key, view), True
+    try:
+        if view[0] == BINARY:
+            iv, ct = view[1:17], view[17:]
+            return unpad(AES.new(key, AES.MODE_CBC, iv).decrypt(ct), AES.block_size), True
+        raw = base64.b64decode(data)
+        return unpad(AES.new(key, AES.MODE_CBC, raw[:16]).decrypt(raw[16:]), AES.block_size), False
+    except ValueError as e:
+        raise LayerError(f"layer failed to decrypt: {e}") from e
+
+
+def _split(plaintext):
+    n = plaintext[0]
+    return str(plaintext[1:1 + n], "utf-8"), plaintext[1 + n:]
+
+
+def peel(key, data):
+    """
+    Remove one relay layer. Returns (next_hop, payload to forward as-is).
+    A writable gcm packet is decrypted in place and the payload is a view into it.
+    """
+    plaintext, binary = _decrypt(key, data)
+    if binary:
+        return _split(plaintext)
+    obj = json.loads(plaintext.decode())
+    payload = obj.get("payload")
+    return obj.get("next_hop"), payload.encode() if isinstance(payload, str) else payload
+
+
+def peel_batch(key, packets):
+    """
+    Peel this node's layer off several packets in one call. Returns, per
+    packet, (next_hop, payload) or the exception it raised, so one bad packet
+    doesn't sink the batch. Writable gcm packets are decrypted in place and
+    read-only ones into slices of one buffer allocated for the whole batch.
+    """
+    views = [memoryview(p) for p in packets]
+    spare = sum(len(v) - 1 - NONCE - TAG for v in views if v.readonly and len(v) > NONCE + TAG and v[0] == GCM)
+    arena = memoryview(bytearray(spare)) if spare else None
+    pos, out = 0, []
+    for view, packet in zip(views, packets):
+        try:
+            if view and view[0] == GCM:
+                dst = None
+                if view.readonly and len(view) > NONCE + TAG:
+                    n = len(view) - 1 - NONCE - TAG
+                    dst, pos = arena[pos:pos + n], pos + n
+                out.append(_split(_open_gcm(key, view, dst)))
+            else:
+                out.append(peel(key, packet))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def open_message(key, data):
+    """Decrypt the destination's (innermost) layer in any format."""
+    view = memoryview(data)
+    if view and view[0] == GCM:
+        return bytes(_open_gcm(key, view.toreadonly()))   # never in place: the caller keeps its buffer
+    return _decrypt(key, data)[0]
+
+
+# --- whole onions ---
+class OnionBuilder:
+    def __init__(self, cfg, fmt="gcm", dest=DEST):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown onion format {fmt!r}")
+        self.cfg = cfg
+        self.fmt = fmt
+        self.dest = dest
+        self.keys = {}   # node name -> decoded AES key
+
+    def key(self, name):
+        k = self.keys.get(name)
+        if k is None:
+            k = self.keys[name] = base64.b64decode(self.cfg["keys"][name])
+        return k
+
+    def build(self, route, message, ivs=None):
+        """
+        Wrap `message` for route = (first hop, ..., last relay) -> Destination.
+        Returns the bytes to frame and send to route[0]. Any route length works.
+        """
+        if self.fmt == "json":
+            return self._build_json(route, message)
+        seal_layer, n = (seal_gcm, NONCE) if self.fmt == "gcm" else (seal, 16)
+        ivs = ivs or get_random_bytes(n * (len(route) + 1))
+        onion = seal_layer(self.key(self.dest), message, ivs[:n])
+        next_hop = self.dest
+        for i, hop in enumerate(reversed(route), 1):
+            onion = seal_layer(self.key(hop), layer_plaintext(next_hop, onion), ivs[n * i:n * (i + 1)])
+            next_hop = hop
+        return onion
+
+    def build_batch(self, items):
+        """Build many onions at once: items = [(route, message), ...]."""
+        if self.fmt == "json":
+            return [self._build_json(r, m) for r, m in items]
+        size = NONCE if self.fmt == "gcm" else 16
+        ivs = get_random_bytes(sum(size * (len(r) + 1) for r, _ in items))
+        out, pos = [], 0
+        for route, message in items:
+            n = size * (len(route) + 1)
+            out.append(self.build(route, message, ivs[pos:pos + n]))
+            pos += n
+        return out
+
+    def _build_json(self, route, message):
+        onion = encrypt_aes(self.key(self.dest), message)
+        next_hop = self.dest
+        for hop in reversed(route):
+            onion = encrypt_aes(self.key(hop), json.dumps({"next_hop": next_hop, "payload": onion}).encode())
+            next_hop = hop
+        return onion.encode()
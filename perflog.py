@@ -0,0 +1,203 @@
+# perflog.py
+"""
+Buffered, rotating writer for the sender's performance log.
+
+Rows (timestamp, route, success, latency, reward) are kept in memory and
+written out by a background thread every `flush_interval` seconds or once
+`flush_rows` rows are pending, so the episode loop never touches the disk.
+
+The active file is `logs/performance_log.<ext>`. When it grows past
+`max_bytes` (rotate="size") or the local date changes (rotate="daily") it is
+renamed to `logs/performance_log.<YYYYmmdd-HHMMSS>.<ext>` and a new active
+file is started. Formats:
+
+    csv       plain CSV (default, same as before)
+    csv.gz    gzip-compressed CSV, appended to in gzip members
+    parquet   one Parquet file per segment, one row group per flush
+              (needs pyarrow; the active segment is readable once closed)
+
+read_logs() returns every segment plus the active file as one DataFrame in
+chronological order, so analytics scripts don't need to know about rotation.
+"""
+import csv, glob, gzip, io, os, re, threading, time
+
+LOGFILE = "logs/performance_log.csv"
+COLUMNS = ["timestamp", "route", "success", "latency", "reward"]
+FORMATS = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet"}
+FLUSH_ROWS = 1000
+FLUSH_INTERVAL = 2.0
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def _split(path):
+    """'logs/performance_log.csv' -> ('logs/performance_log', '.csv')"""
+    for ext in sorted(FORMATS.values(), key=len, reverse=True):
+        if path.endswith(ext):
+            return path[:-len(ext)], ext
+    return os.path.splitext(path)
+
+
+class PerformanceLog:
+    def __init__(self, path=LOGFILE, fmt="csv", rotate="size", max_bytes=MAX_BYTES,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown log format {fmt!r}; expected one of {sorted(FORMATS)}")
+        if rotate not in ("size", "daily", None, "none"):
+            raise ValueError(f"unknown rotation policy {rotate!r}")
+        self.stem = _split(path)[0]
+        self.ext = FORMATS[fmt]
+        self.fmt = fmt
+        self.path = self.stem + self.ext
+        self.rotate = None if rotate == "none" else rotate
+        self.max_bytes = max_bytes
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self.pending = []
+        self.lock = threading.Lock()       # guards pending
+        self.io_lock = threading.Lock()    # serializes flush/rotate
+        self.out = None                    # open handle of the active segment
+        self.day = None
+        self.wake = threading.Event()
+        self.closed = False
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    # --- producer side ---
+    def log(self, route, success, latency, reward):
+        row = (time.strftime('%Y-%m-%d %H:%M:%S'), "→".join(route), int(success),
+               round(latency, 4), round(reward, 3))
+        with self.lock:
+            self.pending.append(row)
+            full = len(self.pending) >= self.flush_rows
+        if full:
+            self.wake.set()
+
+    def log_many(self, routes, successes, latencies, rewards):
+        """Queue a batch of rows sharing one timestamp (e.g. a simulated batch)."""
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(stamp, "→".join(r), int(s), round(l, 4), round(w, 3))
+                for r, s, l, w in zip(routes, successes, latencies, rewards)]
+        with self.lock:
+            self.pending.extend(rows)
+            full = len(self.pending) >= self.flush_rows
+        if full:
+            self.wake.set()
+
+    # --- writer side ---
+    def _flush_loop(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[perflog] flush failed: {e}")
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+            if not rows:
+                return
+            if self.rotate == "daily" and self.day not in (None, time.strftime("%Y-%m-%d")):
+                self._rotate()
+            if self.out is None:
+                self._open()
+            self._write(rows)
+            if self.rotate == "size" and self._size() >= self.max_bytes:
+                self._rotate()
+
+    def _open(self):
+        self.day = time.strftime("%Y-%m-%d")
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            if os.path.exists(self.path):   # left over from an unclean stop: keep it as a segment
+                self._archive()
+            self.out = pq.ParquetWriter(self.path, _arrow_schema())
+            return
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if self.fmt == "csv.gz":
+            self.out = gzip.open(self.path, "at", newline="", encoding="utf-8")
+        else:
+            self.out = open(self.path, "a", newline="", encoding="utf-8")
+        if write_header:
+            csv.writer(self.out).writerow(COLUMNS)
+
+    def _write(self, rows):
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            self.out.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in rows], schema=_arrow_schema()))
+            return
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        self.out.write(buf.getvalue())
+        self.out.flush()
+
+    def _size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _close_active(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def _archive(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        target, n = f"{self.stem}.{stamp}{self.ext}", 1
+        while os.path.exists(target):
+            target, n = f"{self.stem}.{stamp}-{n}{self.ext}", n + 1
+        os.replace(self.path, target)
+
+    def _rotate(self):
+        self._close_active()
+        if os.path.exists(self.path):
+            self._archive()
+
+    def close(self):
+        """Flush pending rows and close the active segment."""
+        self.closed = True
+        self.wake.set()
+        self.flush()
+        with self.io_lock:
+            self._close_active()
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([("timestamp", pa.string()), ("route", pa.string()), ("success", pa.int8()),
+                      ("latency", pa.float64()), ("reward", pa.float64())])
+
+
+def log_files(path=LOGFILE):
+    """All segments of a log (any format), oldest first, active files last."""
+    stem = _split(path)[0]
+    name = os.path.basename(stem)
+    segments, active = [], []
+    for ext in FORMATS.values():
+        pattern = re.compile(re.escape(name) + r"\.(\d{8}-\d{6})(?:-(\d+))?" + re.escape(ext))
+        for p in glob.glob(f"{glob.escape(stem)}.*{ext}"):
+            m = pattern.fullmatch(os.path.basename(p))
+            if m:
+                segments.append(((m.group(1), int(m.group(2) or 0)), p))
+        if os.path.exists(stem + ext):
+            active.append(stem + ext)
+    return [p for _, p in sorted(segments)] + active
+
+
+def read_logs(path=LOGFILE):
+    """Read the whole rotated set as one pandas DataFrame (columns as in COLUMNS)."""
+    import pandas as pd
+    frames = []
+    for p in log_files(path):
+        if p.endswith(".parquet"):
+            try:
+                frames.append(pd.read_parquet(p))
+            except Exception:
+                continue   # active segment still being written
+        else:
+            frames.append(pd.read_csv(p))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,212 @@
+# qtable.py
+"""
+Dense Q-table for RouteRLAgent.
+
+Routes are tuples with one node per layer (L1, L2, L3, ...). Each layer's
+node names are mapped to integer indices and the Q-values live in one NumPy
+array of shape (len(L1), len(L2), len(L3), ...). Routes that have never been
+updated hold NaN, so "unseen" is distinguishable from a learned 0.0.
+
+On disk the table is two files next to the JSON table:
+
+    route_qtable.npy         the value array, memory-mapped read/write, so an
+                             update is one in-place store and a checkpoint is
+                             a flush of the dirty pages
+    route_qtable.index.json  the node names of each layer (array axis order)
+
+Greedy selection does not scan the table: a max-heap of (q, route) entries
+with lazy invalidation sits beside the array. An update pushes the new value
+(O(log n)); best_route() pops entries whose value no longer matches the array
+until the top is current (amortized O(log n)). Ties go to the lowest route
+index, so selection is deterministic. The heap is compacted when stale
+entries outnumber live ones.
+
+The old `route_qtable.json` format ({"('L1_NodeA', 'L2_NodeB', ...)": q})
+is still imported when no binary table exists yet, and export_json() writes
+it back (RouteRLAgent.save() does so), so plot_graphs.py keeps working.
+"""
+import ast, heapq, json, math, os, random
+
+import numpy as np
+
+
+class QTable:
+    def __init__(self, layers, path="route_qtable.json"):
+        self.layer_names = list(layers)
+        self.nodes = [list(layers[l]) for l in self.layer_names]
+        self.index = [{n: i for i, n in enumerate(nodes)} for nodes in self.nodes]
+        self.shape = tuple(len(nodes) for nodes in self.nodes)
+        base = os.path.splitext(path)[0]
+        self.json_path = path
+        self.npy_path = base + ".npy"
+        self.index_path = base + ".index.json"
+        self.strides = [int(np.prod(self.shape[i + 1:], dtype=np.int64)) for i in range(len(self.shape))]
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.values = self._open()
+        self.flat = self.values.reshape(-1).view(np.ndarray)   # plain view onto the same (memory-mapped) buffer
+        self._rebuild_heap()
+
+    # --- storage ---
+    def _open(self):
+        if os.path.exists(self.npy_path) and os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                stored_nodes = json.load(f)["nodes"]
+            stored = np.load(self.npy_path, mmap_mode="r+")
+            if stored_nodes == self.nodes and stored.shape == self.shape:
+                return stored
+            # topology changed: carry over the routes that still exist
+            items = _items(stored, stored_nodes)
+            del stored
+            values = self._create()
+            self._import(items, values)
+            return values
+        values = self._create()
+        if os.path.exists(self.json_path):
+            self._import(load_json(self.json_path), values)
+        return values
+
+    def _create(self):
+        with open(self.index_path, "w") as f:
+            json.dump({"layers": self.layer_names, "nodes": self.nodes}, f)
+        values = np.lib.format.open_memmap(self.npy_path, mode="w+", dtype=np.float64, shape=self.shape)
+        values[...] = np.nan
+        return values
+
+    def _import(self, items, values):
+        for route, q in items:
+            idx = self.route_index(route)
+            if idx is not None:
+                values[idx] = q
+
+    def load_items(self, items):
+        """Import (route, q) pairs; routes through unknown nodes are skipped."""
+        self._import(items, self.values)
+        self._rebuild_heap()
+
+    def flush(self):
+        """Checkpoint: write dirty pages of the memory-mapped table to disk."""
+        self.values.flush()
+
+    def export_json(self, path=None):
+        """Write the table in the legacy route_qtable.json format."""
+        with open(path or self.json_path, "w") as f:
+            json.dump({str(route): q for route, q in self.items()}, f, indent=2)
+
+    # --- greedy index ---
+    def _rebuild_heap(self):
+        seen = np.flatnonzero(~np.isnan(self.flat))
+        self.count = len(seen)
+        self.heap = list(zip((-self.flat[seen]).tolist(), seen.tolist()))
+        heapq.heapify(self.heap)
+
+    def _top(self):
+        """Flat index of the best learned route, dropping stale heap entries."""
+        heap, flat = self.heap, self.flat
+        while heap:
+            negq, i = heap[0]
+            if flat[i] == -negq:
+                return i
+            heapq.heappop(heap)
+        return None
+
+    # --- access ---
+    def route_index(self, route):
+        try:
+            return tuple(ix[n] for ix, n in zip(self.index, route))
+        except KeyError:
+            return None
+
+    def flat_index(self, route):
+        try:
+            return sum(ix[n] * st for ix, n, st in zip(self.index, route, self.strides))
+        except KeyError:
+            return None
+
+    def route_at_flat(self, i):
+        return tuple(nodes[(i // st) % len(nodes)] for nodes, st in zip(self.nodes, self.strides))
+
+    def get(self, route, default=0.0):
+        i = self.flat_index(route)
+        if i is None:
+            return default
+        q = self.flat[i]
+        return default if math.isnan(q) else float(q)   # NaN: never visited
+
+    def set(self, route, q):
+        i = self.flat_index(route)
+        if i is None:
+            raise KeyError(f"route {route} uses a node outside the table")
+        q = float(q)
+        if math.isnan(self.flat[i]):
+            self.count += 1
+        self.flat[i] = q
+        heapq.heappush(self.heap, (-q, i))
+        if len(self.heap) > 2 * self.count + 1024:
+            self._rebuild_heap()
+
+    def get_many(self, idx, default=0.0):
+        """Q-values at flat indices `idx` (array), `default` where never visited."""
+        q = self.flat[idx]
+        return np.where(np.isnan(q), default, q)
+
+    def set_many(self, idx, q):
+        """Store Q-values at distinct flat indices `idx` in one go."""
+        self.count += int(np.isnan(self.flat[idx]).sum())
+        self.flat[idx] = q
+        if len(idx) > self.count // 4:
+            self._rebuild_heap()   # cheaper than pushing most of the table
+            return
+        for entry in zip((-np.asarray(q, dtype=np.float64)).tolist(), np.asarray(idx).tolist()):
+            heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * self.count + 1024:
+            self._rebuild_heap()
+
+    def items(self):
+        return _items(self.values, self.nodes)
+
+    def __len__(self):
+        return self.count
+
+    def random_unseen(self):
+        """A uniformly random route that has never been updated, or None."""
+        if self.count >= self.size:
+            return None
+        for _ in range(64):   # cheap while most routes are unseen
+            i = random.randrange(self.size)
+            if math.isnan(self.flat[i]):
+                return self.route_at_flat(i)
+        return self.route_at_flat(int(random.choice(np.flatnonzero(np.isnan(self.flat)))))
+
+    def best_route(self, unseen_value=None):
+        """
+        Greedy route: the highest learned Q, ties to the lowest route index.
+        If `unseen_value` is given, never-visited routes count as having that
+        value (optimistic initialisation) and a random one is returned when it
+        beats every learned route. Returns None if there is nothing to choose.
+        """
+        i = self._top()
+        if unseen_value is not None and self.count < self.size:
+            if i is None or unseen_value > self.flat[i]:
+                return self.random_unseen()
+        return None if i is None else self.route_at_flat(i)
+
+
+def _items(values, nodes):
+    seen = np.argwhere(~np.isnan(values))
+    return [(tuple(layer[i] for layer, i in zip(nodes, idx)), float(values[tuple(idx)])) for idx in seen]
+
+
+def load_json(path):
+    """Parse a legacy route_qtable.json into (route, q) pairs without eval()."""
+    with open(path, "r") as f:
+        try:
+            raw = json.load(f)
+        except Exception:
+            return []
+    items = []
+    for k, v in raw.items():
+        try:
+            items.append((tuple(ast.literal_eval(k)), float(v)))
+        except (ValueError, SyntaxError):
+            continue
+    return items
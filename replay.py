@@ -0,0 +1,237 @@
+# replay.py
+"""
+Replay an experiment trace (runtrace.py) recorded with `sender.py --record`
+or `simulator.py --record`.
+
+    python replay.py trace.npz                  # re-drive a fresh agent, verify its values and the log
+    python replay.py trace.npz --open-loop      # updates only, no route choice
+    python replay.py trace.npz --mesh --rate 500    # send the recorded routes through a running mesh
+    python replay.py trace.npz --info           # what the trace holds
+
+Agent replay (the default) runs without sockets or sleeps, as fast as the
+agent can go. A fresh agent is built from the trace's parameters, with its
+table in a temp directory, and started from the recorded initial values.
+Python's `random` is seeded with the trace's seed, and agent.choose_route()
+is called exactly when the recorded run called it (the `chosen` column), so
+the agent sees the same interleaving of choices and updates. Every choice
+is compared with the recorded route. The Q-updates use the recorded
+rewards, in the recorded order. For simulator traces with relay trust
+(--agent link), the trust scores are rebuilt from the recorded per-hop
+outcomes at the point the simulator observed them. --open-loop skips route
+choice and only applies the updates.
+
+Checks:
+
+    routes   every chosen route matches the trace (closed loop only)
+    state    the final values hash to the recorded digest. If they don't and
+             the trace holds the values, the largest difference is reported,
+             and within --atol still passes
+    log      the rows written through PerformanceLog (to --log, default a
+             temp file) read back equal to the trace, and the trace's rows
+             hash to the recorded log digest
+
+The report gives replayed updates per second next to the recorded run's
+episodes per second. It exits with status 1 if a check fails, so two code
+versions can be compared on one trace, e.g. in CI. --json saves it.
+
+Live traces that steered around congestion signals or folded in the relays'
+trust files depend on state the trace doesn't hold. Their route choices may
+diverge. That is reported and fails the replay, and the recorded routes
+are used regardless; --open-loop checks only the updates.
+
+--mesh sends the recorded routes of the episodes that left the sender, in
+episode order, through the running mesh at --rate (loadgen.generate). It
+reports loss and RTT next to the recorded success rate. A mesh started with
+`run_all_nodes.py --seed` makes the relays' drop and delay draws repeatable.
+"""
+import argparse, asyncio, hashlib, json, os, random, sys, tempfile, time
+
+import numpy as np
+
+from perflog import PerformanceLog, read_logs
+from runtrace import Trace, agent_state, digest_state, load_state, log_digest, HOP_UNKNOWN
+
+LOG_CHUNK = 100_000   # rows per log_many() call when writing the replayed log
+
+
+def build_agent(trace, qdir):
+    """A fresh agent with the recorded parameters, its files under `qdir`."""
+    from sender import RouteRLAgent
+    from experience import ReplayBuffer
+    from routing import LinkRLAgent, TrustScores, TRUST_WEIGHT
+    m = trace.meta
+    checkpoint_every = len(trace) + 1   # no checkpoints: the table lives in a temp dir
+    if m["agent"] == "link":
+        # trust is replayable only from a simulator trace, where every hop's outcome is known
+        trust = TrustScores(trace.layers, directory=None) if m["source"] == "sim" and m.get("trust_weight") else None
+        return LinkRLAgent(trace.layers, m["alpha"], m["gamma"], m["epsilon"],
+                           qfile=os.path.join(qdir, "route_links.json"), checkpoint_every=checkpoint_every,
+                           trust=trust, trust_weight=m.get("trust_weight") or TRUST_WEIGHT)
+    # a replay buffer starts empty, with its sampling RNG seeded like the recorded run's
+    buffer = ReplayBuffer(m["buffer_size"], seed=m.get("seed")) if m.get("buffer_size") else None
+    return RouteRLAgent(trace.layers, m["alpha"], m["gamma"], m["epsilon"],
+                        qfile=os.path.join(qdir, "route_qtable.json"), checkpoint_every=checkpoint_every,
+                        initial_q=m.get("initial_q"), buffer=buffer,
+                        update_every=m.get("update_every", 1), minibatch=m.get("minibatch", 0))
+
+
+def observe_batch(trust, trace, rows):
+    """Feed trace rows' per-hop outcomes to `trust`, as NetworkModel.simulate did."""
+    from simulator import observe_trust
+    local = trace.route[rows].astype(np.int64)
+    lost_hop = trace.lost_hop[rows]
+    hops = local.shape[1]
+    h = np.arange(hops)
+    lost = lost_hop[:, None] >= 0
+    arrived = ~trace.dropped[rows, None] & (~lost | (h[None, :] <= lost_hop[:, None]))
+    observe_trust(trust, local, arrived, lost & (h[None, :] == lost_hop[:, None]))
+
+
+def replay_agent(trace, open_loop=False, log_path=None, atol=0.0):
+    report = {"mode": "open-loop" if open_loop else "closed-loop"}
+    with tempfile.TemporaryDirectory() as qdir:
+        agent = build_agent(trace, qdir)
+        if trace.initial:
+            load_state(agent, trace.initial)
+        initial_ok = digest_state(agent_state(agent)) == trace.meta.get("initial_digest")
+        trust = getattr(agent, "trust", None)
+        if trust is not None and (trace.lost_hop == HOP_UNKNOWN).any():
+            trust = None
+        if trace.meta.get("seed") is not None:
+            random.seed(trace.meta["seed"])
+
+        routes = trace.routes()
+        by_episode = np.argsort(trace.episode, kind="stable")   # row of episode k+1
+        episode_routes = [routes[i] for i in by_episode]
+        rewards = trace.reward.tolist()
+        chosen = trace.chosen.tolist()
+        made, mismatches, first = 0, 0, None
+
+        t0 = time.perf_counter()
+        for i, route in enumerate(routes):
+            if chosen[i] > made:
+                start = made
+                if open_loop:
+                    made = chosen[i]
+                else:
+                    while made < chosen[i]:
+                        got = agent.choose_route()
+                        if got != episode_routes[made]:
+                            mismatches += 1
+                            first = first or made + 1
+                        made += 1
+                if trust is not None:
+                    observe_batch(trust, trace, by_episode[start:made])
+            agent.update(route, rewards[i])
+        if hasattr(agent, "flush_updates"):
+            agent.flush_updates()   # as save() does at the end of the recorded run
+        elapsed = time.perf_counter() - t0
+
+        state = agent_state(agent)
+    report.update(rows=len(trace), elapsed_s=round(elapsed, 3),
+                  updates_per_s=round(len(trace) / elapsed) if elapsed else None)
+    if trace.meta.get("elapsed"):
+        report["recorded_episodes_per_s"] = round(len(trace) / trace.meta["elapsed"], 1)
+    if not open_loop:
+        report.update(route_mismatches=mismatches, first_mismatch_episode=first)
+    report.update(check_state(trace, state, initial_ok, atol))
+    report.update(check_log(trace, routes, log_path))
+    report["ok"] = (report["state"] in ("match", "within tolerance") and report["log"] == "match"
+                    and not report.get("route_mismatches"))
+    return report
+
+
+def check_state(trace, state, initial_ok, atol):
+    recorded = trace.meta.get("state_digest")
+    if recorded is None:
+        return {"state": "unverified (no final state recorded)"}
+    if digest_state(state) == recorded:
+        return {"state": "match"}
+    out = {"state": "differs"}
+    if not initial_ok:
+        out["state"] = "differs (initial values not in the trace)"
+    if trace.state and set(trace.state) == set(state):
+        diff = max(float(np.nanmax(np.abs(state[k] - trace.state[k]), initial=0.0)) for k in state)
+        same_nan = all(np.array_equal(np.isnan(state[k]), np.isnan(trace.state[k])) for k in state)
+        out["state_max_diff"] = diff
+        if same_nan and diff <= atol:
+            out["state"] = "within tolerance"
+    return out
+
+
+def check_log(trace, routes, log_path):
+    h = hashlib.sha256()
+    log_digest(h, trace.route, trace.success, trace.latency, trace.reward)
+    if h.hexdigest()[:16] != trace.meta.get("log_digest"):
+        return {"log": "differs (trace rows do not match the recorded log digest)"}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = log_path or os.path.join(tmp, "replay_log.csv")
+        t0 = time.perf_counter()
+        log = PerformanceLog(path, rotate="none")
+        s, l, r = trace.success.tolist(), trace.latency.tolist(), trace.reward.tolist()
+        for i in range(0, len(routes), LOG_CHUNK):
+            j = i + LOG_CHUNK
+            log.log_many(routes[i:j], s[i:j], l[i:j], r[i:j])
+        log.close()
+        written = time.perf_counter() - t0
+        df = read_logs(path)
+    ok = (len(df) == len(trace)
+          and df["route"].tolist() == ["→".join(rt) for rt in routes]
+          and np.array_equal(df["success"].to_numpy(), trace.success.astype(int))
+          and np.allclose(df["latency"].to_numpy(), np.round(trace.latency, 4), rtol=0, atol=1e-9)
+          and np.allclose(df["reward"].to_numpy(), np.round(trace.reward, 3), rtol=0, atol=1e-9))
+    return {"log": "match" if ok else "differs (rows read back from the log)",
+            "log_rows_per_s": round(len(trace) / written) if written else None}
+
+
+def replay_mesh(trace, rate, size, ack_timeout):
+    from loadgen import generate
+    from topology import load_config
+    cfg = load_config()
+    if {l: list(ns) for l, ns in cfg.layers.items()} != trace.layers:
+        raise SystemExit("keys.json has different layers than the trace")
+    order = np.argsort(trace.episode, kind="stable")
+    order = order[~trace.dropped[order]]            # the sender dropped these before the mesh
+    routes = trace.routes()
+    plan = [routes[i] for i in order]
+    result = asyncio.run(generate(cfg, rate, len(plan) / rate, size, plan, ack_timeout=ack_timeout))
+    return {"mode": "mesh", "recorded_success_rate": round(float(trace.success[order].mean()), 4) if len(plan) else None,
+            **result}
+
+
+def main():
+    from sender import ACK_TIMEOUT
+    parser = argparse.ArgumentParser(description="Replay a recorded experiment trace.")
+    parser.add_argument("trace", help="trace written by sender.py / simulator.py --record")
+    parser.add_argument("--open-loop", action="store_true", help="apply the recorded updates without choosing routes")
+    parser.add_argument("--atol", type=float, default=0.0,
+                        help="largest difference in the final values that still passes")
+    parser.add_argument("--log", default=None, help="write the replayed performance log here (default: temp file)")
+    parser.add_argument("--mesh", action="store_true", help="send the recorded routes through the running mesh")
+    parser.add_argument("--rate", type=float, default=500.0, help="--mesh: messages per second")
+    parser.add_argument("--size", type=int, default=64, help="--mesh: innermost message size in bytes")
+    parser.add_argument("--ack-timeout", type=float, default=ACK_TIMEOUT)
+    parser.add_argument("--info", action="store_true", help="print the trace's metadata and summary only")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    trace = Trace(args.trace)
+    if args.info:
+        print(json.dumps({**trace.meta, "layers": {l: len(ns) for l, ns in trace.layers.items()},
+                          **trace.summary()}, indent=2))
+        return
+    if args.mesh:
+        report = replay_mesh(trace, args.rate, args.size, args.ack_timeout)
+    else:
+        report = replay_agent(trace, args.open_loop, args.log, args.atol)
+    report = {"trace": args.trace, "source": trace.meta["source"], **report}
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if report.get("ok") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
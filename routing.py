@@ -0,0 +1,235 @@
+# routing.py
+"""
+Link-decomposed route values with the relays' trust folded in.
+
+RouteRLAgent learns one value per route, so every one of the L1 x L2 x L3
+routes has to be tried before it can be ranked. LinkRLAgent values a route
+as the sum of its links instead:
+
+    Q(n1, n2, n3) = entry[n1] + link[0][n1, n2] + link[1][n2, n3] + link[2][n3, Destination]
+                    + trust_weight * (trust of each relay in its next hop)
+
+An episode's reward updates the four learned terms towards the reward (a
+linear model: each term moves by alpha * error / 4, so Q itself moves by
+alpha * error as in the tabular agent). Links are shared between routes,
+so a route that was never sent is valued from the routes that share its
+links. Learning cost is O(sum of n_i * n_(i+1)) values rather than
+prod(n_i). The greedy route is found by dynamic programming over the
+layers in O(n^2) per layer, without enumerating routes.
+
+Trust is the relays' own NodeTrust feedback, i.e. trust_<node>.json as
+written by node.py (score of each next hop in [-5, 5]). TrustScores rereads
+those files every `refresh` seconds; the simulator feeds it directly
+(TrustScores.observe) instead. The learned link terms fit the residual
+between the reward and the trust prior.
+
+Any number of layers works; layers are used in the order given.
+"""
+import json, os, random, time
+
+import numpy as np
+
+DESTINATION = "Destination"
+TRUST_WEIGHT = 0.3      # reward units per trust point
+TRUST_REFRESH = 5.0     # seconds between rereads of trust_<node>.json
+TRUST_ALPHA = 0.1       # NodeTrust.update's step size
+CHECKPOINT_EVERY = 100
+
+
+class TrustScores:
+    """
+    Trust of each relay in its next hops, as matrices aligned with `layers`:
+    links[i][a, b] is layers[i][a]'s score for layers[i+1][b], and the last
+    matrix is the final layer's score for the Destination (one column).
+
+    The prior an agent uses is centered(): each score minus the mean of the
+    known scores of its layer, with unknown pairs at 0. Only differences
+    between links count, so links nobody has scored yet are not penalised
+    against the (usually positive) scores of links in use.
+    """
+    def __init__(self, layers, directory=".", refresh=TRUST_REFRESH):
+        self.nodes = [list(ns) for ns in layers.values()]
+        self.ids = [{n: i for i, n in enumerate(ns)} for ns in self.nodes]
+        self.directory = directory
+        self.refresh = refresh
+        nexts = self.nodes[1:] + [[DESTINATION]]
+        self.links = [np.zeros((len(a), len(b))) for a, b in zip(self.nodes, nexts)]
+        self.known = [np.zeros(m.shape, dtype=bool) for m in self.links]
+        self.loaded_at = None
+        self.version = 0   # bumped on every change, so agents know when to re-plan
+        self._centered = (None, None)
+
+    def reload(self):
+        """Read every relay's trust_<node>.json (missing or unreadable files are skipped)."""
+        nexts = self.ids[1:] + [{DESTINATION: 0}]
+        for i, (nodes, next_ids) in enumerate(zip(self.nodes, nexts)):
+            for a, node in enumerate(nodes):
+                path = os.path.join(self.directory, f"trust_{node}.json")
+                try:
+                    with open(path) as f:
+                        scores = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for hop, score in scores.items():
+                    b = next_ids.get(hop)
+                    if b is not None:
+                        self.links[i][a, b] = float(score)
+                        self.known[i][a, b] = True
+        self.loaded_at = time.monotonic()
+        self.version += 1
+
+    def maybe_reload(self):
+        """Reread the files if `refresh` seconds have passed (never when directory is None)."""
+        if self.directory is None:
+            return
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.refresh:
+            self.reload()
+
+    def observe(self, i, a, b, success, alpha=TRUST_ALPHA):
+        """
+        Apply NodeTrust.update for a batch of forwards over layer i's links
+        (arrays of node indices and outcomes). k outcomes on one link move
+        it towards their mean target by 1 - (1 - alpha)^k, which is exact
+        when they agree.
+        """
+        if not len(a):
+            return
+        m = self.links[i]
+        flat = np.ravel_multi_index((a, b), m.shape)
+        k = np.bincount(flat, minlength=m.size)
+        target = np.bincount(flat, weights=np.where(success, 5.0, -5.0), minlength=m.size)
+        seen = k > 0
+        target[seen] /= k[seen]
+        view = m.reshape(-1)
+        view[seen] = target[seen] + (view[seen] - target[seen]) * (1 - alpha) ** k[seen]
+        self.known[i].reshape(-1)[seen] = True
+        self.version += 1
+
+    def centered(self):
+        """Per-layer centered scores (see the class docstring), recomputed once per version."""
+        version, out = self._centered
+        if version != self.version:
+            out = [np.where(known, m - m[known].mean(), 0.0) if known.any() else np.zeros(m.shape)
+                   for m, known in zip(self.links, self.known)]
+            self._centered = (self.version, out)
+        return out
+
+
+class LinkRLAgent:
+    """
+    Drop-in alternative to sender.RouteRLAgent (choose_route / update /
+    save) that learns per-link values; see the module docstring.
+    """
+    def __init__(self, layers, alpha=0.1, gamma=0.9, epsilon=0.2, qfile="route_links.json",
+                 checkpoint_every=CHECKPOINT_EVERY, trust=None, trust_weight=TRUST_WEIGHT, congestion=None):
+        self.layers = layers
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.qfile = qfile
+        self.checkpoint_every = checkpoint_every
+        self.trust = trust                  # TrustScores, or None to learn from rewards only
+        self.trust_weight = trust_weight
+        self.congestion = congestion        # CongestionTable; congested nodes are skipped by the greedy step
+        self.updates = 0
+        self._best = None                   # (trust version, route) of the last greedy search
+        self.nodes = [list(ns) for ns in layers.values()]
+        self.ids = [{n: i for i, n in enumerate(ns)} for ns in self.nodes]
+        sizes = [len(ns) for ns in self.nodes] + [1]
+        self.entry = np.zeros(sizes[0])
+        self.links = [np.zeros((a, b)) for a, b in zip(sizes, sizes[1:])]
+        self.load()
+
+    # --- persistence ---
+    def load(self):
+        if not os.path.exists(self.qfile):
+            return
+        with open(self.qfile) as f:
+            saved = json.load(f)
+        for node, v in saved.get("entry", {}).items():
+            if node in self.ids[0]:
+                self.entry[self.ids[0][node]] = v
+        nexts = self.ids[1:] + [{DESTINATION: 0}]
+        for m, ids, next_ids, saved_links in zip(self.links, self.ids, nexts, saved.get("links", [])):
+            for key, v in saved_links.items():
+                a, b = key.split("->")
+                if a in ids and b in next_ids:
+                    m[ids[a], next_ids[b]] = v
+
+    def save(self):
+        nexts = self.nodes[1:] + [[DESTINATION]]
+        data = {"entry": dict(zip(self.nodes[0], self.entry.tolist())),
+                "links": [{f"{a}->{b}": float(m[i, j]) for i, a in enumerate(nodes) for j, b in enumerate(nxt)}
+                          for m, nodes, nxt in zip(self.links, self.nodes, nexts)]}
+        tmp = f"{self.qfile}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.qfile)
+
+    # --- values ---
+    def _trusted(self):
+        if self.trust is None or not self.trust_weight:
+            return False
+        self.trust.maybe_reload()
+        return True
+
+    def index(self, route):
+        return [ids[n] for ids, n in zip(self.ids, route)]
+
+    def value(self, route):
+        idx = self.index(route) + [0]
+        q = self.entry[idx[0]] + sum(m[idx[i], idx[i + 1]] for i, m in enumerate(self.links))
+        if self._trusted():
+            q += self.trust_weight * sum(t[idx[i], idx[i + 1]] for i, t in enumerate(self.trust.centered()))
+        return float(q)
+
+    def best_route(self):
+        """Greedy route; cached until the next update or trust change (congestion is always rechecked)."""
+        version = self.trust.version if self._trusted() else None
+        if self._best is None or self._best[0] != version or self.congestion is not None:
+            self._best = (version, self._search())
+        return self._best[1]
+
+    def _search(self):
+        """Dynamic programming over the layers, skipping congested nodes where a layer has others."""
+        terms = self.links
+        if self.trust is not None and self.trust_weight:
+            terms = [m + self.trust_weight * t for m, t in zip(self.links, self.trust.centered())]
+        score = self.entry + self._penalty(0)
+        back = []
+        for i, m in enumerate(terms[:-1]):
+            total = score[:, None] + m                    # (from, to)
+            back.append(total.argmax(axis=0))
+            score = total.max(axis=0) + self._penalty(i + 1)
+        score = score + terms[-1][:, 0]
+        j = int(score.argmax())
+        idx = [j]
+        for b in reversed(back):
+            j = int(b[j])
+            idx.append(j)
+        idx.reverse()
+        return tuple(nodes[j] for nodes, j in zip(self.nodes, idx))
+
+    def _penalty(self, i):
+        if self.congestion is None:
+            return 0.0
+        hot = np.array([self.congestion.congested(n) for n in self.nodes[i]])
+        return np.where(hot, -np.inf, 0.0) if not hot.all() else 0.0
+
+    # --- agent interface ---
+    def choose_route(self):
+        """Epsilon-greedy route selection."""
+        if random.random() < self.epsilon:
+            return tuple(random.choice(nodes) for nodes in self.nodes)
+        return self.best_route()
+
+    def update(self, route, reward):
+        idx = self.index(route) + [0]
+        step = self.alpha * (reward - self.value(route)) / (len(self.links) + 1)
+        self.entry[idx[0]] += step
+        for i, m in enumerate(self.links):
+            m[idx[i], idx[i + 1]] += step
+        self._best = None
+        self.updates += 1
+        if self.updates % self.checkpoint_every == 0:
+            self.save()
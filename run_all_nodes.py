@@ -1,22 +1,55 @@
 # run_all_nodes.py
 """
-Launcher to run all nodes (12 nodes) + destination.
+Launcher to run every relay listed in keys.json + destination.
 
 Usage:
-    python run_all_nodes.py thread   # runs nodes in threads (single process)
-    python run_all_nodes.py proc     # runs nodes as separate processes (recommended)
+    python run_all_nodes.py thread       # runs nodes in threads (single process)
+    python run_all_nodes.py proc         # runs nodes as separate processes
+    python run_all_nodes.py supervisor   # packs nodes into one worker per CPU core (recommended)
+
+Supervisor options:
+    --workers N             worker processes (default: one per usable core, at most one per node)
+    --nodes-per-worker K    pack K nodes per worker instead (overrides --workers)
+    --engine thread|asyncio relay engine inside each worker (default: asyncio)
+    --no-pin                don't pin workers to CPU cores
+    --report-interval S     seconds between per-worker CPU / queue-depth reports (0 = off)
+
+All modes accept --log-level (nodes default to info; per-packet lines are debug)
+and --seed, which makes each node's simulated drops and delays reproducible.
+Every node writes metrics/<node>.json; `python metrics.py` summarizes them.
+
+Crashed workers (and a crashed destination) are restarted with exponential
+backoff. All modes accept --no-destination to skip destination.py, e.g. when
+something else already listens on the destination's address.
+
+Everything is launched at once; the launcher then probes every listener and
+prints the mesh's time-to-ready. Nodes reload keys.json in place when it
+changes (behaviour, admission, next-hop addresses) or on SIGHUP, which the
+launcher passes on. In supervisor mode, relays added to keys.json are
+started in new workers without restarting the rest.
 
 Make sure node.py and destination.py are present in the same folder.
 """
 import sys
 import time
-import json
+import math
+import signal
+import socket
+import argparse
 import threading
 import subprocess
+import multiprocessing as mp
+import queue
 import os
 from pathlib import Path
 
-# Node names (must match keys.json)
+from topology import load_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NODE_PY = os.path.join(HERE, "node.py")
+DEST_PY = os.path.join(HERE, "destination.py")
+
+# Default mesh (generate_keys.py's defaults); the launcher runs whatever keys.json lists
 L1 = [f"L1_Node{c}" for c in ["A","B","C","D"]]
 L2 = [f"L2_Node{c}" for c in ["A","B","C","D"]]
 L3 = [f"L3_Node{c}" for c in ["A","B","C","D"]]
@@ -24,72 +57,108 @@ DEST = "Destination"
 
 ALL_NODES = L1 + L2 + L3
 
-def load_addrs():
-    with open("keys.json", "r") as f:
-        cfg = json.load(f)
-    return cfg.get("addrs", {})
+REPORT_INTERVAL = 5.0    # seconds between supervisor status reports
+RESTART_BACKOFF = 0.5    # first restart delay; doubles per quick crash
+RESTART_BACKOFF_MAX = 30.0
+STABLE_AFTER = 10.0      # a worker up this long resets its backoff
+READY_TIMEOUT = 30.0     # seconds to wait for every listener at startup
+RELOAD_INTERVAL = 1.0    # supervisor: seconds between keys.json checks for added relays
+
+def spawn_destination():
+    return subprocess.Popen([sys.executable, DEST_PY])
+
+def wait_ready(names, with_destination=True, started=None, timeout=READY_TIMEOUT):
+    """
+    Probe every relay's (and the destination's) address until it accepts a
+    connection and print the mesh's time-to-ready, counted from `started`
+    (a time.monotonic() stamp). Returns the seconds, or None on timeout.
+    """
+    started = started or time.monotonic()
+    addrs = load_config()["addrs"]
+    pending = {n: tuple(addrs[n]) for n in names + ([DEST] if with_destination else [])}
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for name, addr in list(pending.items()):
+            try:
+                socket.create_connection(addr, timeout=0.2).close()
+                del pending[name]
+            except OSError:
+                pass
+        if pending:
+            time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    if pending:
+        down = sorted(pending)
+        print(f"[launcher] NOT ready after {elapsed:.2f}s, still down: {', '.join(down[:10])}"
+              + (f" (+{len(down) - 10} more)" if len(down) > 10 else ""))
+        return None
+    print(f"[launcher] Mesh ready: {len(names)} relays{' + destination' if with_destination else ''} "
+          f"listening after {elapsed:.2f}s")
+    return elapsed
 
-def run_thread_mode():
+def run_thread_mode(names, with_destination=True):
     """
-    Import node.start_node and destination logic (destination.py should have a
-    function start_destination or we will run destination.py as a subprocess).
-    This mode keeps everything inside a single Python process using threads.
+    Import node.start_node and destination.start_destination and run every
+    relay and the destination in threads of this one Python process.
     """
     print("[launcher] Starting in THREAD mode...")
+    started = time.monotonic()
     # Import node.start_node lazily so this script can be used from any cwd
     try:
-        from node import start_node
+        from node import start_node, watch_config
+        from destination import start_destination
     except Exception as e:
-        print("[launcher] ERROR: failed to import node.start_node:", e)
-        print("Make sure node.py exists in the same directory and defines start_node(node_name).")
+        print("[launcher] ERROR: failed to import node.start_node / destination.start_destination:", e)
+        print("Make sure node.py and destination.py exist in the same directory.")
         return
 
     threads = []
     # start nodes
-    for name in ALL_NODES:
+    for name in names:
         t = threading.Thread(target=start_node, args=(name,), daemon=True)
         t.start()
         threads.append(t)
         print(f"[launcher] Started thread for {name}")
-        time.sleep(0.05)
 
-    # start destination in a thread by running destination.py in a subprocess,
-    # because destination.py in our examples listens in a loop and may not expose a start function.
-    # If your destination.py defines start_destination(), you can import & call it instead.
-    dest_proc = subprocess.Popen([sys.executable, "destination.py"])
-    print("[launcher] Destination started as subprocess (destination.py) with PID", dest_proc.pid)
+    if with_destination:
+        threading.Thread(target=start_destination, daemon=True).start()
+        print("[launcher] Started thread for Destination")
 
+    watch_config()   # every node lives in this process
+    wait_ready(names, with_destination, started)
     print("[launcher] All nodes started (thread mode). Press Ctrl+C to stop.")
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n[launcher] KeyboardInterrupt received, terminating destination subprocess...")
-        dest_proc.terminate()
-        dest_proc.wait(timeout=5)
-        print("[launcher] Exiting.")
+        print("\n[launcher] Exiting.")
 
 
-def run_proc_mode():
+def run_proc_mode(names, with_destination=True):
     """
     Starts each node and destination as separate processes using `python node.py <Name>`.
     This provides process isolation and is closer to running each node in its own terminal.
     """
     print("[launcher] Starting in PROCESS mode...")
+    started = time.monotonic()
     procs = []
 
     # start nodes: "python node.py <NodeName>"
-    for name in ALL_NODES:
-        p = subprocess.Popen([sys.executable, "node.py", name])
+    for name in names:
+        p = subprocess.Popen([sys.executable, NODE_PY, name])
         procs.append((name, p))
         print(f"[launcher] Launched process for {name} (PID {p.pid})")
-        time.sleep(0.05)
 
     # start destination process
-    dest_p = subprocess.Popen([sys.executable, "destination.py"])
-    print(f"[launcher] Launched destination process (PID {dest_p.pid})")
-    procs.append((DEST, dest_p))
+    if with_destination:
+        dest_p = spawn_destination()
+        print(f"[launcher] Launched destination process (PID {dest_p.pid})")
+        procs.append((DEST, dest_p))
 
+    if hasattr(signal, "SIGHUP"):   # each node also watches keys.json itself
+        signal.signal(signal.SIGHUP, lambda signum, frame: [p.send_signal(signal.SIGHUP) for name, p in procs
+                                                            if name != DEST and p.poll() is None])
+    wait_ready(names, with_destination, started)
     print("[launcher] All processes started. Press Ctrl+C to stop them all.")
     try:
         while True:
@@ -112,21 +181,289 @@ def run_proc_mode():
         print("[launcher] All child processes terminated. Exiting.")
 
 
+# --- supervisor mode ---
+def usable_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_shards(names, workers=None, nodes_per_worker=None):
+    """Split `names` into contiguous shards: K per worker, or one worker per core by default."""
+    if nodes_per_worker:
+        k = max(1, nodes_per_worker)
+    else:
+        workers = max(1, min(workers or len(usable_cpus()), len(names)))
+        k = math.ceil(len(names) / workers)
+    return [names[i:i + k] for i in range(0, len(names), k)]
+
+def worker_main(index, names, engine, cpu, reports, report_interval):
+    """
+    Body of one worker process: run `names` as relay threads (each with its
+    own event loop for engine="asyncio") and post a status report every
+    `report_interval` seconds. Exits non-zero if any node stops, so the
+    supervisor restarts the whole shard.
+    """
+    import node
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            print(f"[worker {index}] could not pin to CPU {cpu}: {e}")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # Ctrl+C is handled by the supervisor
+    node.watch_config()                            # keys.json edits and SIGHUP reload this shard in place
+
+    threads = {}
+    for name in names:
+        t = threading.Thread(target=node.start_node, args=(name,), kwargs={"engine": engine}, daemon=True)
+        t.start()
+        threads[name] = t
+    status = 0
+    try:
+        last_cpu, last_wall = time.process_time(), time.monotonic()
+        while True:
+            time.sleep(0.5)
+            dead = [n for n, t in threads.items() if not t.is_alive()]
+            if dead:
+                print(f"[worker {index}] node(s) stopped: {', '.join(dead)}")
+                status = 1
+                return
+            cpu_now, wall_now = time.process_time(), time.monotonic()
+            if report_interval and wall_now - last_wall >= report_interval:
+                queues = {n: beh.queue_len for n, (_, beh) in node.RUNNING.items()}
+                reports.put((index, os.getpid(), (cpu_now - last_cpu) / (wall_now - last_wall), queues))
+                last_cpu, last_wall = cpu_now, wall_now
+    finally:
+        # multiprocessing skips atexit in children, so flush trust tables and metrics here
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)   # a second terminate() must not cut this short
+        import metrics
+        for closer in [trust.close for trust, _ in node.RUNNING.values()] + [w.close for w in metrics.WRITERS]:
+            try:
+                closer()
+            except Exception as e:
+                print(f"[worker {index}] final flush failed: {e}")
+        sys.stdout.flush()
+        if status:
+            os._exit(status)
+
+
+class Supervisor:
+    """
+    Runs the relay mesh as a handful of worker processes, each hosting a shard
+    of nodes, restarts workers (and the destination) that exit, and prints
+    per-worker CPU utilisation and queue depth.
+    """
+    def __init__(self, names, workers=None, nodes_per_worker=None, engine="asyncio", pin=True,
+                 report_interval=REPORT_INTERVAL, with_destination=True):
+        self.shards = plan_shards(names, workers, nodes_per_worker)
+        self.engine = engine
+        self.pin = pin and hasattr(os, "sched_setaffinity")
+        cpus = usable_cpus()
+        self.cpus = [cpus[i % len(cpus)] if self.pin else None for i in range(len(self.shards))]
+        self.report_interval = report_interval
+        self.with_destination = with_destination
+        self.reports = mp.Queue()
+        self.procs = [None] * len(self.shards)
+        self.started = [0.0] * len(self.shards)
+        self.backoff = [0.0] * len(self.shards)
+        self.restart_at = [0.0] * len(self.shards)
+        self.restarts = [0] * len(self.shards)
+        self.dest = None
+        self.dest_started = 0.0
+        self.dest_backoff = 0.0
+        self.dest_restart_at = None   # set while a crashed destination waits out its backoff
+        self.latest = {}   # worker index -> (pid, cpu fraction, {node: queue_len})
+        self.cfg = load_config()
+        self.hangup = False
+
+    def spawn(self, i):
+        p = mp.Process(target=worker_main, name=f"relay-worker-{i}",
+                       args=(i, self.shards[i], self.engine, self.cpus[i], self.reports, self.report_interval))
+        p.start()
+        self.procs[i] = p
+        self.started[i] = time.monotonic()
+        self.latest.pop(i, None)
+        pin = f", CPU {self.cpus[i]}" if self.cpus[i] is not None else ""
+        print(f"[supervisor] worker {i} (PID {p.pid}{pin}): {', '.join(self.shards[i])}")
+
+    def spawn_destination(self):
+        self.dest = spawn_destination()
+        self.dest_started = time.monotonic()
+        self.dest_restart_at = None
+        print(f"[supervisor] destination (PID {self.dest.pid})")
+
+    def start(self):
+        started = time.monotonic()
+        print(f"[supervisor] {sum(map(len, self.shards))} nodes in {len(self.shards)} workers "
+              f"({self.engine} engine)")
+        for i in range(len(self.shards)):
+            self.spawn(i)
+        if self.with_destination:
+            self.spawn_destination()
+        wait_ready([n for shard in self.shards for n in shard], self.with_destination, started)
+
+    def add_shard(self, names):
+        cpus = usable_cpus()
+        i = len(self.shards)
+        self.shards.append(names)
+        self.cpus.append(cpus[i % len(cpus)] if self.pin else None)
+        self.procs.append(None)
+        self.started.append(0.0)
+        self.backoff.append(0.0)
+        self.restart_at.append(0.0)
+        self.restarts.append(0)
+        self.spawn(i)
+
+    def refresh(self):
+        """Start workers for relays added to keys.json; on SIGHUP also tell every worker to reload now."""
+        try:
+            cfg = load_config()
+        except (OSError, ValueError) as e:   # mid-write: next time
+            print(f"[supervisor] could not reload keys.json: {e}")
+            return
+        if cfg is not self.cfg:
+            self.cfg = cfg
+            running = {n for shard in self.shards for n in shard}
+            added = [n for n in cfg.relays if n not in running]
+            removed = running - set(cfg.relays)
+            if removed:
+                print(f"[supervisor] {len(removed)} relay(s) gone from keys.json keep running until restart")
+            if added:
+                print(f"[supervisor] starting {len(added)} relay(s) added to keys.json")
+                for shard in plan_shards(added, nodes_per_worker=max(map(len, self.shards))):
+                    self.add_shard(shard)
+        if self.hangup:
+            self.hangup = False
+            for p in self.procs:
+                if p is not None and p.is_alive():
+                    os.kill(p.pid, signal.SIGHUP)
+
+    def check(self):
+        """Restart anything that has exited; returns after one pass."""
+        now = time.monotonic()
+        for i, p in enumerate(self.procs):
+            if p is not None and p.is_alive():
+                continue
+            if p is not None:
+                p.join()
+                up = now - self.started[i]
+                self.backoff[i] = RESTART_BACKOFF if up >= STABLE_AFTER else \
+                    min(RESTART_BACKOFF_MAX, max(RESTART_BACKOFF, self.backoff[i] * 2))
+                self.restart_at[i] = now + self.backoff[i]
+                self.restarts[i] += 1
+                self.procs[i] = None
+                print(f"[supervisor] worker {i} exited with code {p.exitcode} after {up:.1f}s; "
+                      f"restarting in {self.backoff[i]:.1f}s")
+            elif now >= self.restart_at[i]:
+                self.spawn(i)
+        if self.dest is not None and self.dest.poll() is not None:
+            up = now - self.dest_started
+            self.dest_backoff = RESTART_BACKOFF if up >= STABLE_AFTER else \
+                min(RESTART_BACKOFF_MAX, max(RESTART_BACKOFF, self.dest_backoff * 2))
+            self.dest_restart_at = now + self.dest_backoff
+            print(f"[supervisor] destination exited with code {self.dest.returncode} after {up:.1f}s; "
+                  f"restarting in {self.dest_backoff:.1f}s")
+            self.dest = None
+        elif self.dest_restart_at is not None and now >= self.dest_restart_at:
+            self.spawn_destination()
+
+    def drain_reports(self):
+        while True:
+            try:
+                i, pid, cpu, queues = self.reports.get_nowait()
+            except queue.Empty:
+                return
+            self.latest[i] = (pid, cpu, queues)
+
+    def report(self):
+        self.drain_reports()
+        for i, shard in enumerate(self.shards):
+            pid, cpu, queues = self.latest.get(i, (None, 0.0, {}))
+            alive = self.procs[i] is not None and self.procs[i].is_alive()
+            depth = " ".join(f"{n}={queues.get(n, 0)}" for n in shard)
+            print(f"[supervisor] worker {i} pid={pid} {'up' if alive else 'DOWN'} cpu={cpu * 100:5.1f}% "
+                  f"queue={sum(queues.values())} restarts={self.restarts[i]} | {depth}")
+
+    def stop(self):
+        for p in self.procs:
+            if p is not None and p.is_alive():
+                p.terminate()
+        if self.dest is not None:
+            self.dest.terminate()
+        for p in self.procs:
+            if p is not None:
+                p.join(5)
+                if p.is_alive():
+                    p.kill()
+        if self.dest is not None:
+            try:
+                self.dest.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.dest.kill()
+
+    def run(self):
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "hangup", True))
+        self.start()
+        last_report = last_refresh = time.monotonic()
+        try:
+            while True:
+                time.sleep(0.2)
+                self.check()
+                if self.hangup or time.monotonic() - last_refresh >= RELOAD_INTERVAL:
+                    self.refresh()
+                    last_refresh = time.monotonic()
+                if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            print("\n[supervisor] KeyboardInterrupt received, stopping workers...")
+        finally:
+            self.stop()
+            print("[supervisor] All workers stopped. Exiting.")
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_supervisor_mode(names, args):
+    print("[launcher] Starting in SUPERVISOR mode...")
+    import node   # imported (PyCryptodome included) once here; forked workers inherit it
+    # SIGTERM behaves like Ctrl+C so workers are stopped (and flush trust) too
+    signal.signal(signal.SIGTERM, _interrupt)
+    Supervisor(names, workers=args.workers, nodes_per_worker=args.nodes_per_worker, engine=args.engine,
+               pin=not args.no_pin, report_interval=args.report_interval,
+               with_destination=not args.no_destination).run()
+
+
 if __name__ == "__main__":
-    mode = "proc"
-    if len(sys.argv) >= 2:
-        mode = sys.argv[1].lower()
+    parser = argparse.ArgumentParser(description="Run all relay nodes and the destination.")
+    parser.add_argument("mode", nargs="?", default="proc", type=str.lower, choices=["thread", "proc", "supervisor"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--nodes-per-worker", type=int, default=None)
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="asyncio")
+    parser.add_argument("--no-pin", action="store_true")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    parser.add_argument("--no-destination", action="store_true")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning", "error"], default=None,
+                        help="node log level (per-packet messages are debug)")
+    parser.add_argument("--seed", default=None, help="seed every node's simulated drops and delays")
+    args = parser.parse_args()
+    if args.log_level:
+        os.environ["NODE_LOG_LEVEL"] = args.log_level   # inherited by every node, whatever the mode
+    if args.seed is not None:
+        os.environ["NODE_SEED"] = args.seed             # each node seeds its drop/delay draws with it
 
     # sanity check: ensure keys.json exists
     if not Path("keys.json").exists():
         print("ERROR: keys.json not found in current directory. Run generate_keys.py first.")
         sys.exit(1)
 
-    if mode not in ("thread", "proc"):
-        print("Usage: python run_all_nodes.py [thread|proc]")
-        sys.exit(1)
-
-    if mode == "thread":
-        run_thread_mode()
+    names = load_config().relays   # L1 .. Ln relays, in layer order
+    print(f"[launcher] {len(names)} relays in {len(load_config().layers)} layers")
+    if args.mode == "thread":
+        run_thread_mode(names, not args.no_destination)
+    elif args.mode == "supervisor":
+        run_supervisor_mode(names, args)
     else:
-        run_proc_mode()
+        run_proc_mode(names, not args.no_destination)
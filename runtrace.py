@@ -0,0 +1,208 @@
+# runtrace.py
+"""
+Compact experiment traces for deterministic record and replay (replay.py).
+
+A trace is one compressed NumPy archive (.npz) with a row per completed
+episode, in the order the agent's updates were applied:
+
+    episode    uint32    episode number (routes are chosen in episode order)
+    chosen     uint32    routes the agent had chosen when this update was applied
+    route      uint16    (rows, hops) index of each hop's node within its layer
+    delay      float64   simulated congestion at the sender (s)
+    dropped    bool      dropped at the sender, never entered the mesh
+    lost_hop   int8      hop the packet was lost at; -1 not lost in the mesh,
+                         HOP_UNKNOWN when only the end-to-end result is known
+    hop_delay  float32   (rows, hops) time spent at each relay; NaN if unknown
+    success    bool      \
+    latency    float64    } as logged and passed to agent.update()
+    reward     float64   /
+
+plus `meta`, a JSON document: format version, source ("sim" or "live"),
+seeds, layers, agent class and hyperparameters, run parameters and, once
+the run ends, a digest of the final agent state and a digest of the
+performance-log rows. The agent's state at the start (a live agent resumes
+its table) and at the end are stored too when they have at most
+STATE_LIMIT values. The simulator knows every hop's fate; the live sender only sees
+whether the ACK came back, so its rows have lost_hop = HOP_UNKNOWN for
+lost packets and no hop delays.
+
+A million 3-hop episodes take about 20 MB.
+"""
+import hashlib, json, os
+
+import numpy as np
+
+VERSION = 1
+HOP_UNKNOWN = -2
+STATE_LIMIT = 1_000_000   # agent values stored verbatim in the trace (digest only beyond)
+CHUNK = 4096              # rows buffered in lists before they become arrays
+
+
+def agent_state(agent):
+    """The learned values of a RouteRLAgent or LinkRLAgent as float64 arrays."""
+    if hasattr(agent, "q_table"):
+        return {"q": np.asarray(agent.q_table.flat, dtype=np.float64)}
+    return {"entry": np.asarray(agent.entry, dtype=np.float64),
+            **{f"link{i}": np.asarray(m, dtype=np.float64) for i, m in enumerate(agent.links)}}
+
+
+def load_state(agent, state):
+    """Put agent_state() arrays back into a freshly built agent of the same shape."""
+    if hasattr(agent, "q_table"):
+        agent.q_table.flat[:] = state["q"]
+        agent.q_table._rebuild_heap()
+    else:
+        agent.entry[:] = state["entry"]
+        for i, m in enumerate(agent.links):
+            m[:] = state[f"link{i}"]
+        agent._best = None
+
+
+def agent_params(agent):
+    return {"agent": "link" if hasattr(agent, "links") else "route", "alpha": agent.alpha,
+            "gamma": agent.gamma, "epsilon": agent.epsilon,
+            "initial_q": getattr(agent, "initial_q", None),
+            "trust_weight": getattr(agent, "trust_weight", None) if getattr(agent, "trust", None) else None,
+            "congestion": getattr(agent, "congestion", None) is not None,
+            "buffer_size": agent.buffer.capacity if getattr(agent, "buffer", None) is not None else 0,
+            "update_every": getattr(agent, "update_every", 1), "minibatch": getattr(agent, "minibatch", 0)}
+
+
+def digest_state(state):
+    h = hashlib.sha256()
+    for name in sorted(state):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(state[name], dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def log_digest(h, route_ids, success, latency, reward):
+    """
+    Fold rows into hashlib object `h`, rounded as PerformanceLog writes them.
+    Rows are hashed as packed records, so the digest doesn't depend on how
+    they were split into calls.
+    """
+    route_ids = np.asarray(route_ids, dtype=np.uint16)
+    rows = np.empty(len(route_ids), dtype=[("route", np.uint16, route_ids.shape[1:]), ("success", np.bool_),
+                                           ("latency", np.float64), ("reward", np.float64)])
+    rows["route"], rows["success"] = route_ids, success
+    rows["latency"] = np.round(np.asarray(latency, dtype=np.float64), 4)
+    rows["reward"] = np.round(np.asarray(reward, dtype=np.float64), 3)
+    h.update(rows.tobytes())
+
+
+class TraceWriter:
+    def __init__(self, path, layers, initial=None, **meta):
+        """`initial`: agent_state() of the agent before the run; `meta`: anything JSON-serializable."""
+        self.path = path
+        self.ids = [{n: i for i, n in enumerate(ns)} for ns in layers.values()]
+        self.hops = len(self.ids)
+        self.meta = {"version": VERSION, "layers": {l: list(ns) for l, ns in layers.items()}, **meta}
+        self.initial = {}
+        if initial is not None:
+            self.meta["initial_digest"] = digest_state(initial)
+            if _small(initial):
+                self.initial = {k: np.array(v) for k, v in initial.items()}   # copy: the agent keeps learning
+        self.chunks = []                  # dicts of column arrays
+        self.rows = []                    # add_one() rows not yet in a chunk
+        self.log_hash = hashlib.sha256()
+
+    def route_ids(self, routes):
+        return np.array([[ids[n] for ids, n in zip(self.ids, r)] for r in routes],
+                        dtype=np.uint16).reshape(len(routes), self.hops)
+
+    def add(self, episodes, chosen, routes, delay, dropped, success, latency, reward,
+            lost_hop=None, hop_delay=None):
+        """Append a batch of rows (sequences or arrays of equal length)."""
+        n = len(routes)
+        ids = self.route_ids(routes)
+        if lost_hop is None:
+            lost_hop = np.where(np.asarray(success) | np.asarray(dropped), -1, HOP_UNKNOWN)
+        if hop_delay is None:
+            hop_delay = np.full((n, self.hops), np.nan)
+        chunk = {"episode": np.asarray(episodes, dtype=np.uint32),
+                 "chosen": np.broadcast_to(np.asarray(chosen, dtype=np.uint32), (n,)).copy(),
+                 "route": ids,
+                 "delay": np.asarray(delay, dtype=np.float64),
+                 "dropped": np.asarray(dropped, dtype=np.bool_),
+                 "lost_hop": np.asarray(lost_hop, dtype=np.int8),
+                 "hop_delay": np.asarray(hop_delay, dtype=np.float32).reshape(n, self.hops),
+                 "success": np.asarray(success, dtype=np.bool_),
+                 "latency": np.asarray(latency, dtype=np.float64),
+                 "reward": np.asarray(reward, dtype=np.float64)}
+        log_digest(self.log_hash, ids, chunk["success"], chunk["latency"], chunk["reward"])
+        self.chunks.append(chunk)
+
+    def add_one(self, episode, chosen, route, delay, dropped, success, latency, reward):
+        """Append one live episode (end-to-end result only)."""
+        self.rows.append((episode, chosen, route, delay, dropped, success, latency, reward))
+        if len(self.rows) >= CHUNK:
+            self._flush_rows()
+
+    def _flush_rows(self):
+        if self.rows:
+            self.add(*map(list, zip(*self.rows)))
+            self.rows = []
+
+    def close(self, agent=None, **meta):
+        """Write the trace (atomically); `agent` adds its final state and digest to the meta."""
+        self._flush_rows()
+        columns = {k: np.concatenate([c[k] for c in self.chunks]) if self.chunks else np.empty(0)
+                   for k in ("episode", "chosen", "route", "delay", "dropped", "lost_hop", "hop_delay",
+                             "success", "latency", "reward")}
+        if not self.chunks:
+            columns["route"] = np.empty((0, self.hops), dtype=np.uint16)
+            columns["hop_delay"] = np.empty((0, self.hops), dtype=np.float32)
+        self.meta.update(meta, rows=len(columns["episode"]), log_digest=self.log_hash.hexdigest()[:16])
+        state = {}
+        if agent is not None:
+            state = agent_state(agent)
+            self.meta["state_digest"] = digest_state(state)
+            if not _small(state):
+                state = {}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, meta=np.frombuffer(json.dumps(self.meta).encode(), dtype=np.uint8),
+                                **columns, **{f"state_{k}": v for k, v in state.items()},
+                                **{f"initial_{k}": v for k, v in self.initial.items()})
+        os.replace(tmp, self.path)
+
+
+def _small(state):
+    return sum(v.size for v in state.values()) <= STATE_LIMIT
+
+
+class Trace:
+    """A loaded trace: `meta`, the columns as attributes, `initial` and final `state` (either may be empty)."""
+    def __init__(self, path):
+        with np.load(path) as z:
+            self.meta = json.loads(z["meta"].tobytes())
+            if self.meta.get("version") != VERSION:
+                raise ValueError(f"{path}: trace format {self.meta.get('version')}, expected {VERSION}")
+            self.initial, self.state = {}, {}
+            for k in z.files:
+                if k.startswith("initial_"):
+                    self.initial[k[len("initial_"):]] = z[k]
+                elif k.startswith("state_"):
+                    self.state[k[len("state_"):]] = z[k]
+                elif k != "meta":
+                    setattr(self, k, z[k])
+        self.layers = self.meta["layers"]
+        self.nodes = [self.layers[l] for l in self.layers]
+
+    def __len__(self):
+        return len(self.episode)
+
+    def routes(self):
+        """Routes as tuples of node names, in row order."""
+        return [tuple(nodes[i] for nodes, i in zip(self.nodes, row)) for row in self.route.tolist()]
+
+    def summary(self):
+        out = {"rows": len(self), "success_rate": round(float(self.success.mean()), 4) if len(self) else None,
+               "mean_reward": round(float(self.reward.mean()), 3) if len(self) else None,
+               "dropped_at_sender": int(self.dropped.sum())}
+        if self.meta["source"] == "sim":
+            out["lost_per_hop"] = [int((self.lost_hop == h).sum()) for h in range(len(self.nodes))]
+        else:
+            out["lost_in_mesh"] = int((self.lost_hop == HOP_UNKNOWN).sum())
+        return out
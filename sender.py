@@ -1,139 +1,247 @@
-import json, base64, socket, random, time, os, csv
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-from Crypto.Random import get_random_bytes
-
-# --- AES helpers ---
-def b64e(b): return base64.b64encode(b).decode()
-def b64d(s): return base64.b64decode(s)
-def encrypt_aes(key, data_bytes):
-    iv = get_random_bytes(16)
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    ct = cipher.encrypt(pad(data_bytes, AES.block_size))
-    return b64e(iv + ct)
+import json, random, time, argparse, asyncio, threading, uuid
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import numpy as np
+from connpool import ConnectionPool
+from congestion import CongestionTable
+from routing import LinkRLAgent, TrustScores, TRUST_WEIGHT, TRUST_REFRESH
+from framing import read_frame, FrameError
+from qtable import QTable
+from experience import ReplayBuffer, batch_targets, UPDATE_EVERY, MINIBATCH
+from perflog import PerformanceLog, LOGFILE, FORMATS
+from onion import OnionBuilder, FORMATS as ONION_FORMATS
+from circuit import CircuitPool, SENDER_CIRCUITS, SENDER_IDLE
+from topology import load_config
+from runtrace import TraceWriter, agent_params, agent_state
 
 # --- Simple Q-Learning Route Agent ---
+CHECKPOINT_EVERY = 100   # episodes between Q-table checkpoints
+
 class RouteRLAgent:
-    def __init__(self, layers, alpha=0.1, gamma=0.9, epsilon=0.2, qfile="route_qtable.json"):
+    def __init__(self, layers, alpha=0.1, gamma=0.9, epsilon=0.2, qfile="route_qtable.json",
+                 checkpoint_every=CHECKPOINT_EVERY, initial_q=None, congestion=None,
+                 buffer=None, update_every=UPDATE_EVERY, minibatch=MINIBATCH):
         self.layers = layers
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        # value assumed for never-tried routes; None keeps them out of greedy choice
+        self.initial_q = initial_q
+        # CongestionTable fed by the mesh's congestion signals; None ignores them
+        self.congestion = congestion
         self.qfile = qfile
+        self.checkpoint_every = checkpoint_every
+        # experience.ReplayBuffer for batched, replayed updates; None applies each update at once
+        self.buffer = buffer
+        self.update_every = min(update_every, buffer.capacity) if buffer is not None else 1
+        self.minibatch = minibatch
+        self.fresh = ([], [])   # (route index, reward) of experiences not learned from yet
+        self.updates = 0
         self.q_table = self.load()
 
     def load(self):
-        if os.path.exists(self.qfile):
-            with open(self.qfile, "r") as f:
-                try:
-                    return {tuple(eval(k)): v for k, v in json.load(f).items()}
-                except Exception:
-                    return {}
-        return {}
+        # binary table (route_qtable.npy); imports route_qtable.json on first use
+        return QTable(self.layers, self.qfile)
 
     def save(self):
-        with open(self.qfile, "w") as f:
-            json.dump({str(k): v for k, v in self.q_table.items()}, f, indent=2)
+        """Checkpoint the binary table and export route_qtable.json for plot_graphs.py."""
+        self.flush_updates()
+        self.q_table.flush()
+        self.q_table.export_json()
 
     def choose_route(self):
-        """Epsilon-greedy route selection."""
-        if random.random() < self.epsilon or not self.q_table:
-            route = (
-                random.choice(self.layers["L1"]),
-                random.choice(self.layers["L2"]),
-                random.choice(self.layers["L3"])
-            )
+        """Epsilon-greedy route selection (greedy step is O(log n) via the Q-table's heap)."""
+        if random.random() < self.epsilon or (not self.q_table and self.initial_q is None):
+            route = tuple(random.choice(nodes) for nodes in self.layers.values())
         else:
-            route = max(self.q_table, key=self.q_table.get)
+            route = self.q_table.best_route(self.initial_q)
+            if self.congestion is not None:
+                route = self.avoid_congestion(route)
         return route
 
+    def best_route(self):
+        return self.q_table.best_route(self.initial_q)
+
+    def avoid_congestion(self, route):
+        """Swap each hop currently reported congested for a random uncongested node of its layer."""
+        out = []
+        for layer, node in zip(self.layers, route):
+            if self.congestion.congested(node):
+                calm = [n for n in self.layers[layer] if not self.congestion.congested(n)]
+                node = random.choice(calm) if calm else node
+            out.append(node)
+        return tuple(out)
+
     def update(self, route, reward):
-        old_val = self.q_table.get(route, 0)
-        new_val = old_val + self.alpha * (reward - old_val)
-        self.q_table[route] = new_val
-        self.save()
-
-# --- Logging helper ---
-def log_performance(route, success, latency, reward, logfile="logs/performance_log.csv"):
-    os.makedirs("logs", exist_ok=True)
-    write_header = not os.path.exists(logfile)
-    with open(logfile, "a", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        if write_header:
-            writer.writerow(["timestamp", "route", "success", "latency", "reward"])
-        writer.writerow([
-            time.strftime('%Y-%m-%d %H:%M:%S'),
-            "→".join(route),
-            int(success),
-            round(latency, 4),
-            round(reward, 3)
-        ])
+        if self.buffer is not None:
+            self._remember(route, reward)
+        else:
+            old_val = self.q_table.get(route, 0 if self.initial_q is None else self.initial_q)
+            new_val = old_val + self.alpha * (reward - old_val)
+            self.q_table.set(route, new_val)
+        self.updates += 1
+        if self.updates % self.checkpoint_every == 0:
+            self.q_table.flush()
+
+    def _remember(self, route, reward):
+        i = self.q_table.flat_index(route)
+        if i is None:
+            raise KeyError(f"route {route} uses a node outside the table")
+        routes, rewards = self.fresh
+        routes.append(i)
+        rewards.append(reward)
+        if len(routes) >= self.update_every:
+            self.learn()
+
+    def learn(self):
+        """One vectorized step over the new experiences plus a sampled minibatch (see experience.py)."""
+        routes, rewards = np.array(self.fresh[0], dtype=np.int64), np.array(self.fresh[1], dtype=np.float64)
+        self.fresh = ([], [])
+        replayed = self.buffer.sample(self.minibatch)   # drawn before the new ones join the buffer
+        self.buffer.extend(routes, rewards)
+        idx, target, k = batch_targets(np.concatenate([routes, replayed[0]]),
+                                       np.concatenate([rewards, replayed[1]]))
+        old = self.q_table.get_many(idx, 0 if self.initial_q is None else self.initial_q)
+        self.q_table.set_many(idx, target + (old - target) * (1 - self.alpha) ** k)
+
+    def flush_updates(self):
+        """Learn from buffered experiences still waiting for the next step (save() does this)."""
+        if self.buffer is not None and self.fresh[0]:
+            self.learn()
 
 # --- Congestion simulator ---
-def simulate_network_conditions():
+def simulate_network_conditions(rng=random):
     """
     Randomly simulate congestion or packet drops.
     Returns (extra_delay, packet_dropped)
     """
-    congestion_chance = random.random()
-    drop_chance = random.random()
+    congestion_chance = rng.random()
+    drop_chance = rng.random()
 
     # 20% chance of moderate congestion (adds delay)
     if congestion_chance < 0.2:
-        delay = random.uniform(0.3, 1.2)
+        delay = rng.uniform(0.3, 1.2)
     # 10% chance of heavy congestion
     elif congestion_chance < 0.3:
-        delay = random.uniform(1.2, 2.5)
+        delay = rng.uniform(1.2, 2.5)
     else:
-        delay = random.uniform(0.05, 0.2)
+        delay = rng.uniform(0.05, 0.2)
 
     # 10% chance to drop packet completely
     packet_dropped = drop_chance < 0.1
 
     return delay, packet_dropped
 
-# --- Load keys and addresses ---
-with open("keys.json", "r") as f:
-    cfg = json.load(f)
+def episode_rng(seed, episode):
+    """
+    Independent RNG for one episode's simulated conditions. With a seed, episode N
+    sees the same congestion/drop draw in every run, whatever the concurrency.
+    """
+    return random.Random(seed * 1_000_003 + episode) if seed is not None else random.Random()
+
+# --- End-to-end ACKs ---
+ACK_TIMEOUT = 5.0   # seconds to wait for the destination's ACK
 
-layers = {
-    "L1": [n for n in cfg["keys"] if n.startswith("L1_")],
-    "L2": [n for n in cfg["keys"] if n.startswith("L2_")],
-    "L3": [n for n in cfg["keys"] if n.startswith("L3_")]
-}
+class AckListener:
+    """
+    Receives the destination's ACK frames ("ACK <id> ...") on one asyncio event loop
+    in a background thread and matches them to in-flight message IDs.
 
-agent = RouteRLAgent(layers)
+    expect(msg_id) returns a concurrent.futures.Future that resolves to the
+    round-trip time in seconds, or to None once `timeout` passes without an ACK.
+    An outstanding message costs a dict entry and a timer on the loop, not a
+    thread, so thousands can be in flight.
+    """
+    def __init__(self, host="127.0.0.1", port=0, timeout=ACK_TIMEOUT):
+        self.timeout = timeout
+        self.pending = {}   # msg id -> (future, perf_counter() at send)
+        self.lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        # started on the listener's own loop, so this also works from inside another event loop
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._on_conn, host, port, reuse_address=True, backlog=128), self.loop).result()
+        self.addr = tuple(self.server.sockets[0].getsockname()[:2])
 
-# --- Multi-message RL experiment ---
-EPISODES = 10000
-print(f"[Sender] Starting experiment: {EPISODES} episodes\n")
+    def expect(self, msg_id):
+        """Call right before sending message `msg_id`; RTT is measured from here."""
+        fut = Future()
+        with self.lock:
+            self.pending[msg_id] = (fut, time.perf_counter())
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.timeout, self._expire, msg_id)
+        return fut
+
+    def _expire(self, msg_id):
+        with self.lock:
+            entry = self.pending.pop(msg_id, None)
+        if entry:
+            entry[0].set_result(None)
 
-for episode in range(1, EPISODES + 1):
-    route = agent.choose_route()
-    n1, n2, n3 = route
-    print(f"[Episode {episode}] Selected route (RL): {n1} → {n2} → {n3} → Destination")
+    def _ack(self, data):
+        # "ACK <id>", or several ids the destination coalesced: "ACK <id> <id> ..."
+        if not data.startswith(b"ACK "):
+            return
+        ids = data[4:].decode(errors="replace")
+        now = time.perf_counter()
+        with self.lock:
+            entry = self.pending.pop(ids, None)
+            entries = [entry] if entry else [self.pending.pop(i, None) for i in ids.split(" ")]
+        for entry in entries:
+            if entry:
+                entry[0].set_result(now - entry[1])
 
-    # Load AES keys
-    k1 = b64d(cfg["keys"][n1])
-    k2 = b64d(cfg["keys"][n2])
-    k3 = b64d(cfg["keys"][n3])
-    k_dest = b64d(cfg["keys"]["Destination"])
+    async def _on_conn(self, reader, writer):
+        try:
+            while (data := await read_frame(reader)) is not None:
+                self._ack(bytes(data))
+        except (asyncio.CancelledError, ConnectionError, FrameError):
+            pass
+        finally:
+            writer.close()
 
-    # Build onion encryption
-    message = f"Experiment message {episode}".encode()
-    enc_for_dest = encrypt_aes(k_dest, message)
-    layer3 = {"next_hop": "Destination", "payload": enc_for_dest}
-    enc_layer3 = encrypt_aes(k3, json.dumps(layer3).encode())
+    def close(self):
+        """Stop listening; anything still outstanding resolves to None."""
+        async def shutdown():
+            self.server.close()
+            handlers = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for t in handlers:
+                t.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for fut, _ in pending.values():
+            fut.set_result(None)
 
-    layer2 = {"next_hop": n3, "payload": enc_layer3}
-    enc_layer2 = encrypt_aes(k2, json.dumps(layer2).encode())
+# --- One episode: build, congest, send, score ---
+def run_episode(cfg, pool, episode, route, rng=random, time_scale=1.0, builder=None, acks=None, run_id="",
+                circuits=None):
+    """
+    Returns (success, latency, reward). `time_scale` shrinks the congestion sleep only.
 
-    layer1 = {"next_hop": n2, "payload": enc_layer2}
-    enc_layer1 = encrypt_aes(k1, json.dumps(layer1).encode())
+    Without `acks`, success means the first hop accepted the onion and latency is
+    the time to hand it over. With `acks` (an AckListener) the message asks the
+    destination for an ACK and, once sent, a Future of (success, latency, reward)
+    is returned instead: success means the ACK came back, latency is the
+    end-to-end round-trip time, and a timeout scores like a failed send.
+    With `circuits` (a circuit.CircuitPool; needs `acks`) the message goes as
+    cells over the route's circuit instead of in its own onion.
+    """
+    builder = builder or OnionBuilder(cfg)
+    text = f"Experiment message {episode}"
+    msg_id = f"{run_id}{episode}"
+    if acks is not None:
+        message = json.dumps({"id": msg_id, "message": text, "reply_to": list(acks.addr)}).encode()
+    else:
+        message = text.encode()
+    onion = builder.build(route, message) if circuits is None else None
 
     # Simulate congestion and drop
-    delay, dropped = simulate_network_conditions()
-    time.sleep(delay)  # simulate congestion
+    delay, dropped = simulate_network_conditions(rng)
+    time.sleep(delay * time_scale)  # simulate congestion
 
     start = time.time()
     success = False
@@ -142,26 +250,218 @@ for episode in range(1, EPISODES + 1):
         print(f"[Sender] ⚠ Packet dropped due to network congestion! (Simulated)")
         reward = -15 - delay
     else:
-        host, port = cfg["addrs"][n1]
+        ack = acks.expect(msg_id) if acks is not None else None
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((host, port))
-                s.send(enc_layer1.encode())
+            if circuits is not None:
+                circuit = circuits.send(route, message)
+                ack.add_done_callback(lambda f: circuits.outcome(circuit, f.result() is not None))
+            else:
+                pool.send(cfg["addrs"][route[0]], onion)
             success = True
             print(f"[Sender] Onion sent successfully! (Delay: {delay:.2f}s)")
             reward = 10 - delay
         except Exception as e:
             print(f"[Sender] ❌ Sending failed: {e}")
             reward = -10 - delay
+        if success and ack is not None:
+            return _scored_ack(ack, delay, acks.timeout)
 
     latency = time.time() - start
     reward -= latency
+    return success, latency, reward
+
+def _scored_ack(ack, delay, timeout):
+    """Future of (success, latency, reward) for an ACK future of RTT-or-None."""
+    scored = Future()
+    def done(f):
+        rtt = f.result()
+        if rtt is None:
+            scored.set_result((False, timeout, -10 - delay - timeout))
+        else:
+            scored.set_result((True, rtt, 10 - delay - rtt))
+    ack.add_done_callback(done)
+    return scored
+
+# --- Multi-message RL experiment ---
+EPISODES = 10000
+
+def run_experiment(cfg, agent, pool, episodes=EPISODES, concurrency=1, rate=0.0, seed=None,
+                   time_scale=1.0, logfile=LOGFILE, log=None, onion_format="gcm", acks=None, trace=None,
+                   circuits=None):
+    """
+    Keep up to `concurrency` episodes in flight (concurrency=1 is the classic
+    sequential loop). Routes are chosen when an episode starts, and Q-updates and
+    log rows are applied by this thread in completion order. `rate` caps episode
+    starts per second (0 = unlimited). Returns [(episode, route, success, latency,
+    reward), ...] in completion order. Rows go to `log` (a PerformanceLog), or to a
+    buffered CSV at `logfile` that is closed when the run ends. `onion_format` is
+    "gcm", "binary" (for meshes with pre-gcm nodes) or "json" (pre-binary nodes). With `acks`
+    (an AckListener) episodes are scored by the destination's end-to-end ACK and
+    stay in flight, without holding a thread, until it arrives or times out.
+    With `trace` (a runtrace.TraceWriter; needs a seed) every completed episode
+    is also recorded for replay.py. With `circuits` (a circuit.CircuitPool;
+    needs `acks`) messages reuse one circuit per route instead of an onion each.
+    """
+    own_log = log is None
+    if own_log:
+        log = PerformanceLog(logfile)
+    try:
+        builder = OnionBuilder(cfg, onion_format)   # decodes each key once for the whole run
+        return _pipeline(cfg, agent, pool, log, builder, episodes, concurrency, rate, seed, time_scale, acks, trace,
+                         circuits)
+    finally:
+        if own_log:
+            log.close()
+
+def _pipeline(cfg, agent, pool, log, builder, episodes, concurrency, rate, seed, time_scale, acks, trace=None,
+              circuits=None):
+    results = []
+    run_id = uuid.uuid4().hex[:8] + ":"   # keeps late ACKs from an earlier run from matching
+    in_flight = {}
+    next_episode = 1
+    interval = 1.0 / rate if rate else 0.0
+    next_start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while next_episode <= episodes or in_flight:
+            timeout = None
+            while next_episode <= episodes and len(in_flight) < concurrency:
+                now = time.monotonic()
+                if now < next_start:
+                    timeout = next_start - now   # rate-limited: come back when the next slot opens
+                    break
+                next_start = max(next_start + interval, now) if interval else now
+                route = agent.choose_route()
+                print(f"[Episode {next_episode}] Selected route (RL): {' → '.join(route)} → Destination")
+                fut = executor.submit(run_episode, cfg, pool, next_episode, route,
+                                      episode_rng(seed, next_episode), time_scale, builder, acks, run_id, circuits)
+                in_flight[fut] = (next_episode, route)
+                next_episode += 1
+
+            if not in_flight:
+                time.sleep(timeout or 0)
+                continue
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                episode, route = in_flight.pop(fut)
+                result = fut.result()
+                if isinstance(result, Future):
+                    in_flight[result] = (episode, route)   # sent; now waiting for the ACK
+                    continue
+                success, latency, reward = result
+
+                # Update Q-table and log performance
+                agent.update(route, reward)
+                log.log(route, success, latency, reward)
+                results.append((episode, route, success, latency, reward))
+                if trace is not None:
+                    # the episode's draw is a function of (seed, episode); next_episode - 1 routes chosen so far
+                    delay, dropped = simulate_network_conditions(episode_rng(seed, episode))
+                    trace.add_one(episode, next_episode - 1, route, delay, dropped, success, latency, reward)
+
+                print(f"[Sender] Episode {episode} | Reward: {reward:.2f} | Latency: {latency:.2f}s | Success: {success}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RL onion-routing experiment.")
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--concurrency", type=int, default=1, help="circuits in flight at once (1 = sequential)")
+    parser.add_argument("--rate", type=float, default=0.0, help="max episode starts per second (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None, help="seed route exploration and simulated conditions")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply simulated congestion sleeps")
+    parser.add_argument("--reward", choices=["ack", "send"], default="ack",
+                        help="score episodes by the destination's end-to-end ACK (default) or by the first-hop send")
+    parser.add_argument("--ack-timeout", type=float, default=ACK_TIMEOUT, help="seconds to wait for an ACK")
+    parser.add_argument("--ack-host", default="127.0.0.1", help="address the destination sends ACKs to")
+    parser.add_argument("--ack-port", type=int, default=0, help="ACK listener port (0 = any free port)")
+    parser.add_argument("--agent", choices=["route", "link"], default="route",
+                        help="tabular per-route Q-values, or per-link values with the relays' trust folded in")
+    parser.add_argument("--trust-dir", default=".", help="link agent: where the relays write trust_<node>.json")
+    parser.add_argument("--trust-weight", type=float, default=TRUST_WEIGHT,
+                        help="link agent: reward units per relay trust point (0 = ignore trust)")
+    parser.add_argument("--ignore-congestion", action="store_true",
+                        help="don't steer greedy route choice around nodes that signal congestion")
+    parser.add_argument("--onion-format", choices=ONION_FORMATS, default="gcm",
+                        help="layer format; binary/json only for meshes with older nodes")
+    parser.add_argument("--log-format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--log-rotate", choices=["size", "daily", "none"], default="size")
+    parser.add_argument("--log-max-mb", type=float, default=64, help="rotate the log past this size (MB)")
+    parser.add_argument("--buffer-size", type=int, default=0,
+                        help="route agent: experience replay buffer slots (0 = one scalar update per episode)")
+    parser.add_argument("--update-every", type=int, default=UPDATE_EVERY,
+                        help="with --buffer-size: episodes between vectorized learning steps")
+    parser.add_argument("--minibatch", type=int, default=MINIBATCH,
+                        help="with --buffer-size: replayed experiences per learning step")
+    parser.add_argument("--circuits", action="store_true",
+                        help="send over long-lived circuits, one per route, instead of one onion per message")
+    parser.add_argument("--max-circuits", type=int, default=SENDER_CIRCUITS,
+                        help="with --circuits: circuits kept open; the least recently used is torn down")
+    parser.add_argument("--circuit-idle", type=float, default=SENDER_IDLE,
+                        help="with --circuits: seconds unused before a circuit is rebuilt")
+    parser.add_argument("--record", default=None, metavar="TRACE.npz",
+                        help="write a trace of every episode for replay.py (picks a seed if --seed is not given)")
+    args = parser.parse_args()
+    if args.circuits and args.reward != "ack":
+        parser.error("--circuits needs --reward ack: a circuit is confirmed by the destination's ACK")
+
+    if args.record and args.seed is None:
+        args.seed = random.randrange(2**31)   # a trace is only replayable with a known seed
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # --- Load keys and addresses ---
+    cfg = load_config()
+    layers = cfg.layers   # L1 .. Ln, as many as keys.json has
+
+    congestion = None if args.ignore_congestion else CongestionTable()
+    if args.agent == "link":
+        trust = TrustScores(layers, args.trust_dir, TRUST_REFRESH) if args.trust_weight else None
+        agent = LinkRLAgent(layers, trust=trust, trust_weight=args.trust_weight, congestion=congestion)
+    else:
+        buffer = ReplayBuffer(args.buffer_size, seed=args.seed) if args.buffer_size else None
+        agent = RouteRLAgent(layers, congestion=congestion, buffer=buffer,
+                             update_every=args.update_every, minibatch=args.minibatch)
+    # long-lived connections to the first hops; they also carry the mesh's congestion signals back
+    pool = ConnectionPool(on_signal=(lambda addr, node, level: congestion.note(node, level)) if congestion else None)
+    acks = AckListener(args.ack_host, args.ack_port, args.ack_timeout) if args.reward == "ack" else None
+    if acks is not None:
+        print(f"[Sender] Listening for ACKs on {acks.addr[0]}:{acks.addr[1]}")
+
+    print(f"[Sender] Starting experiment: {args.episodes} episodes (concurrency={args.concurrency})\n")
+
+    circuits = None
+    if args.circuits:
+        circuits = CircuitPool(cfg, pool, acks, max_circuits=args.max_circuits, idle_timeout=args.circuit_idle)
+
+    log = PerformanceLog(LOGFILE, fmt=args.log_format, rotate=args.log_rotate,
+                         max_bytes=int(args.log_max_mb * 1024 * 1024))
+    trace = None
+    if args.record:
+        trace = TraceWriter(args.record, layers, source="live", seed=args.seed, concurrency=args.concurrency,
+                            rate=args.rate, reward=args.reward, initial=agent_state(agent), **agent_params(agent))
 
-    # Update Q-table and log performance
-    agent.update(route, reward)
-    log_performance(route, success, latency, reward)
+    t0 = time.time()
+    try:
+        run_experiment(cfg, agent, pool, args.episodes, args.concurrency, args.rate, args.seed,
+                       args.time_scale, log=log, onion_format=args.onion_format, acks=acks, trace=trace,
+                       circuits=circuits)
+    finally:
+        if circuits is not None:
+            circuits.close()
+            print(f"[Sender] Circuits: {circuits.stats}")
+        agent.save()   # final checkpoint + route_qtable.json export
+        log.close()
+        if acks is not None:
+            acks.close()
+    elapsed = time.time() - t0
+    if trace is not None:
+        trace.close(agent, elapsed=round(elapsed, 3))
 
-    print(f"[Sender] Reward: {reward:.2f} | Latency: {latency:.2f}s | Success: {success}")
+    print("\n✅ Experiment completed with congestion simulation!")
+    print(f"⏱  {args.episodes} episodes in {elapsed:.1f}s ({args.episodes / elapsed:.2f} episodes/s)")
+    print(f"📊 Logs saved in {log.path}")
+    if trace is not None:
+        print(f"🎞  Trace saved in {args.record} (seed {args.seed})")
 
-print("\n✅ Experiment completed with congestion simulation!")
-print("📊 Logs saved in logs/performance_log.csv")
+if __name__ == "__main__":
+    main()
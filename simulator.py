@@ -0,0 +1,249 @@
+# simulator.py
+"""
+Offline, socket-free network simulator for training RouteRLAgent.
+
+NetworkModel reproduces, in virtual time and vectorized with NumPy:
+
+  * the sender's congestion model (simulate_network_conditions in sender.py):
+    20% moderate congestion U(0.3, 1.2)s, 10% heavy U(1.2, 2.5)s, otherwise
+    U(0.05, 0.2)s, and a 10% chance the packet never leaves the sender;
+  * every relay's NodeBehavior from keys.json: a drop check before and after
+    decryption with probability drop_prob + 0.3 * overload, where overload is
+    (queue - capacity) / capacity, and a processing delay of
+    max(0, N(delay_mean, delay_std)) + 1 ms per queued packet.
+
+Episodes are simulated in batches. Routes for a batch are chosen by the
+agent (agent.choose_route()) before any of its outcomes are known, and the
+Q-updates (agent.update()) are applied in episode order afterwards, i.e. the
+batch behaves like the pipelined sender with `batch` circuits in flight.
+batch=1 is the classic sequential loop.
+
+Within a batch, episodes are grouped into ticks of `concurrency` packets that
+are in the network at the same time; a node's queue during a tick is the
+number of those packets routed through it, which is what drives the
+overload drops and queueing delay.
+
+Outcomes are scored end to end (the packet must reach the Destination):
+
+    dropped at the sender   reward = -15 - congestion
+    lost at a relay         reward = -10 - congestion - time spent in the mesh
+    delivered               reward =  10 - congestion - path latency
+
+Rows go to the same performance log schema as the live sender.
+
+With a TrustScores attached (model.trust, done for --agent link), every
+relay's forward is also scored the way NodeTrust does it, standing in for
+the trust_<node>.json files the live relays write.
+
+Usage:
+    python simulator.py [--episodes 1000000] [--batch 4096] [--concurrency 1] [--seed 1] [--agent route|link]
+                        [--record trace.npz]
+"""
+import argparse, random, time
+
+import numpy as np
+
+from experience import ReplayBuffer, UPDATE_EVERY, MINIBATCH
+from node import NodeBehavior
+from perflog import PerformanceLog, FORMATS
+from topology import load_config
+from runtrace import TraceWriter, agent_params, agent_state
+
+SIM_LOGFILE = "logs/sim_performance_log.csv"
+SIM_QFILE = "route_qtable_sim.json"
+SIM_LINKFILE = "route_links_sim.json"
+BATCH = 4096
+
+
+class NetworkModel:
+    def __init__(self, cfg, layers, trust=None):
+        self.layer_names = list(layers)
+        self.names = [n for l in self.layer_names for n in layers[l]]
+        self.ids = {n: i for i, n in enumerate(self.names)}
+        self.offsets = np.cumsum([0] + [len(layers[l]) for l in self.layer_names])[:-1]   # first id per layer
+        self.trust = trust   # routing.TrustScores fed with every forward, or None
+        behaviors = [NodeBehavior(cfg, n) for n in self.names]
+        self.drop_prob = np.array([b.drop_prob for b in behaviors])
+        self.delay_mean = np.array([b.delay_mean for b in behaviors])
+        self.delay_std = np.array([b.delay_std for b in behaviors])
+        self.capacity = np.array([b.capacity for b in behaviors], dtype=np.float64)
+
+    def route_ids(self, routes):
+        ids = self.ids
+        return np.array([[ids[n] for n in r] for r in routes], dtype=np.int64).reshape(len(routes), -1)
+
+    def congestion(self, rng, n):
+        """Vectorized simulate_network_conditions: (extra_delay, dropped) arrays."""
+        u, v = rng.random(n), rng.random(n)
+        lo = np.where(u < 0.2, 0.3, np.where(u < 0.3, 1.2, 0.05))
+        hi = np.where(u < 0.2, 1.2, np.where(u < 0.3, 2.5, 0.2))
+        return lo + v * (hi - lo), rng.random(n) < 0.1
+
+    def simulate(self, route_ids, rng, concurrency=1, detail=None):
+        """
+        route_ids: (n, hops) node ids. Returns (success, latency, reward)
+        arrays of length n. A `detail` dict is filled with the per-episode
+        draws for a trace: delay, dropped, lost_hop (-1 if not lost in the
+        mesh) and hop_delay (0 past the losing hop).
+        """
+        n, hops = route_ids.shape
+        delay, dropped = self.congestion(rng, n)
+
+        # queue at each hop = packets of the same tick routed through that node
+        tick = np.arange(n) // max(1, concurrency)
+        key = tick[:, None] * len(self.names) + route_ids
+        _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+        queue = counts[inverse.reshape(key.shape)]
+
+        cap = self.capacity[route_ids]
+        overload = np.maximum(0.0, (queue - cap) / np.maximum(1.0, cap))
+        p = np.minimum(0.99, self.drop_prob[route_ids] + overload * 0.3)
+        lost_at_hop = rng.random((n, hops)) >= (1.0 - p) ** 2   # survives both drop checks
+
+        hop_delay = np.maximum(0.0, rng.normal(self.delay_mean[route_ids], self.delay_std[route_ids]))
+        hop_delay += 0.001 * queue
+
+        reached = np.cumprod(~lost_at_hop, axis=1)            # 1 while the packet is still alive
+        in_mesh = np.concatenate([np.ones((n, 1)), reached[:, :-1]], axis=1)
+        latency = (hop_delay * in_mesh).sum(axis=1)            # up to delivery or the losing hop
+        delivered = reached[:, -1].astype(bool)
+
+        latency = np.where(dropped, 0.0, latency)
+        success = ~dropped & delivered
+        if detail is not None:
+            lost = ~dropped & ~delivered
+            detail.update(delay=delay, dropped=dropped,
+                          lost_hop=np.where(lost, np.argmax(lost_at_hop, axis=1), -1),
+                          hop_delay=np.where(dropped[:, None], 0.0, hop_delay * in_mesh))
+        if self.trust is not None:
+            self.observe_trust(route_ids, ~dropped[:, None] & in_mesh.astype(bool), lost_at_hop)
+        base = np.where(dropped, -15.0, np.where(delivered, 10.0, -10.0))
+        return success, latency, base - delay - latency
+
+    def observe_trust(self, route_ids, arrived, lost_at_hop):
+        observe_trust(self.trust, route_ids - self.offsets[:route_ids.shape[1]], arrived, lost_at_hop)
+
+
+def observe_trust(trust, local, arrived, lost_at_hop):
+    """
+    NodeTrust updates: a relay that got the packet scores its next hop by
+    whether it passed it on. `local`: (n, hops) node index within each layer.
+    """
+    hops = local.shape[1]
+    for h in range(hops):
+        rows = arrived[:, h]
+        nxt = local[rows, h + 1] if h + 1 < hops else np.zeros(rows.sum(), dtype=np.int64)
+        trust.observe(h, local[rows, h], nxt, ~lost_at_hop[rows, h])
+
+
+def run_simulation(agent, model, episodes, batch=BATCH, concurrency=1, seed=None, log=None, trace=None):
+    """
+    Train `agent` for `episodes` simulated episodes. Returns (success, latency,
+    reward) NumPy arrays in episode order. Rows are appended to `log` (a
+    PerformanceLog) and, with every hop's outcome, to `trace` (a
+    runtrace.TraceWriter) if given.
+    """
+    rng = np.random.default_rng(seed)
+    success = np.empty(episodes, dtype=bool)
+    latency = np.empty(episodes)
+    reward = np.empty(episodes)
+    done = 0
+    while done < episodes:
+        n = min(batch, episodes - done)
+        routes = [agent.choose_route() for _ in range(n)]
+        detail = {} if trace is not None else None
+        s, l, r = model.simulate(model.route_ids(routes), rng, concurrency, detail)
+        for route, rw in zip(routes, r.tolist()):
+            agent.update(route, rw)
+        if log is not None:
+            log.log_many(routes, s.tolist(), l.tolist(), r.tolist())
+        if trace is not None:
+            # all n routes were chosen before these updates
+            trace.add(np.arange(done + 1, done + n + 1), done + n, routes, success=s, latency=l, reward=r, **detail)
+        success[done:done + n], latency[done:done + n], reward[done:done + n] = s, l, r
+        done += n
+    return success, latency, reward
+
+
+def main():
+    from sender import RouteRLAgent
+    from routing import LinkRLAgent, TrustScores, TRUST_WEIGHT
+
+    parser = argparse.ArgumentParser(description="Train the route agent against the simulated network.")
+    parser.add_argument("--episodes", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=BATCH, help="episodes chosen before their Q-updates apply")
+    parser.add_argument("--concurrency", type=int, default=1, help="packets in the mesh at once (drives queueing)")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--gamma", type=float, default=0.9)
+    parser.add_argument("--epsilon", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--agent", choices=["route", "link"], default="route",
+                        help="tabular per-route values or per-link values with simulated relay trust")
+    parser.add_argument("--trust-weight", type=float, default=TRUST_WEIGHT, help="link agent: weight of relay trust")
+    parser.add_argument("--buffer-size", type=int, default=0,
+                        help="route agent: experience replay buffer slots (0 = one scalar update per episode)")
+    parser.add_argument("--update-every", type=int, default=UPDATE_EVERY,
+                        help="with --buffer-size: episodes between vectorized learning steps")
+    parser.add_argument("--minibatch", type=int, default=MINIBATCH,
+                        help="with --buffer-size: replayed experiences per learning step")
+    parser.add_argument("--qfile", default=None,
+                        help=f"table to train (default {SIM_QFILE} / {SIM_LINKFILE}; "
+                             "route_qtable.json / route_links.json pretrain the live agent)")
+    parser.add_argument("--log", default=SIM_LOGFILE)
+    parser.add_argument("--log-format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--no-log", action="store_true")
+    parser.add_argument("--record", default=None, metavar="TRACE.npz",
+                        help="write a trace of every episode for replay.py (picks a seed if --seed is not given)")
+    args = parser.parse_args()
+
+    if args.record and args.seed is None:
+        args.seed = random.randrange(2**31)   # a trace is only replayable with a known seed
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    cfg = load_config()
+    layers = cfg.layers
+
+    checkpoint_every = max(args.batch, 1000)
+    if args.agent == "link":
+        trust = TrustScores(layers, directory=None) if args.trust_weight else None
+        agent = LinkRLAgent(layers, args.alpha, args.gamma, args.epsilon, qfile=args.qfile or SIM_LINKFILE,
+                            checkpoint_every=checkpoint_every, trust=trust, trust_weight=args.trust_weight)
+    else:
+        trust = None
+        buffer = ReplayBuffer(args.buffer_size, seed=args.seed) if args.buffer_size else None
+        agent = RouteRLAgent(layers, args.alpha, args.gamma, args.epsilon, qfile=args.qfile or SIM_QFILE,
+                             checkpoint_every=checkpoint_every, buffer=buffer,
+                             update_every=args.update_every, minibatch=args.minibatch)
+    model = NetworkModel(cfg, layers, trust)
+    log = None if args.no_log else PerformanceLog(args.log, fmt=args.log_format, rotate="none")
+    trace = None
+    if args.record:
+        trace = TraceWriter(args.record, layers, source="sim", seed=args.seed, batch=args.batch,
+                            concurrency=args.concurrency, initial=agent_state(agent), **agent_params(agent))
+
+    t0 = time.time()
+    try:
+        success, latency, reward = run_simulation(agent, model, args.episodes, args.batch,
+                                                  args.concurrency, args.seed, log, trace)
+    finally:
+        agent.save()
+        if log is not None:
+            log.close()
+    elapsed = time.time() - t0
+    if trace is not None:
+        trace.close(agent, elapsed=round(elapsed, 3))
+
+    tail = slice(-max(1, args.episodes // 10), None)
+    print(f"[Sim] {args.episodes} episodes in {elapsed:.1f}s ({args.episodes / elapsed:,.0f} episodes/s)")
+    print(f"[Sim] success rate {success.mean():.3f} overall, {success[tail].mean():.3f} over the last 10%")
+    print(f"[Sim] mean reward {reward.mean():.2f} overall, {reward[tail].mean():.2f} over the last 10%")
+    print(f"[Sim] best route: {' → '.join(agent.best_route() or ())}")
+    if log is not None:
+        print(f"[Sim] Logs saved in {log.path}")
+    if trace is not None:
+        print(f"[Sim] Trace saved in {args.record} (seed {args.seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# sweep.py
+"""
+Hyperparameter sweep for RouteRLAgent (alpha, gamma, epsilon x seeds).
+
+Every trial runs in a worker process with its own directory under --out,
+holding its own Q-table (route_qtable.json/.npy) and performance log, so
+trials never share the live route_qtable.json. A trial's directory is named
+after a hash of everything that determines its outcome (parameters, seed,
+episode count, network settings and the nodes/behaviour in keys.json); a
+trial whose result.json already exists is reused instead of rerun.
+
+Networks:
+    sim     simulator.NetworkModel, no sockets (default)
+    local   the live sender against a running mesh (run_all_nodes.py), scored
+            by end-to-end ACKs; per-episode output goes to the trial's sender.log.
+            Trials share the mesh, so they run one at a time, and their
+            results depend on its live state, so they are never reused
+
+Per trial the summary reports the success rate and mean reward over the
+final 10% of episodes, the overall mean reward, and the convergence episode:
+the episode after which the rolling mean reward (window = 5% of episodes,
+at least 100) stays within --tolerance of its final value.
+
+Usage:
+    python sweep.py --alpha 0.05 0.1 0.2 --epsilon 0.05 0.1 0.2 --seeds 1 2 3
+    python sweep.py --search random --trials 30 --alpha 0.01:0.5 --epsilon 0.01:0.3 --seeds 1 2
+"""
+import argparse, contextlib, csv, hashlib, itertools, json, os, random, shutil, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from perflog import PerformanceLog
+from topology import layers_of, load_config
+
+PARAMS = ("alpha", "gamma", "epsilon")
+DEFAULTS = {"alpha": ["0.1"], "gamma": ["0.9"], "epsilon": ["0.2"]}
+SWEEP_DIR = "sweeps"
+COLUMNS = ["trial", "alpha", "gamma", "epsilon", "seed", "episodes",
+           "final_success", "final_reward", "mean_reward", "convergence_episode", "seconds"]
+
+
+# --- search space ---
+def parse_values(specs):
+    """'0.1' -> fixed value, 'lo:hi' -> uniform range (random search only)."""
+    out = []
+    for s in specs:
+        if ":" in s:
+            lo, hi = s.split(":")
+            out.append((float(lo), float(hi)))
+        else:
+            out.append(float(s))
+    return out
+
+
+def grid(space):
+    for spec in space.values():
+        if any(isinstance(v, tuple) for v in spec):
+            raise ValueError("lo:hi ranges need --search random")
+    return [dict(zip(space, combo)) for combo in itertools.product(*space.values())]
+
+
+def random_search(space, trials, rng):
+    def draw(spec):
+        v = rng.choice(spec)
+        return round(rng.uniform(*v), 4) if isinstance(v, tuple) else v
+    return [{p: draw(spec) for p, spec in space.items()} for _ in range(trials)]
+
+
+# --- one trial ---
+def trial_id(spec, cfg):
+    nodes = {l: sorted(ns) for l, ns in layers_of(cfg).items()}
+    key = json.dumps({"spec": spec, "nodes": nodes, "behavior": cfg.get("behavior", {})}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def convergence(reward, tolerance):
+    n = len(reward)
+    w = max(100, n // 20)
+    if n < 2 * w:
+        return n
+    c = np.cumsum(np.insert(reward, 0, 0.0))
+    rolling = (c[w:] - c[:-w]) / w              # rolling[i] = mean of episodes i+1 .. i+w
+    off = np.flatnonzero(np.abs(rolling - rolling[-1]) > tolerance)
+    return int(off[-1] + w + 1) if len(off) else w
+
+
+def run_trial(spec, cfg, trial_dir, tolerance):
+    """Run one trial in `trial_dir` and return its summary row (also saved as result.json)."""
+    from sender import RouteRLAgent
+
+    shutil.rmtree(trial_dir, ignore_errors=True)   # never resume from a half-written Q-table
+    os.makedirs(trial_dir)
+    random.seed(spec["seed"])
+    layers = layers_of(cfg)
+    agent = RouteRLAgent(layers, spec["alpha"], spec["gamma"], spec["epsilon"],
+                         qfile=os.path.join(trial_dir, "route_qtable.json"),
+                         checkpoint_every=max(1000, spec["batch"]))
+    log = PerformanceLog(os.path.join(trial_dir, "performance_log.csv"), rotate="none")
+
+    t0 = time.time()
+    try:
+        if spec["network"] == "sim":
+            from simulator import NetworkModel, run_simulation
+            success, _, reward = run_simulation(agent, NetworkModel(cfg, layers), spec["episodes"],
+                                                spec["batch"], spec["concurrency"], spec["seed"], log)
+        else:
+            from sender import run_experiment, ConnectionPool, AckListener
+            pool, acks = ConnectionPool(), AckListener()   # scored by end-to-end ACKs
+            try:
+                with open(os.path.join(trial_dir, "sender.log"), "w") as out, contextlib.redirect_stdout(out):
+                    results = run_experiment(cfg, agent, pool, spec["episodes"], spec["concurrency"],
+                                             seed=spec["seed"], time_scale=spec["time_scale"], log=log, acks=acks)
+            finally:
+                acks.close()
+                pool.close()
+            results.sort(key=lambda r: r[0])
+            success = np.array([r[2] for r in results], dtype=bool)
+            reward = np.array([r[4] for r in results])
+    finally:
+        agent.save()
+        log.close()
+
+    tail = slice(-max(1, len(reward) // 10), None)
+    row = {"trial": os.path.basename(trial_dir), **{p: spec[p] for p in PARAMS},
+           "seed": spec["seed"], "episodes": spec["episodes"],
+           "final_success": round(float(success[tail].mean()), 4),
+           "final_reward": round(float(reward[tail].mean()), 3),
+           "mean_reward": round(float(reward.mean()), 3),
+           "convergence_episode": convergence(reward, tolerance),
+           "seconds": round(time.time() - t0, 2)}
+    with open(os.path.join(trial_dir, "result.json"), "w") as f:
+        json.dump({"spec": spec, "result": row}, f, indent=2)
+    return row
+
+
+# --- sweep ---
+def run_sweep(cfg, specs, out=SWEEP_DIR, jobs=None, tolerance=1.0):
+    """
+    Run (or reuse) every trial spec; returns summary rows in spec order.
+    Local-network trials are always rerun, one at a time.
+    """
+    rows, todo = {}, {}
+    if any(spec["network"] == "local" for spec in specs):
+        jobs = 1   # parallel trials would skew each other's latency and drops on the one mesh
+    for spec in specs:
+        tid = trial_id(spec, cfg)
+        path = os.path.join(out, tid, "result.json")
+        if spec["network"] == "sim" and os.path.exists(path):
+            with open(path) as f:
+                rows[tid] = json.load(f)["result"]
+            print(f"[sweep] {tid} cached")
+        elif tid not in todo:
+            todo[tid] = spec
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            futures = {pool.submit(run_trial, spec, cfg, os.path.join(out, tid), tolerance): tid
+                       for tid, spec in todo.items()}
+            for fut in as_completed(futures):
+                tid = futures[fut]
+                try:
+                    rows[tid] = fut.result()
+                    print(f"[sweep] {tid} done in {rows[tid]['seconds']}s")
+                except Exception as e:
+                    print(f"[sweep] {tid} failed: {e}")
+    return [rows[t] for t in dict.fromkeys(trial_id(s, cfg) for s in specs) if t in rows]
+
+
+def summarize(rows, path):
+    """Write rows to `path` (CSV) and print them best-first by final reward."""
+    rows = sorted(rows, key=lambda r: r["final_reward"], reverse=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n{'trial':<12} {'alpha':>6} {'gamma':>6} {'eps':>6} {'seed':>5} "
+          f"{'success':>8} {'reward':>8} {'mean':>8} {'conv.ep':>8}")
+    for r in rows:
+        print(f"{r['trial']:<12} {r['alpha']:>6} {r['gamma']:>6} {r['epsilon']:>6} {r['seed']:>5} "
+              f"{r['final_success']:>8} {r['final_reward']:>8} {r['mean_reward']:>8} {r['convergence_episode']:>8}")
+    print(f"\n📊 Summary saved in {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep RouteRLAgent hyperparameters.")
+    for p in PARAMS:
+        parser.add_argument(f"--{p}", nargs="+", default=DEFAULTS[p], help="values, or lo:hi with --search random")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--trials", type=int, default=20, help="random search: parameter draws (each run for every seed)")
+    parser.add_argument("--search-seed", type=int, default=0)
+    parser.add_argument("--network", choices=["sim", "local"], default="sim")
+    parser.add_argument("--episodes", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1024, help="sim: episodes chosen before their updates apply")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="local: multiply congestion sleeps")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="reward band for the convergence episode")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: CPU count; local network: 1)")
+    parser.add_argument("--out", default=SWEEP_DIR)
+    args = parser.parse_args()
+    if args.network == "local" and args.jobs not in (None, 1):
+        parser.error("--network local runs one trial at a time: trials would share the mesh")
+
+    cfg = load_config()
+
+    space = {p: parse_values(getattr(args, p)) for p in PARAMS}
+    points = grid(space) if args.search == "grid" else random_search(space, args.trials, random.Random(args.search_seed))
+    common = {"network": args.network, "episodes": args.episodes, "batch": args.batch,
+              "concurrency": args.concurrency, "time_scale": args.time_scale}
+    specs = [{**point, "seed": seed, **common} for point in points for seed in args.seeds]
+
+    print(f"[sweep] {len(specs)} trials ({args.search} search, {args.network} network, {args.episodes} episodes each)")
+    os.makedirs(args.out, exist_ok=True)
+    rows = run_sweep(cfg, specs, args.out, args.jobs, args.tolerance)
+    summarize(rows, os.path.join(args.out, "summary.csv"))
+
+
+if __name__ == "__main__":
+    main()
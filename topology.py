@@ -0,0 +1,139 @@
+# topology.py
+"""
+Mesh topology: generating keys.json for any number of layers, and loading
+it once per process.
+
+Relays are named L<layer>_Node<suffix>, with suffixes A..Z, AA, AB, ... so
+the default 3 x 4 mesh gets the L1_NodeA .. L3_NodeD names the rest of the
+repo uses. Layers are discovered from the names, in numeric order, so
+L1 .. L12 works as well as L1 .. L3.
+
+Ports are allocated per layer: relay j (1-based) of layer i listens on
+
+    base_port + (i - 1) * layer_stride + j
+
+The default stride is the smallest power of ten above nodes-per-layer (10
+for 4 nodes, as in the checked-in keys.json). The destination takes
+dest_port, by default the first port after the last layer's range.
+
+load_config() parses keys.json once and returns the same Config for every
+caller in the process until the file changes on disk. Config is the parsed
+dict itself (cfg["keys"], cfg["addrs"], ... keep working) plus `layers`,
+`relays` and `layer_of`, precomputed so lookups are O(1). The shared object
+must not be modified; copy.deepcopy() it first.
+"""
+import base64, copy, json, os, random, re, threading
+
+DEST = "Destination"
+KEYS_FILE = "keys.json"
+BASE_PORT = 8000
+HOST = "127.0.0.1"
+
+# ranges for the generated `behavior` section (see node.NodeBehavior)
+DROP_PROB = (0.01, 0.1)
+DELAY_MEAN = (0.01, 0.05)    # seconds
+CAPACITY = (5, 20)
+
+_LAYER = re.compile(r"L(\d+)_")
+
+
+def suffix(j):
+    """0 -> 'A', 25 -> 'Z', 26 -> 'AA', ..."""
+    out = ""
+    j += 1
+    while j:
+        j, r = divmod(j - 1, 26)
+        out = chr(ord("A") + r) + out
+    return out
+
+
+def node_names(layers, nodes_per_layer):
+    """{"L1": ["L1_NodeA", ...], ...}; nodes_per_layer is an int or one count per layer."""
+    counts = [nodes_per_layer] * layers if isinstance(nodes_per_layer, int) else list(nodes_per_layer)
+    if len(counts) != layers:
+        raise ValueError(f"{len(counts)} node counts for {layers} layers")
+    return {f"L{i + 1}": [f"L{i + 1}_Node{suffix(j)}" for j in range(n)] for i, n in enumerate(counts)}
+
+
+def discover_layers(names):
+    """Group relay names by their L<n>_ prefix, layers in numeric order, names in the order given."""
+    found = {}
+    for name in names:
+        m = _LAYER.match(name)
+        if m:
+            found.setdefault(int(m.group(1)), []).append(name)
+    return {f"L{i}": found[i] for i in sorted(found)}
+
+
+def random_behavior(names, rng, drop_prob=DROP_PROB, delay_mean=DELAY_MEAN, capacity=CAPACITY):
+    """A NodeBehavior entry per relay, drawn uniformly from the given ranges."""
+    out = {}
+    for n in names:
+        mean = round(rng.uniform(*delay_mean), 3)
+        out[n] = {"drop_prob": round(rng.uniform(*drop_prob), 3), "delay_mean": mean,
+                  "delay_std": round(mean / 2, 3), "capacity": rng.randint(*capacity)}
+    return out
+
+
+def generate(layers=3, nodes_per_layer=4, host=HOST, base_port=BASE_PORT, layer_stride=None, dest_port=None,
+             seed=None, **behavior_ranges):
+    """A keys.json dict: fresh AES keys, addresses and a `behavior` section for every relay."""
+    from Crypto.Random import get_random_bytes
+    names = node_names(layers, nodes_per_layer)
+    widest = max(len(ns) for ns in names.values())
+    stride = layer_stride or 10 ** len(str(widest))
+    if stride <= widest:
+        raise ValueError(f"layer stride {stride} leaves no room for {widest} nodes per layer")
+    dest_port = dest_port or base_port + layers * stride + 1
+    if max(dest_port, base_port + layers * stride) > 65535:
+        raise ValueError("port range exceeds 65535; lower --base-port or --layer-stride")
+
+    keys, addrs = {}, {}
+    for i, ns in enumerate(names.values()):
+        for j, n in enumerate(ns):
+            keys[n] = base64.b64encode(get_random_bytes(16)).decode()
+            addrs[n] = [host, base_port + i * stride + j + 1]
+    keys[DEST] = base64.b64encode(get_random_bytes(16)).decode()
+    addrs[DEST] = [host, dest_port]
+    relays = [n for ns in names.values() for n in ns]
+    return {"keys": keys, "addrs": addrs,
+            "behavior": random_behavior(relays, random.Random(seed), **behavior_ranges)}
+
+
+class Config(dict):
+    """A parsed keys.json with the mesh's layers precomputed."""
+    def __init__(self, data):
+        super().__init__(data)
+        self.layers = discover_layers(self.get("keys", {}))                        # {"L1": [names], ...}
+        self.relays = [n for ns in self.layers.values() for n in ns]
+        self.layer_of = {n: i for i, ns in enumerate(self.layers.values()) for n in ns}
+
+    def behavior(self, name):
+        return self.get("behavior", {}).get(name, {})
+
+    def __deepcopy__(self, memo):
+        return Config(copy.deepcopy(dict(self), memo))
+
+
+_CACHE = {}   # absolute path -> ((mtime_ns, size), Config)
+_CACHE_LOCK = threading.Lock()
+
+
+def load_config(path=KEYS_FILE):
+    """The Config for `path`, parsed once and reparsed only when the file changes."""
+    full = os.path.abspath(path)
+    st = os.stat(full)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(full)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(full, "r") as f:
+            cfg = Config(json.load(f))
+        _CACHE[full] = (stamp, cfg)
+        return cfg
+
+
+def layers_of(cfg):
+    """Layers of a keys.json dict (a Config already carries them)."""
+    return cfg.layers if isinstance(cfg, Config) else discover_layers(cfg.get("keys", {}))